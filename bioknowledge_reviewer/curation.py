@@ -9,8 +9,17 @@
 """Module for the curation data"""
 
 import os,glob
+import json
+import hashlib
+import pickle
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from gsheets import Sheets
+import httplib2
+from googleapiclient import discovery, errors
+from oauth2client.file import Storage
 from biothings_client import get_client
 #sys.path.insert(0,'/home/nuria/soft/utils3/lib/')
 #import abravo_lib as utils
@@ -33,8 +42,26 @@ if not os.path.isdir(path): os.makedirs(path)
 # database version path
 version='v20180118'
 
+# curated network files spreadsheets in Google Drive
+spreadsheetsIds_dct = {
+    '1pS3rT1hFShsCalu9bLGpAjQWp4y3_mgDxCtcHMAk2I8': 'ngly1_deficiency',
+    '1z4PrO8AuNqyAOY3UMYxaMQ1JUcL5z-IbWsw54yQ8sYA': 'ngly1_human',
+    '1thcKRGY1TnXepI8BJ6MYDhOgCayt3gEdPkOkFO4Nd4M': 'aqp1_human',
+    '17kpta304URAxgd0NN4Uvyyu_qC1n2KObOrNAkFCQzRU': 'aqp1_mouse',
+    '1ZF0cLyAN2_LPXbWNVss2yg2de7fvmHi21Zs7r1vFP54': 'glcnac_human',
+    '17jXa5f_B74JaT8yuhExRNIozDRRNnPdcfM7yiV4BRtk': 'enns_2014',
+    '1ZCfOdYtXn2mda2ybov8ibk0aXOtIBYDNw0RIoqkHldk': 'lam_2016'
+}
+
+# merged curated networks read in this session
+_network_cache = {}
+
+# mondo ontology
+mondo_owl = './ontologies/mondo.owl'
+_mondo_terms = None
+
 # manually: dict diseases to mondo
-# TODO: fill disease dict
+# disease IDs without cross-reference in the MONDO ontology, or to override it
 d2m = {   "KEGG-path:map04976" :"MONDO:0007739",
     'OMIM:223900': 'MONDO:0009131',
     'DOID:2476': 'MONDO:0019064',
@@ -54,6 +81,12 @@ d2m = {   "KEGG-path:map04976" :"MONDO:0007739",
 }
 #HD = MONDO:0007739
 
+# specific non human ncbi gene ids in the curated set
+gene_overrides = {
+    'NCBIGene:173028': 'WormBase:WBGene00010160',
+    'NCBIGene:11826': 'MGI:103201'
+}
+
 # CHECK NETWORK SCHEMA AND NORMALIZE TO GRAPH SCHEMA
 
 
@@ -172,6 +205,63 @@ def read_data(csv_path, version):
     return edges_df, nodes_df
 
 
+def get_entrez2hgnc(entrez):
+    """
+    This function queries BioThings to map Entrez gene IDs to HGNC IDs.
+    :param entrez: Entrez gene IDs list (without prefix)
+    :return: series, HGNC ID (without prefix) indexed by Entrez ID
+    """
+
+    # api call
+    mg = get_client('gene')
+    df = mg.querymany(list(entrez), scopes='entrezgene', fields='HGNC', size=1, as_dataframe=True)
+
+    # build dictionary
+    ids = df.reset_index().rename(columns={'query': 'entrez'}).copy()
+    if 'HGNC' not in ids.columns:
+        return pd.Series(dtype=object)
+    entrez2hgnc = ids.drop_duplicates(subset=['entrez']).set_index('entrez').HGNC.dropna().astype(str)
+
+    return entrez2hgnc
+
+
+def _split_curies(ids):
+    """
+    This function splits a column of CURIEs into prefix and local ID columns.
+    :param ids: series of CURIE strings
+    :return: lowercase prefix series, local ID series, has namespace boolean series
+    """
+
+    ids = ids.astype(str)
+    has_ns = ids.str.contains(':', regex=False)
+    parts = ids.str.split(':', n=1)
+
+    return parts.str[0].str.lower(), parts.str[1].where(has_ns, ''), has_ns
+
+
+def _normalize_gene_ids(ids, entrez2hgnc):
+    """
+    This function normalizes a column of gene CURIEs to the graph scheme: human Entrez gene IDs to HGNC IDs and \
+    the specific non human Entrez gene IDs by the gene_overrides lookup table. The work is done once per distinct ID.
+    :param ids: series of node ID CURIEs
+    :param entrez2hgnc: series, HGNC ID indexed by Entrez ID
+    :return: normalized series of node ID CURIEs
+    """
+
+    uniques = pd.Series(pd.unique(ids.dropna()))
+    prefix, local, has_ns = _split_curies(uniques)
+    is_entrez = has_ns & prefix.str.contains('ncbigene', regex=False)
+
+    # human ncbi gene ids with HGNC ID
+    hgnc = local.where(is_entrez).map(entrez2hgnc).astype(object)
+    normalized = uniques.where(hgnc.isna(), 'HGNC:' + hgnc)
+    # specific non human ncbi gene ids in the curated set
+    override = is_entrez & hgnc.isna() & uniques.isin(gene_overrides.keys())
+    normalized[override] = uniques[override].map(gene_overrides)
+
+    return ids.map(dict(zip(uniques, normalized)))
+
+
 def normalize_genes_to_graph(edges_df):
     """
     This function normalizes gene ID scheme. It performs Gene ID conversion \
@@ -185,66 +275,58 @@ def normalize_genes_to_graph(edges_df):
     ## GENES: normalize to HGNC
     # biothings api + dictionaries
     # concepts
-    concept_dct = dict()
-    for i, row in edges_df.iterrows():
-        # node for subject
-        concept_dct[row['subject_id']] = 1
-        # node for object
-        concept_dct[row['object_id']] = 1
+    concepts = pd.Series(pd.unique(pd.concat([edges_df.subject_id, edges_df.object_id], ignore_index=True)))
+    concept_dct = dict.fromkeys(concepts, 1)
 
     # api input
-    entrez = list()
-    diseases = set()
-    for idx, row in concept_dct.items():
-        if ':' in idx:
-            if 'ncbigene' in idx.split(':')[0].lower():
-                entrez.append(idx.split(':')[1])
-            elif 'doid' in idx.split(':')[0].lower() or 'omim' in idx.split(':')[0].lower() or 'orphanet' in \
-                    idx.split(':')[0].lower():
-                diseases.add(idx)
-    entrez = list(set(entrez))
+    prefix, local, has_ns = _split_curies(concepts)
+    entrez = list(set(local[has_ns & prefix.str.contains('ncbigene', regex=False)]))
 
     # api call
-    mg = get_client('gene')
-    df = mg.querymany(entrez, scopes='entrezgene', fields='HGNC', size=1, as_dataframe=True)
-
-    # build dictionary
-    ids = df.reset_index().rename(columns={'query': 'entrez'}).copy()
-    entrez2hgnc_dct = dict(zip(ids.entrez, ids.HGNC))
+    entrez2hgnc = get_entrez2hgnc(entrez)
 
     # map to hgnc
-    lines = []
-    for idx, row in edges_df.iterrows():
-        # subject
-        if ':' in row['subject_id']:
-            if 'NCBIGene' in row['subject_id'].split(':')[0]:
-                # human ncbi gene ids with HGNC ID
-                if str(entrez2hgnc_dct[row['subject_id'].split(':')[1]]) != 'nan':
-                    row['subject_id'] = "HGNC:" + entrez2hgnc_dct[row['subject_id'].split(':')[1]]
-                # specific non human ncbi gene ids in the curated set
-                elif row['subject_id'] == 'NCBIGene:173028':
-                    row['subject_id'] = 'WormBase:WBGene00010160'
-                elif row['subject_id'] == 'NCBIGene:11826':
-                    row['subject_id'] = 'MGI:103201'
-
-        # object
-        if ':' in row['object_id']:
-            if 'NCBIGene' in row['object_id'].split(':')[0]:
-                # human ncbi gene ids with HGNC ID
-                if str(entrez2hgnc_dct[row['object_id'].split(':')[1]]) != 'nan':
-                    row['object_id'] = "HGNC:" + entrez2hgnc_dct[row['object_id'].split(':')[1]]
-                # specific non human ncbi gene ids in the curated set
-                elif row['object_id'] == 'NCBIGene:173028':
-                    row['object_id'] = 'WormBase:WBGene00010160'
-                elif row['object_id'] == 'NCBIGene:11826':
-                    row['object_id'] = 'MGI:103201'
-
-        lines.append((row))
-    edges = pd.DataFrame.from_records(lines)
+    edges = edges_df.copy()
+    edges['subject_id'] = _normalize_gene_ids(edges.subject_id, entrez2hgnc)
+    edges['object_id'] = _normalize_gene_ids(edges.object_id, entrez2hgnc)
 
     return edges, concept_dct
 
 
+def get_mondo_terms():
+    """
+    This function returns the MONDO ontology terms object. The ontology is loaded once per session.
+    :return: mondo_class.term object
+    """
+
+    global _mondo_terms
+    if _mondo_terms is None:
+        _mondo_terms = mondo.term(mondo_owl)
+
+    return _mondo_terms
+
+
+def get_disease_mappings(ids):
+    """
+    This function maps disease IDs to MONDO IDs. It uses the reverse cross-reference index compiled from the MONDO \
+    ontology (equivalent classes and database cross-references) and the manual d2m dictionary, which takes precedence.
+    :param ids: iterable of node ID CURIEs, e.g. curated subject and object IDs
+    :return: dictionary {disease ID: MONDO ID}
+    """
+
+    ids = pd.Series(pd.unique(pd.Series(list(ids), dtype=object).dropna().astype(str).str.strip()))
+    ids = ids[~ids.str.startswith('MONDO:')]
+    xref_index = pd.Series(get_mondo_terms().get_xref_index())
+    mondo_ids = ids.map(xref_index)
+    mapped = mondo_ids.notna()
+    d2m_dct = dict(zip(ids[mapped], mondo_ids[mapped]))
+    d2m_dct.update(d2m)
+    print('\n* Disease IDs mapped to MONDO: {} from the ontology cross-references, {} manually'.format(
+        mapped.sum(), len(d2m)))
+
+    return d2m_dct
+
+
 def normalize_diseases_to_graph(edges_df):
     """
     This function normalizes disease ID scheme. It performs Disease ID mapping \
@@ -258,20 +340,20 @@ def normalize_diseases_to_graph(edges_df):
     print('\nAdding diseases to MONDO ID network...')
     # add d2m edges
     # add equivalentTo MONDO edges
-    edges_l = list()
-    for disease_id, mondo_id in d2m.items():
-        edge = dict()
-        edge['subject_id'] = disease_id
-        edge['object_id'] = mondo_id
-        edge['property_id'] = 'skos:exactMatch'
-        edge['property_label'] = 'exact match'
-        edge['property_description'] = 'NA'
-        edge['property_uri'] = 'NA'
-        edge['reference_uri'] = 'https://monarchinitiative.org/disease/' + mondo_id
-        edge['reference_supporting_text'] = 'Manual extraction from Monarch Knowledge Graph.'
-        edge['reference_date'] = '2018-04'
-        edges_l.append(edge)
-    d2m_edges_df = pd.DataFrame(edges_l)
+    d2m_dct = get_disease_mappings(pd.concat([edges_df.subject_id, edges_df.object_id], ignore_index=True))
+    d2m_edges_df = pd.DataFrame({'subject_id': list(d2m_dct.keys()), 'object_id': list(d2m_dct.values())})
+    d2m_edges_df['property_id'] = 'skos:exactMatch'
+    d2m_edges_df['property_label'] = 'exact match'
+    d2m_edges_df['property_description'] = 'NA'
+    d2m_edges_df['property_uri'] = 'NA'
+    d2m_edges_df['reference_uri'] = 'http://purl.obolibrary.org/obo/' + d2m_edges_df.object_id.str.replace(':', '_')
+    d2m_edges_df['reference_supporting_text'] = 'Automatic extraction from the MONDO ontology cross-references.'
+    d2m_edges_df['reference_date'] = today
+    # manual mappings
+    manual = d2m_edges_df.subject_id.isin(d2m.keys())
+    d2m_edges_df.loc[manual, 'reference_uri'] = 'https://monarchinitiative.org/disease/' + d2m_edges_df.object_id
+    d2m_edges_df.loc[manual, 'reference_supporting_text'] = 'Manual extraction from Monarch Knowledge Graph.'
+    d2m_edges_df.loc[manual, 'reference_date'] = '2018-04'
     edges = pd.concat([edges_df, d2m_edges_df], ignore_index=True, join="inner")
 
     return edges
@@ -378,63 +460,36 @@ def prepare_curated_nodes(curated_df):
     print('\nMapping genes to HGNC ID...')
     # biothings api + dictionaries
     # api input
-    entrez = list()
-    for i, row in curated_df.iterrows():
-        if ':' in row['id']:
-            if 'ncbigene' in row['id'].split(':')[0].lower():
-                entrez.append(row['id'].split(':')[1])
-    entrez = list(set(entrez))
+    prefix, local, has_ns = _split_curies(curated_df.id)
+    entrez = list(set(local[has_ns & prefix.str.contains('ncbigene', regex=False)]))
 
     # api call
     print('\n* Querying BioThings to map Entrez gene IDs to HGNC IDs...')
-    mg = get_client('gene')
-    df = mg.querymany(entrez, scopes='entrezgene', fields='HGNC', size=1, as_dataframe=True)
-
-    # build dictionary
-    ids = df.reset_index().rename(columns={'query': 'entrez'}).copy()
-    entrez2hgnc_dct = dict(zip(ids.entrez, ids.HGNC))
+    entrez2hgnc = get_entrez2hgnc(entrez)
 
     # map to hgnc
-    lines = []
-    for idx, row in curated_df.iterrows():
-        # subject
-        if ':' in row['id']:
-            if 'ncbigene' in row['id'].split(':')[0].lower():
-                # human ncbi gene ids with HGNC ID
-                if str(entrez2hgnc_dct[row['id'].split(':')[1]]) != 'nan':
-                    row['id'] = "HGNC:" + entrez2hgnc_dct[row['id'].split(':')[1]]
-                # specific non human ncbi gene ids in the curated set
-                elif row['id'] == 'NCBIGene:173028':
-                    row['id'] = 'WormBase:WBGene00010160'
-                elif row['id'] == 'NCBIGene:11826':
-                    row['id'] = 'MGI:103201'
-
-        lines.append((row))
-    curated_df = pd.DataFrame.from_records(lines)
+    curated_df = curated_df.copy()
+    curated_df['id'] = _normalize_gene_ids(curated_df.id, entrez2hgnc)
 
     ## DISEASES: add mondo nodes
     # build dictionary with mondo nodes'description
     print('\nAdding diseases described by the MONDO ontology...')
     # import mondo owl terms
     # owl_f = '/home/nuria/workspace/ngly1-graph/ontologies/mondo.owl'
-    owl_f = './ontologies/mondo.owl'
-    tm = mondo.term(owl_f)
+    tm = get_mondo_terms()
 
     # extract metadata from the mondo ontology
-    nodes_l = list()
-    for disease_id, mondo_id in d2m.items():
-        mondo_term = tm.get_metadata_per_id(id=mondo_id)
-        node = dict()
-        node['id'] = mondo_term['id']
-        node['semantic_groups'] = 'DISO'
-        node['preflabel'] = mondo_term['label']
-        node['synonyms'] = mondo_term['synonyms']
-        node['description'] = mondo_term['definition']
-        nodes_l.append(node)
+    mondo_ids = set(get_disease_mappings(curated_df.id).values())
+    mondo_df = pd.DataFrame(tm.metadata)
+    d2m_nodes_df = (mondo_df[mondo_df.id.isin(mondo_ids)]
+                    .rename(columns={'label': 'preflabel', 'definition': 'description'})
+                    .assign(semantic_groups='DISO')
+                    [['id', 'semantic_groups', 'preflabel', 'synonyms', 'description']])
+    print('\n* MONDO disease nodes: {} ({} not found in the ontology)'.format(
+        len(d2m_nodes_df), len(mondo_ids - set(d2m_nodes_df.id))))
 
     # add mondo nodes to curated_df
-    d2m_nodes_df = pd.DataFrame(nodes_l)
-    d2m_nodes_df.drop_duplicates(inplace=True)
+    d2m_nodes_df = d2m_nodes_df.drop_duplicates()
     curated_df = pd.concat([curated_df, d2m_nodes_df], ignore_index=True, join="inner")
 
     ## ADD NAME ATTRIBUTE: gene name from BT, otherwise preflabel
@@ -534,13 +589,13 @@ def build_edges(edges_df):
     df = pd.DataFrame(edges_l)
     df = df[['subject_id','property_id','object_id','reference_uri','reference_supporting_text','reference_date', \
              'property_label','property_description','property_uri','g2p_mark']]
-    df.fillna('NA').to_csv('{}/curated_graph_edges_v{}.csv'.format(path, today), index=False)
+    saved = utils.save_dataframe(df, '{}/curated_graph_edges_v{}.csv'.format(path, today))
 
     # print info
     print('\n* This is the size of the edges file data structure: {}'.format(pd.DataFrame(edges_l).shape))
     print('* These are the edges attributes: {}'.format(pd.DataFrame(edges_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(edges_l).head(1)))
-    print('\nThe curation network edges are built and saved at: {}/curated_graph_edges_v{}.csv\n'.format(path, today))
+    print('\nThe curation network edges are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_edges().\n')
 
     return edges_l
@@ -573,13 +628,13 @@ def build_nodes(nodes_df):
     if not os.path.isdir(path): os.makedirs(path)
     df = pd.DataFrame(nodes_l)
     df = df[['id','semantic_groups','preflabel','synonyms','description','name']]
-    df.fillna('NA').to_csv('{}/curated_graph_nodes_v{}.csv'.format(path, today), index=False)
+    saved = utils.save_dataframe(df, '{}/curated_graph_nodes_v{}.csv'.format(path, today))
 
     # print nodes info
     print('\n* This is the size of the nodes file data structure: {}'.format(pd.DataFrame(nodes_l).shape))
     print('* These are the nodes attributes: {}'.format(pd.DataFrame(nodes_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(nodes_l).head(1)))
-    print('\nThe curation network nodes are built and saved at: {}/curated_graph_nodes_v{}.csv\n'.format(path, today))
+    print('\nThe curation network nodes are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_nodes().\n')
 
     return nodes_l
@@ -587,9 +642,121 @@ def build_nodes(nodes_df):
 
 # NETWORK MANAGEMENT FUNCTIONS
 
-def download_networks():
+class GoogleSheetsSource(object):
+    '''
+    Curated network spreadsheets in Google Drive
+    '''
+
+    def __init__(self, secrets='/home/nuria/client_secrets.json', storage='/home/nuria/storage.json'):
+        '''
+        Constructor
+        :param secrets: path to the Google API client secrets file
+        :param storage: path to the Google API credentials storage file
+        '''
+
+        self.secrets = secrets
+        self.storage = storage
+        # the google api http client is not thread-safe: one client per thread
+        self._local = threading.local()
+
+    def _sheets(self):
+        if not hasattr(self._local, 'sheets'):
+            self._local.sheets = Sheets.from_files(self.secrets, self.storage)
+        return self._local.sheets
+
+    def _drive(self):
+        if not hasattr(self._local, 'drive'):
+            # Sheets.from_files() stores the credentials, with the drive read-only scope
+            credentials = Storage(self.storage).get()
+            self._local.drive = None if credentials is None else discovery.build(
+                'drive', 'v3', http=credentials.authorize(httplib2.Http()), cache_discovery=False)
+        return self._local.drive
+
+    def revision(self, sheet_id):
+        '''
+        This function returns the Google Drive modified time and version of the spreadsheet.
+        :param sheet_id: spreadsheet ID string
+        :return: revision string or None if unknown
+        '''
+
+        self._sheets()
+        if self._drive() is None:
+            return None
+        try:
+            meta = self._drive().files().get(fileId=sheet_id, fields='modifiedTime,version').execute()
+        except errors.HttpError:
+            return None
+        return '{}/{}'.format(meta.get('modifiedTime'), meta.get('version'))
+
+    def download(self, sheet_id, make_filename):
+        '''
+        This function downloads all the sheets of the spreadsheet as csv files.
+        :param sheet_id: spreadsheet ID string
+        :param make_filename: function returning the csv file name from the sheet info dictionary
+        '''
+
+        self._sheets()[sheet_id].to_csv(make_filename=make_filename)
+
+
+class DirectorySource(object):
+    '''
+    Curated network spreadsheets exported as files in a local directory, e.g. as a stand-in of Google Drive: \
+    <directory>/<spreadsheet ID>/<sheet>.csv
+    '''
+
+    def __init__(self, directory):
+        '''
+        Constructor
+        :param directory: path to the spreadsheets directory
+        '''
+
+        self.directory = directory
+
+    def _files(self, sheet_id):
+        return sorted(glob.glob('{}/{}/*.csv'.format(self.directory, sheet_id)))
+
+    def revision(self, sheet_id):
+        '''
+        This function returns the fingerprint of the sheet files of the spreadsheet.
+        :param sheet_id: spreadsheet ID string
+        :return: revision string
+        '''
+
+        return _fingerprint_files(self._files(sheet_id))
+
+    def download(self, sheet_id, make_filename):
+        '''
+        This function copies all the sheets of the spreadsheet.
+        :param sheet_id: spreadsheet ID string
+        :param make_filename: function returning the csv file name from the sheet info dictionary
+        '''
+
+        for file in self._files(sheet_id):
+            sheet = os.path.splitext(os.path.basename(file))[0]
+            shutil.copyfile(file, make_filename({'id': sheet_id, 'sheet': sheet}))
+
+
+def _fingerprint_files(files):
     """
-    This function downloads curated network files (edges and nodes) from spreadsheets in Google Drive as csv files.
+    This function returns a fingerprint of a list of files from their names, sizes and modification times.
+    :param files: list of file paths
+    :return: hex digest string
+    """
+
+    sha1 = hashlib.sha1()
+    for file in sorted(files):
+        stat = os.stat(file)
+        sha1.update('{}\t{}\t{}\n'.format(os.path.basename(file), stat.st_size, stat.st_mtime_ns).encode())
+    return sha1.hexdigest()
+
+
+def download_networks(source=None, max_workers=4, force=False):
+    """
+    This function downloads curated network files (edges and nodes) from spreadsheets in Google Drive as csv files. \
+    Spreadsheets are downloaded concurrently and only if their revision changed since the last download.
+    :param source: spreadsheets source object, GoogleSheetsSource (default) or DirectorySource
+    :param max_workers: maximum number of concurrent downloads
+    :param force: False (default value) or True to download all spreadsheets
     """
 
     # create dir: curation/data
@@ -605,46 +772,80 @@ def download_networks():
     # https://developers.google.com/sheets/api/quickstart/python
     ###
     # access to my drive files
-    print('\nConnecting Google Drive to start the download process of the curated networks..\n')
-    driveFilesObject = Sheets.from_files(
-        '/home/nuria/client_secrets.json',
-        '/home/nuria/storage.json'
-    )
+    if source is None:
+        print('\nConnecting Google Drive to start the download process of the curated networks..\n')
+        source = GoogleSheetsSource()
 
-    # create a list for curated network files spreadsheets (with Google Drive API?)
-    spreadsheetsIds_dct = {
-        '1pS3rT1hFShsCalu9bLGpAjQWp4y3_mgDxCtcHMAk2I8': 'ngly1_deficiency',
-        '1z4PrO8AuNqyAOY3UMYxaMQ1JUcL5z-IbWsw54yQ8sYA': 'ngly1_human',
-        '1thcKRGY1TnXepI8BJ6MYDhOgCayt3gEdPkOkFO4Nd4M': 'aqp1_human',
-        '17kpta304URAxgd0NN4Uvyyu_qC1n2KObOrNAkFCQzRU': 'aqp1_mouse',
-        '1ZF0cLyAN2_LPXbWNVss2yg2de7fvmHi21Zs7r1vFP54': 'glcnac_human',
-        '17jXa5f_B74JaT8yuhExRNIozDRRNnPdcfM7yiV4BRtk': 'enns_2014',
-        '1ZCfOdYtXn2mda2ybov8ibk0aXOtIBYDNw0RIoqkHldk': 'lam_2016'
-    }
-    spreadsheetIds_list = spreadsheetsIds_dct.keys()
+    # revisions of the last download
+    revisions_f = '{}/.revisions.json'.format(data_path)
+    revisions = dict()
+    if os.path.isfile(revisions_f):
+        with open(revisions_f) as f:
+            revisions = json.load(f)
 
     # download curated network files (edges and nodes)
     csv_name = lambda dct: '%s/%s.csv' % (data_path, dct.get('sheet'))
     #csv_name = lambda dct: '%s/%s-%s.csv' % (data_path, dct.get('title'), dct.get('sheet'))
-    for sp_id in spreadsheetIds_list:
-        driveFilesObject[sp_id].to_csv(make_filename=csv_name)
+    def download(sp_id):
+        revision = source.revision(sp_id)
+        if not force and revision is not None and revisions.get(sp_id) == revision:
+            return sp_id, revision, False
+        source.download(sp_id, csv_name)
+        return sp_id, revision, True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(download, spreadsheetsIds_dct.keys()))
+
+    downloaded = [sp_id for sp_id, revision, changed in results if changed]
+    for sp_id, revision, changed in results:
+        if revision is None:
+            revisions.pop(sp_id, None)
+        else:
+            revisions[sp_id] = revision
+    with open(revisions_f, 'w') as f:
+        json.dump(revisions, f, indent=1)
+    print('\n* Spreadsheets downloaded: {}'.format([spreadsheetsIds_dct[sp_id] for sp_id in downloaded]))
+    print('* Spreadsheets unchanged: {}'.format(len(results) - len(downloaded)))
 
     return print('\nDownload process finished.\nFiles located at: {}.'.format(data_path))
 
 
-def read_network(version=version):
+def read_network(version=version, use_cache=True):
     """
-    This function concatenates and returns the curated network tsv files from drive as edges and nodes dataframes.
+    This function concatenates and returns the curated network tsv files from drive as edges and nodes dataframes. \
+    The merged network is cached by the fingerprint of the network files and reused while none of them changes.
     :param version: string with data version
+    :param use_cache: True (default value) or False
     :return: curated edges dataframe, curated nodes dataframe
     """
 
     print('\nThe function "read_network()" is running...')
+    data_path = '{}/data/{}'.format(path, version)
+    edges_files = glob.glob('{}/*_edges.tsv'.format(data_path))
+    nodes_files = glob.glob('{}/*_nodes.tsv'.format(data_path))
+    key = _fingerprint_files(edges_files + nodes_files)
+    cache_f = '{}/.network_{}.pickle'.format(data_path, key[:16])
+
+    # network unchanged
+    if use_cache:
+        if key in _network_cache:
+            network_df, nodes_df = _network_cache[key]
+            print('\n* Curated network files unchanged, loaded from memory.')
+            print('\nFinished read_network().\n')
+            return network_df.copy(), nodes_df.copy()
+        if os.path.isfile(cache_f):
+            with open(cache_f, 'rb') as f:
+                network_df, nodes_df = pickle.load(f)
+            _network_cache[key] = (network_df, nodes_df)
+            print('\n* Curated network files unchanged, loaded from: {}'.format(cache_f))
+            print('\nFinished read_network().\n')
+            return network_df.copy(), nodes_df.copy()
+
     # concat all statements in the network
     print('\nReading and concatenating all curated statements in the network...')
     df_l = []
     #for file in glob.glob('{}/curation/data/*_edges.csv'.format(os.getcwd())):
-    for file in glob.glob('{}/curation/data/{}/*_edges.tsv'.format(os.getcwd(), version)):
+    for file in edges_files:
         with open(file, 'r') as f:
             #df_l.append(pd.read_table(f, sep=','))
             df_l.append(pd.read_table(f))
@@ -655,15 +856,23 @@ def read_network(version=version):
     # concat all concepts in the network
     print('\nReading and concatenating all curated nodes in the network...')
     df_l = []
-    for file in glob.glob('{}/data/{}/*_nodes.tsv'.format(path, version)):
+    for file in nodes_files:
         with open(file, 'r') as f:
             df_l.append(pd.read_table(f))
 
     nodes_df = pd.concat(df_l, ignore_index=True, join="inner")
     print('\n* Curation node files concatenated shape:', nodes_df.shape)
+
+    # cache the merged network
+    if use_cache:
+        for old_f in glob.glob('{}/.network_*.pickle'.format(data_path)):
+            os.remove(old_f)
+        with open(cache_f, 'wb') as f:
+            pickle.dump((network_df, nodes_df), f, protocol=pickle.HIGHEST_PROTOCOL)
+        _network_cache[key] = (network_df, nodes_df)
     print('\nFinished read_network().\n')
 
-    return network_df, nodes_df
+    return network_df.copy(), nodes_df.copy()
 
 
 def _get_nodes_df(network_df):
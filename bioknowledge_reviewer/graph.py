@@ -30,10 +30,14 @@
 """Module for functions to build the graph"""
 
 import pandas as pd
+import numpy as np
 import os
 import datetime
+import json
+import pickle
+import shutil
+import tempfile
 from utils import *
-import re
 
 # VARIABLES
 today = datetime.date.today()
@@ -42,6 +46,41 @@ today = datetime.date.today()
 path = os.getcwd() + "/graph"
 if not os.path.isdir(path): os.makedirs(path)
 
+# property curie namespaces to uri
+curie_dct = {
+    'ro': 'http://purl.obolibrary.org/obo/',
+    'bfo': 'http://purl.obolibrary.org/obo/',
+    'geno': 'http://purl.obolibrary.org/obo/',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'skos': 'http://www.w3.org/2004/02/skos/core#',
+    'pato': 'http://purl.obolibrary.org/obo/',
+    'sio': 'http://semanticscience.org/resource/',
+    'pmid': 'https://www.ncbi.nlm.nih.gov/pubmed/',
+    'encode': 'https://www.encodeproject.org/search/?searchTerm=',
+    'nan': 'http://snomed.info/id/408094002'
+}
+
+# graph sources, in order of precedence for duplicated statements and node annotations
+graph_sources = ['curation', 'monarch', 'transcriptomics', 'regulation']
+
+# concepts format
+node_columns = ['id', 'semantic_groups', 'preflabel', 'synonyms', 'name', 'description']
+
+# properties of the edges linking IDs of the same concept
+equivalence_properties = ['skos:exactMatch', 'RO:0002205']
+
+# namespaces in order of priority to pick the canonical ID of equivalent IDs
+canonical_namespaces = ['HGNC', 'NCBIGene', 'ensembl', 'UniProt', 'MONDO', 'DOID', 'OMIM', 'Orphanet', 'HP', 'GO']
+
+# namespace families of the IDs that can be merged, other namespaces are a family of their own
+namespace_families = {'hgnc': 'gene', 'ncbigene': 'gene', 'ensembl': 'gene', 'uniprot': 'gene',
+                      'mondo': 'disease', 'doid': 'disease', 'omim': 'disease', 'orphanet': 'disease'}
+
+# special characters removed from node preflabels
+preflabel_characters = r"[\\!@#$%^&*;,./<>?|'`_+]"
+
 
 # CHECK NETWORK SCHEMA AND NORMALIZE TO GRAPH SCHEMA
 
@@ -70,6 +109,57 @@ def print_graph(graph, filename):
     return print("\nFile '{}/{}_v{}.csv' saved.".format(path,filename,today))
 
 
+# node code columns of the edges and nodes of the graph build (see IdDictionary)
+code_columns = ['subject_code', 'object_code']
+
+
+def _encoded(statements, ids):
+    """This function returns the statements with the node codes of the build, encoding them if missing."""
+
+    if all(column in statements.columns for column in code_columns):
+        return statements
+    return encode_statements(statements, ids)
+
+
+def _encoded_nodes(nodes, ids):
+    """This function returns the nodes with the node code of the build, encoding it if missing."""
+
+    if 'code' in nodes.columns:
+        return nodes
+    return nodes.assign(code=ids.encode(nodes.id))
+
+
+def _node_mask(statements, size):
+    """This function returns a boolean array, indexed by node code, of the nodes of the statements."""
+
+    mask = np.zeros(size + 1, dtype=bool)
+    mask[statements.subject_code.values] = True
+    mask[statements.object_code.values] = True
+    mask[-1] = False
+    return mask
+
+
+def attach_regulation(statements, tf, ids=None):
+    """
+    This function selects the regulation (tf-gene) edges attached to the graph, i.e. the tf edges whose subject \
+    or object is a node of the graph. It is a semi-join on the node codes.
+    :param statements: graph edges dataframe (with the node codes of ids, otherwise they are encoded)
+    :param tf: regulation edges dataframe (with the node codes of ids, otherwise they are encoded)
+    :param ids: IdDictionary object of the build (default the saved one, see load_id_dictionary())
+    :return: attached regulation edges dataframe, with the node codes
+    """
+
+    ids = load_id_dictionary() if ids is None else ids
+    statements = _encoded(statements, ids)
+    tf = _encoded(tf, ids)
+    in_graph = _node_mask(statements, len(ids))
+    attached = in_graph[tf.subject_code.values] | in_graph[tf.object_code.values]
+    merged = tf.loc[attached].reindex(columns=statement_columns + fingerprint_columns() + code_columns)
+    merged = drop_duplicate_statements(merged).reset_index(drop=True)
+
+    return merged
+
+
 def graph_nodes(curation,monarch,transcriptomics,regulation,input_from_file=False):
     """
     This function generates graph nodes. The user can choose to input individual networks from file or \
@@ -120,139 +210,283 @@ def graph_nodes(curation,monarch,transcriptomics,regulation,input_from_file=Fals
 
     # concat 1) curated 2) monarch 3) RNA-seq edges
     print('\nConcatenating into a graph...')
-    statements = pd.concat([curated_df, monarch_df, rna], ignore_index=True, join="outer")
+    statements = concat_statements([curated_df, monarch_df, rna])
     print(statements.shape)
 
     # drop row duplicates
     print('\nDrop duplicated rows...')
-    statements.drop_duplicates(keep='first', inplace=True)
+    statements = drop_duplicate_statements(statements)
     print(statements.shape)
+    # node IDs dictionary of the new graph build
+    ids = IdDictionary()
+    statements = encode_statements(statements, ids)
 
     ## merge graph & tf
-    # merge: 4 merges
     print('\nMerging tf-gene network to the graph...')
-    # merge1: L_sub  &  tf_sub
-    merge1 = pd.merge(statements, tf, how='outer', left_on='subject_id', right_on='subject_id',
-                      suffixes=('_graph', '_tf'))
-
-    # merge2: L_obj  &  tf_sub
-    merge2 = pd.merge(statements, tf, how='outer', left_on='object_id', right_on='subject_id',
-                      suffixes=('_graph', '_tf'))
-
-    # merge3: L_sub  &  tf_obj
-    merge3 = pd.merge(statements, tf, how='outer', left_on='subject_id', right_on='object_id',
-                      suffixes=('_graph', '_tf'))
-
-    # merge4: L_obj  &  tf_obj
-    merge4 = pd.merge(statements, tf, how='outer', left_on='object_id', right_on='object_id',
-                      suffixes=('_graph', '_tf'))
-
-    # prepare merged edges: slice tf edges from merge
-    # merge1
-    merge1_clean = (merge1
-    [['subject_id', 'property_id_tf', 'object_id_tf', 'reference_uri_tf',
-      'reference_supporting_text_tf', 'reference_date_tf', 'property_label_tf',
-      'property_description_tf', 'property_uri_tf']]
-        .rename(columns={
-        'property_id_tf': 'property_id',
-        'object_id_tf': 'object_id',
-        'reference_uri_tf': 'reference_uri',
-        'reference_supporting_text_tf': 'reference_supporting_text',
-        'reference_date_tf': 'reference_date',
-        'property_label_tf': 'property_label',
-        'property_description_tf': 'property_description',
-        'property_uri_tf': 'property_uri'
-    })
-    )
-
-    # merge2
-    merge2_clean = (merge2
-    [['subject_id_tf', 'property_id_tf', 'object_id_tf', 'reference_uri_tf',
-      'reference_supporting_text_tf', 'reference_date_tf', 'property_label_tf',
-      'property_description_tf', 'property_uri_tf']]
-        .rename(columns={
-        'subject_id_tf': 'subject_id',
-        'property_id_tf': 'property_id',
-        'object_id_tf': 'object_id',
-        'reference_uri_tf': 'reference_uri',
-        'reference_supporting_text_tf': 'reference_supporting_text',
-        'reference_date_tf': 'reference_date',
-        'property_label_tf': 'property_label',
-        'property_description_tf': 'property_description',
-        'property_uri_tf': 'property_uri'
-    })
-    )
-
-    # merge3
-    merge3_clean = (merge3
-    [['subject_id_tf', 'property_id_tf', 'object_id_tf', 'reference_uri_tf',
-      'reference_supporting_text_tf', 'reference_date_tf', 'property_label_tf',
-      'property_description_tf', 'property_uri_tf']]
-        .rename(columns={
-        'subject_id_tf': 'subject_id',
-        'property_id_tf': 'property_id',
-        'object_id_tf': 'object_id',
-        'reference_uri_tf': 'reference_uri',
-        'reference_supporting_text_tf': 'reference_supporting_text',
-        'reference_date_tf': 'reference_date',
-        'property_label_tf': 'property_label',
-        'property_description_tf': 'property_description',
-        'property_uri_tf': 'property_uri'
-    })
-    )
-
-    # merge4
-    merge4_clean = (merge4
-    [['subject_id_tf', 'property_id_tf', 'object_id', 'reference_uri_tf',
-      'reference_supporting_text_tf', 'reference_date_tf', 'property_label_tf',
-      'property_description_tf', 'property_uri_tf']]
-        .rename(columns={
-        'subject_id_tf': 'subject_id',
-        'property_id_tf': 'property_id',
-        'reference_uri_tf': 'reference_uri',
-        'reference_supporting_text_tf': 'reference_supporting_text',
-        'reference_date_tf': 'reference_date',
-        'property_label_tf': 'property_label',
-        'property_description_tf': 'property_description',
-        'property_uri_tf': 'property_uri'
-    })
-    )
-
-    ## concat merged edges to statements (<= curated+monarch+rna)
-    # concat all 4 merges to merged edges
-    merged = pd.concat([merge1_clean, merge2_clean, merge3_clean, merge4_clean], ignore_index=True, join="outer")
-
-    # drop duplicates
-    merged.drop_duplicates(inplace=True)
+    # the whole tf network is kept to attach it again in update_graph()
+    tf = encode_statements(tf.reindex(columns=statement_columns), ids)
+    save_graph_index(tf, file_type='regulation')
+    merged = attach_regulation(statements, tf, ids)
     print(merged.shape)
 
     # save graph
     print('\nSaving tf merged edges...')
     path = os.getcwd() + "/graph"
-    merged.fillna('NA').to_csv('{}/regulation_graph_edges_v{}.csv'.format(path, today), index=False)
-    print('\nThe regulation graph merged edges are saved at: {}/regulation_graph_edges_v{}.csv\n'.format(path, today))
+    saved = save_dataframe(merged[statement_columns], '{}/regulation_graph_edges_v{}.csv'.format(path, today))
+    print('\nThe regulation graph merged edges are saved at: {}\n'.format(' and '.join(saved)))
 
     # concat merged to statements
-    statements = pd.concat([statements, merged], ignore_index=True, join="outer")
+    statements = concat_statements([statements, merged])
     print(statements.shape)
 
     # drop duplicates
     print('\nDrop duplicated rows...')
-    statements.drop_duplicates(keep='first', inplace=True)
+    statements = drop_duplicate_statements(statements)
     print(statements.shape)
 
     ## Nodes
     # extracting nodes in the graph
     print('\nGenerating graph nodes...')
-    st_nodes_l = pd.concat([statements.subject_id, statements.object_id], ignore_index=True)
-    st_nodes_l.drop_duplicates(inplace=True)
+    st_nodes_l = pd.Series(ids.decode(pd.unique(np.concatenate([statements.subject_code.values,
+                                                                 statements.object_code.values]))))
     st_nodes_df = pd.DataFrame({'id': st_nodes_l})
     print(st_nodes_df.shape)
+    save_id_dictionary(ids)
     print('\nFinished graph_nodes().\n')
 
     return st_nodes_l, merged
 
 
+def resolve_property_uris(statements):
+    """
+    This function adds the property_uri to the statements without it but with a curie property_id annotated. \
+    It is column-wise: the property_id prefix is joined with the curie_dct namespaces and the results are \
+    assigned at once. Unrecognized namespaces are reported as counts.
+    :param statements: graph edges dataframe
+    :return: graph edges dataframe
+    """
+
+    if statements.empty:
+        return statements
+    property_id = statements.property_id.fillna('nan').astype(str)
+    has_uri = statements.property_uri.fillna('').astype(str).str.contains(':', regex=False)
+    parts = property_id.str.partition(':')
+    prefix = parts[0].str.lower()
+    has_curie = parts[1] == ':'
+    namespace = prefix.map(curie_dct)
+
+    # cases: skos curies, none descriptive edge types, other curies
+    skos = ~has_uri & has_curie & (prefix == 'skos')
+    # not used in HD implementation
+    no_type = ~has_uri & ~has_curie & (property_id == 'nan')
+    curie = ~has_uri & has_curie & ~skos
+    unrecognized = curie & namespace.isna()
+    curie &= ~unrecognized
+
+    property_uri = pd.Series(None, index=statements.index, dtype=object)
+    property_uri[has_uri] = statements.property_uri[has_uri]
+    property_uri[skos] = (namespace + parts[2].str.split(':').str[0])[skos]
+    property_uri[no_type] = curie_dct['nan']
+    property_uri[curie] = namespace[curie] + property_id[curie].str.replace(':', '_')
+    statements['property_uri'] = property_uri
+    # Handling of none descriptive edge types, within the Monarch initiative database
+    statements.loc[no_type, 'property_id'] = 'sno:408094002'
+
+    if unrecognized.any():
+        print('There are reference curies with unrecognized namespaces (statements per namespace): {}'.format(
+            parts[0][unrecognized].value_counts().to_dict()))
+
+    return statements
+
+
+def prepare_source_edges(edges, source, ids=None):
+    """
+    This function prepares the edges of one source network for the graph index: property URIs are resolved, \
+    duplicated statements dropped and the rows tagged with their source.
+    :param edges: source network edges dataframe
+    :param source: source name string (see graph_sources)
+    :param ids: IdDictionary object of the build, to add the node codes (optional)
+    :return: indexed edges dataframe
+    """
+
+    # statements carrying a fingerprint are fingerprinted again only if their property changed
+    carried = fingerprint_columns() + (code_columns if ids is not None else [])
+    edges = edges.reindex(columns=statement_columns + [c for c in carried if c in edges.columns])
+    properties = edges[['property_id', 'property_uri']].copy()
+    edges = resolve_property_uris(edges)
+    edges = add_fingerprint(edges, rows=changed_rows(properties, edges[['property_id', 'property_uri']]))
+    edges = drop_duplicate_statements(edges).reset_index(drop=True)
+    if ids is not None:
+        edges = _encoded(edges, ids)
+    edges['source'] = pd.Categorical([source] * len(edges), categories=graph_sources)
+
+    return edges
+
+
+def _replace_strings(values, pattern, regex):
+    """This function deletes a pattern from the string values of a column, other values are kept as they are."""
+
+    values = values.astype(object)
+    strings = values.map(lambda x: isinstance(x, str)).values.astype(bool)
+    if strings.any():
+        values[strings] = values[strings].astype(str).str.replace(pattern, '', regex=regex)
+    return values
+
+
+def prepare_source_nodes(nodes, source, ids=None):
+    """
+    This function prepares the nodes of one source network for the graph index: labels and synonyms are \
+    cleaned, one row is kept per node and the rows are tagged with their source.
+    :param nodes: source network nodes dataframe
+    :param source: source name string (see graph_sources)
+    :param ids: IdDictionary object of the build, to add the node code (optional)
+    :return: indexed nodes dataframe
+    """
+
+    nodes = nodes.reindex(columns=node_columns).drop_duplicates(subset=['id'], keep='first').reset_index(drop=True)
+    synonyms = nodes.synonyms.astype(object)
+    lists = synonyms.map(lambda x: isinstance(x, list))
+    if lists.any():
+        synonyms[lists] = synonyms[lists].str.join('|')
+    # delete Flybase ID prefix, other values than strings are kept
+    nodes['synonyms'] = _replace_strings(synonyms, '\\', regex=False)
+    nodes['preflabel'] = _replace_strings(nodes.preflabel, preflabel_characters, regex=True)
+    if ids is not None:
+        nodes['code'] = ids.encode(nodes.id)
+    nodes['source'] = pd.Categorical([source] * len(nodes), categories=graph_sources)
+
+    return nodes
+
+
+def _order_by_source(index, priority):
+    """This function sorts an index by source priority (stable sort), unless it is already in that order."""
+
+    rank = pd.Categorical(index.source, categories=priority).codes.astype(np.int64)
+    rank[rank < 0] = len(priority)
+    if (np.diff(rank) < 0).any():
+        index = index.iloc[rank.argsort(kind='mergesort')]
+    return index
+
+
+def replace_source(index, source, rows):
+    """
+    This function replaces the rows of a source in an index ordered by source, keeping the order.
+    :param index: edges or nodes index dataframe
+    :param source: source name string (see graph_sources)
+    :param rows: new prepared rows of the source
+    :return: index dataframe
+    """
+
+    index = _order_by_source(index, graph_sources)
+    before = index.source.isin(graph_sources[:graph_sources.index(source)]).values
+    after = ~before & (index.source != source).values
+    return pd.concat([index[before], rows, index[after]], ignore_index=True)
+
+
+def assemble_edges(index):
+    """
+    This function assembles the graph edges from the edges index: sources are taken in order of precedence \
+    and statements provided by several sources are kept once, from the first one.
+    :param index: edges index dataframe
+    :return: graph edges dataframe, with the fingerprint and the node codes of the index
+    """
+
+    index = _order_by_source(index, graph_sources)
+    statements = index[~index.duplicated(subset=fingerprint_columns(), keep='first')]
+    columns = statement_columns + fingerprint_columns() + [c for c in code_columns if c in index.columns]
+
+    return statements[columns].reset_index(drop=True)
+
+
+def assemble_nodes(index, statements, priority=None, ids=None):
+    """
+    This function assembles the graph nodes from the nodes index: every node of the graph edges is annotated \
+    by the first source, in order of priority, providing it. Nodes without annotation keep only their id.
+    :param index: nodes index dataframe (with the node codes of ids, otherwise they are encoded)
+    :param statements: graph edges dataframe (with the node codes of ids, otherwise they are encoded)
+    :param priority: list of source names, in order of annotation precedence (default graph_sources)
+    :param ids: IdDictionary object of the build (default the saved one, see load_id_dictionary())
+    :return: graph nodes dataframe, with the node code
+    """
+
+    priority = graph_sources if priority is None else priority
+    ids = load_id_dictionary() if ids is None else ids
+    statements = _encoded(statements, ids)
+    index = _encoded_nodes(_order_by_source(index, priority), ids)
+    in_graph = _node_mask(statements, len(ids))
+    nodes = index[in_graph[index.code.values]].drop_duplicates(subset=['code'], keep='first')
+    in_graph[nodes.code.values] = False
+    missing = np.flatnonzero(in_graph)
+    if len(missing):
+        print('Graph nodes without annotation: {}'.format(len(missing)))
+        nodes = pd.concat([nodes, pd.DataFrame({'id': ids.decode(missing), 'code': missing.astype(np.int32)})],
+                          ignore_index=True)
+
+    return nodes[node_columns + ['code']].reset_index(drop=True)
+
+
+def get_index_file(file_type='statements'):
+    """
+    This function returns the path to the graph index file of the last graph build.
+    :param file_type: statements (default value), concepts, regulation (the tf network before attachment) or \
+    ids (the node IDs dictionary) string
+    :return: path_to_file_name string
+    """
+
+    path = os.getcwd() + "/graph"
+    if not os.path.isdir(path): os.makedirs(path)
+    names = {'statements': 'edges', 'concepts': 'nodes', 'regulation': 'regulation', 'ids': 'ids'}
+    return '{}/graph_{}_index.pickle'.format(path, names[file_type])
+
+
+def save_graph_index(index, file_type='statements'):
+    """
+    This function saves a graph index, i.e. the prepared rows of every source tagged with the source name.
+    :param index: edges or nodes index dataframe
+    :param file_type: statements (default value), concepts or regulation string
+    :return: None object
+    """
+
+    index.to_pickle(get_index_file(file_type))
+    return print("\nGraph index '{}' saved.".format(get_index_file(file_type)))
+
+
+def load_graph_index(file_type='statements'):
+    """
+    This function loads the graph index saved by the last graph build.
+    :param file_type: statements (default value), concepts or regulation string
+    :return: edges or nodes index dataframe
+    """
+
+    try:
+        return pd.read_pickle(get_index_file(file_type))
+    except OSError:
+        print('There is no graph index of a previous build at: {}. Please, run graph_nodes(), build_edges() and '
+              'build_nodes() first.'.format(get_index_file(file_type)))
+        raise
+
+
+def save_id_dictionary(ids):
+    """
+    This function saves the node IDs dictionary of the graph build, which codes the node IDs of the graph index.
+    :param ids: IdDictionary object
+    :return: None object
+    """
+
+    ids.save(get_index_file('ids'))
+
+
+def load_id_dictionary():
+    """
+    This function loads the node IDs dictionary of the graph build, or returns a new one if there is none.
+    :return: IdDictionary object
+    """
+
+    if os.path.isfile(get_index_file('ids')):
+        return IdDictionary.load(get_index_file('ids'))
+    return IdDictionary()
+
+
 # BUILD GRAPH
 
 def build_edges(curation,monarch,transcriptomics,regulation,input_from_file=False):
@@ -303,85 +537,126 @@ def build_edges(curation,monarch,transcriptomics,regulation,input_from_file=Fals
     print(tf_merged.shape)
     print(tf_merged.columns)
 
-    # concat 1) curated 2) monarch 3) RNA-seq edges
+    # index 1) curated 2) monarch 3) RNA-seq 4) regulation edges
+    # adding property_uri for those without but with a curie property_id annotated
     #TODO: check format
     print('\nConcatenating into a graph...')
-    statements = pd.concat([curated_df, monarch_df, rna, tf_merged], ignore_index=True, join="outer")
-    print(statements.shape)
+    ids = load_id_dictionary()
+    index = pd.concat([prepare_source_edges(df, source, ids) for df, source in
+                       zip([curated_df, monarch_df, rna, tf_merged], graph_sources)], ignore_index=True)
+    print(index.shape)
+    save_graph_index(index)
+    save_id_dictionary(ids)
 
     # drop row duplicates
     print('\nDrop duplicated rows...')
-    statements.drop_duplicates(keep='first', inplace=True)
+    statements = assemble_edges(index)
     print(statements.shape)
 
-    # add property_uri for those without but with a curie property_id annotated
-    curie_dct = {
-        'ro': 'http://purl.obolibrary.org/obo/',
-        'bfo': 'http://purl.obolibrary.org/obo/',
-        'geno': 'http://purl.obolibrary.org/obo/',
-        'dc': 'http://purl.org/dc/elements/1.1/',
-        'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
-        'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
-        'skos': 'http://www.w3.org/2004/02/skos/core#',
-        'pato': 'http://purl.obolibrary.org/obo/',
-        'sio': 'http://semanticscience.org/resource/',
-        'pmid': 'https://www.ncbi.nlm.nih.gov/pubmed/',
-        'encode': 'https://www.encodeproject.org/search/?searchTerm=',
-        'nan': 'http://snomed.info/id/408094002'
-    }
-    for i, row in statements.iterrows():
-        if ':' in str(row['property_uri']):
-            property_uri = row['property_uri']
-        elif ':' in str(row['property_id']) and str(row['property_id']).split(':')[0].lower() == 'skos':
-            # not used in HD implementation
-            property_uri = curie_dct[row['property_id'].split(':')[0].lower()] + row['property_id'].split(':')[1]
-        elif 'nan' == str(row['property_id']): 
-            # Handling of none descriptive edge types, within the Monarch initiative database
-            statements.at[i, 'property_id'] = "sno:408094002"
-            property_uri = curie_dct['nan']
-            property_label = "No value (qualifier value)"
-        elif ':' in str(row['property_id']):
-            try:
-                property_uri = curie_dct[row['property_id'].split(':')[0].lower()] + row['property_id'].replace(':',
-                                                                                                                '_')
-            except KeyError:
-                property_uri = None
-                print('There is a reference curie with and unrecognized namespace:', row['property_id'])
-        else:
-            property_uri = None
-        statements.at[i, 'property_uri'] = property_uri
-
     # save graph
     print('\nSaving final graph...')
     path = os.getcwd() + "/graph"
-    statements = statements[['subject_id', 'property_id', 'object_id', 'reference_uri',
-                             'reference_supporting_text', 'reference_date', 'property_label',
-                             'property_description', 'property_uri']]
     print(statements.shape)
     print(statements.columns)
-    statements.fillna('NA').to_csv('{}/graph_edges_v{}.csv'.format(path, today), index=False)
+    saved = save_dataframe(statements[statement_columns], '{}/graph_edges_v{}.csv'.format(path, today))
 
     # print info
     print('\n* This is the size of the edges file data structure: {}'.format(statements.shape))
     print('* These are the edges attributes: {}'.format(statements.columns))
     print('* This is the first record:\n{}'.format(statements.head(1)))
     print('\nThe NGLY1 Deficiency knowledge graph edges are built and saved at:'
-          ' {}/graph_edges_v{}.csv\n'.format(path, today))
+          ' {}\n'.format(' and '.join(saved)))
     print('\nFinished build_edges().\n')
 
     return statements
 
 
-def build_nodes(statements,curation,monarch,transcriptomics,regulation,input_from_file=False):
+def _read_spill(filename):
+    """This function reads the dataframes appended to a spill file."""
+
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _spilled_statements(spill_filenames):
+    """This function drops duplicated statements one spill partition at a time, keeping the first occurrence."""
+
+    for filename in spill_filenames:
+        frames = list(_read_spill(filename))
+        if not frames:
+            continue
+        partition = pd.concat(frames, ignore_index=True).sort_values('order', kind='mergesort')
+        partition = partition[~partition.duplicated(subset=fingerprint_columns(), keep='first')]
+        yield partition[statement_columns]
+
+
+def build_edges_chunked(curation,monarch,transcriptomics,regulation,chunksize=100000,partitions=16,spill_dir=None):
+    """
+    This function builds the edges graph out of core. Networks are read in chunks and spilled to disk \
+    partitioned by statement fingerprint, then deduplicated one partition at a time as in build_edges().
+    :param curation: curation graph edges path to file
+    :param monarch: monarch graph edges path to file
+    :param transcriptomics: rna graph edges path to file
+    :param regulation: regulation graph edges path to file
+    :param chunksize: number of rows read at a time (default 100000)
+    :param partitions: number of spill partitions (default 16)
+    :param spill_dir: directory for the spill files (default the graph directory)
+    :return: number of graph edges int
+    """
+
+    print('\nThe function "build_edges_chunked()" is running...')
+    path = os.getcwd() + "/graph"
+    spill_path = tempfile.mkdtemp(prefix='spill_', dir=spill_dir or path)
+    spill_filenames = ['{}/partition_{}.pickle'.format(spill_path, p) for p in range(partitions)]
+    try:
+        # spill 1) curated 2) monarch 3) RNA-seq 4) regulation edges, adding their property_uri
+        print('\nSpilling networks to: {}'.format(spill_path))
+        spill_files = [open(filename, 'wb') for filename in spill_filenames]
+        try:
+            order = 0
+            for filename, source in zip([curation, monarch, transcriptomics, regulation], graph_sources):
+                rows = 0
+                for chunk in iter_dataframe_from_file(filename, chunksize):
+                    chunk = prepare_source_edges(chunk, source)
+                    chunk['order'] = np.arange(order, order + len(chunk))
+                    order += len(chunk)
+                    rows += len(chunk)
+                    partition = chunk[fingerprint_columns()[0]].values % np.uint64(partitions)
+                    for p, part in chunk.groupby(partition, sort=False):
+                        pickle.dump(part, spill_files[p], protocol=pickle.HIGHEST_PROTOCOL)
+                print('{}: {} statements'.format(source, rows))
+        finally:
+            for f in spill_files:
+                f.close()
+
+        # drop duplicates per partition and save graph
+        print('\nDrop duplicated rows and save final graph...')
+        n, saved = save_dataframe_chunks(_spilled_statements(spill_filenames), '{}/graph_edges_v{}.csv'.format(path, today))
+    finally:
+        shutil.rmtree(spill_path, ignore_errors=True)
+
+    print('\n* This is the number of graph edges: {}'.format(n))
+    print('\nThe knowledge graph edges are built and saved at: {}\n'.format(' and '.join(saved)))
+    print('\nFinished build_edges_chunked().\n')
+
+    return n
+
+
+def build_nodes(statements,curation,monarch,transcriptomics,regulation,input_from_file=False,priority=None):
     """
     This function builds the nodes graph. The user can choose to input individual networks from file or \
     from the workflow.
-    :param statements: graph edges dataframe
+    :param statements: graph edges dataframe (with the node codes of the build, otherwise they are encoded)
     :param curation: curation graph nodes object list
     :param monarch: monarch graph nodes object list
     :param transcriptomics: rna graph nodes object list
     :param regulation: regulation graph nodes object list
     :param input_from_file: False (default value) or True
+    :param priority: list of source names, in order of annotation precedence (default graph_sources)
     :return: nodes dataframe
     """
 
@@ -420,60 +695,24 @@ def build_nodes(statements,curation,monarch,transcriptomics,regulation,input_fro
     print(tf_df.columns)
 
     ## Annotating nodes in the graph
+    # index nodes, also for incremental updates
     print('\nAnnotating nodes in the graph...')
-    # extracting nodes in the graph
-    st_nodes_l = pd.concat([statements.subject_id, statements.object_id], ignore_index=True)
-    st_nodes_l.drop_duplicates(inplace=True)
-    st_nodes_df = pd.DataFrame({'id': st_nodes_l})
-    print('graph from e', st_nodes_df.shape)
-
-    # annotating nodes
-    #TODO: check format
-    curated_nodes = pd.merge(curated_df, st_nodes_df, how='inner', on='id')
-    monarch_nodes = pd.merge(monarch_df, st_nodes_df, how='inner', on='id')
-    rna_nodes = pd.merge(rna_df, st_nodes_df, how='outer', on='id')
-    regulation_nodes = pd.merge(tf_df, st_nodes_df, how='inner', on='id')
-    print('annotation check')
-    print('curated', curated_nodes.shape)
-    print('monarch', monarch_nodes.shape)
-    print('rna', rna_nodes.shape)
-    print('regulation', regulation_nodes.shape)
-
-    # concat all, (importantly, concatenate first curated concepts with extended definitions)
-    print('\nConcatenating all nodes...')
-    nodes = pd.concat([curated_nodes, monarch_nodes, rna_nodes, regulation_nodes], ignore_index=True,
-                      join="outer")
+    ids = load_id_dictionary()
+    index = pd.concat([prepare_source_nodes(df, source, ids) for df, source in
+                       zip([curated_df, monarch_df, rna_df, tf_df], graph_sources)], ignore_index=True)
+    save_graph_index(index, file_type='concepts')
+    print('annotations', index.source.value_counts().to_dict())
+
+    # one node per graph node, annotated by the first source in order of priority
+    # (importantly, curated concepts with extended definitions first)
+    nodes = assemble_nodes(index, statements, priority=priority, ids=ids)
+    save_id_dictionary(ids)
     print('graph ann', nodes.shape)
-    diff = set(st_nodes_df.id) - set(nodes.id)
-    print('diff', diff)
-
-    # drop duplicated rows
-    print('\nDrop duplicated rows...')
-    nodes['synonyms'] = nodes.synonyms.apply(lambda x: str('|'.join(x)) if isinstance(x, list) else x)
-    # delete Flybase ID prefix:
-    #TODO regex uses sub, replace all special characters
-    nodes['synonyms'] = nodes.synonyms.apply(lambda x: x.replace("\\", "") if isinstance(x, str) else x)
-    nodes['preflabel'] = nodes.preflabel.apply(lambda x: re.sub("[\\\!@#$%^&*;,\.\/<>?\|\'`_+]*", "",x) if isinstance(x, str) else x)
-    nodes.drop_duplicates(keep='first', inplace=True)
-    print(nodes.shape)
-
-    # drop duplicated nodes (keep first row (the curated), remove others (monarch))
-    print('\nDrop duplicated nodes...')
-    nodes.drop_duplicates(subset=['id'], keep='first', inplace=True)
-    print(nodes.shape)
 
     # check
-    if len(set(st_nodes_df.id)) != len(set(nodes.id)):
-        print(
-            '\nThere is a problem in the annotation of nodes.\nThe number of annotated nodes '
-            'is different than the number of nodes in the graph.')
-        print('Curated nodes not in the graph: {}'.format(set(curated_df.id) - set(curated_nodes.id)))
-        print('Monarch nodes not in the graph: {}'.format(set(monarch_df.id) - set(monarch_nodes.id)))
-        print('RNA-seq nodes not in the graph: {}'.format(set(rna_df.id) - set(rna_nodes.id)))
-        print('Regulation nodes not in the graph: {}'.format(len(set(tf_df.id) - set(regulation_nodes.id))))
-    else:
-        print('\nAll graph nodes are annotated.')
-        print('Regulation nodes not in the graph: {}'.format(len(set(tf_df.id) - set(regulation_nodes.id))))
+    annotated = _in_sorted(index.code.values, nodes.code.values, len(ids))
+    for source in graph_sources:
+        print('{} nodes not in the graph: {}'.format(source, (~annotated[(index.source == source).values]).sum()))
 
     ## biothings
     # add attributes
@@ -483,23 +722,399 @@ def build_nodes(statements,curation,monarch,transcriptomics,regulation,input_fro
     # save graph nodes
     print('\nSaving final graph...')
     path = os.getcwd() + "/graph"
-    nodes = nodes[['id', 'semantic_groups', 'preflabel', 'synonyms', 'name', 'description']]
-    nodes['synonyms'] = nodes.synonyms.apply(lambda x: str('|'.join(x)) if isinstance(x, list) else x)
     print(nodes.shape)
     print(nodes.columns)
-    nodes.fillna('NA').to_csv('{}/graph_nodes_v{}.csv'.format(path, today), index=False)
+    saved = save_dataframe(nodes[node_columns], '{}/graph_nodes_v{}.csv'.format(path, today))
 
     # print info
     print('\n* This is the size of the edges file data structure: {}'.format(nodes.shape))
     print('* These are the edges attributes: {}'.format(nodes.columns))
     print('* This is the first record:\n{}'.format(nodes.head(1)))
     print('\nThe NGLY1 Deficiency knowledge graph nodes are built and saved at: '
-          '{}/graph_nodes_v{}.csv\n'.format(path, today))
+          '{}\n'.format(' and '.join(saved)))
     print('\nFinished build_nodes().\n')
 
     return nodes
 
 
+def _reattach_regulation(edges_index, old_rows, source, tf, ids):
+    """
+    This function updates the attached regulation edges of the graph index after the rows of a source changed. \
+    Only the tf edges of the nodes added to or removed from the graph by the source are attached again.
+    :param edges_index: edges index dataframe, with the new rows of the source and the node codes
+    :param old_rows: previous rows of the source in the index
+    :param source: changed source name string (see graph_sources)
+    :param tf: regulation edges dataframe, with the node codes
+    :param ids: IdDictionary object of the build
+    :return: prepared regulation edges dataframe (see prepare_source_edges())
+    """
+
+    size = len(ids)
+    other_sources = edges_index[~edges_index.source.isin([source, 'regulation'])]
+    in_other_sources = _node_mask(other_sources, size)
+    was_in_graph = in_other_sources | _node_mask(old_rows, size)
+    in_graph = in_other_sources | _node_mask(edges_index[edges_index.source == source], size)
+    changed = was_in_graph != in_graph
+    print('Nodes added to or removed from the graph: {}'.format(changed.sum()))
+
+    # regulation edges of the changed nodes are replaced by the tf edges attached to the new graph
+    regulation = edges_index[edges_index.source == 'regulation']
+    kept = ~(changed[regulation.subject_code.values] | changed[regulation.object_code.values])
+    touched = tf[changed[tf.subject_code.values] | changed[tf.object_code.values]]
+    attached = in_graph[touched.subject_code.values] | in_graph[touched.object_code.values]
+    merged = pd.concat([regulation[kept], prepare_source_edges(touched[attached], 'regulation', ids)],
+                       ignore_index=True)
+
+    return drop_duplicate_statements(merged).reset_index(drop=True)
+
+
+def update_graph(source, edges, nodes, input_from_file=False, regulation=None):
+    """
+    This function updates the graph of the last build when only one source network changed. The rows of the \
+    source are replaced in the graph index and the tf edges of the nodes added or removed are attached again.
+    :param source: changed source name string (see graph_sources). The regulation edges are the whole tf network.
+    :param edges: new source edges object list, dataframe or path to file
+    :param nodes: new source nodes object list, dataframe or path to file
+    :param input_from_file: False (default value) or True
+    :param regulation: tf network edges (default the one saved by graph_nodes())
+    :return: graph edges dataframe, graph nodes dataframe
+    """
+
+    print('\nThe function "update_graph()" is running...')
+    if source not in graph_sources:
+        raise ValueError('The source should be any of: {}'.format(graph_sources))
+    if input_from_file:
+        edges_df = get_dataframe_from_file(edges)
+        nodes_df = get_dataframe_from_file(nodes)
+    else:
+        edges_df = get_dataframe(edges)
+        nodes_df = get_dataframe(nodes)
+    print('{}: edges {}, nodes {}'.format(source, edges_df.shape, nodes_df.shape))
+
+    # node IDs dictionary and tf network of the build
+    ids = load_id_dictionary()
+    tf_changed = source == 'regulation' or regulation is not None
+    if source == 'regulation':
+        tf = edges_df
+    elif regulation is not None:
+        tf = get_dataframe_from_file(regulation) if input_from_file else get_dataframe(regulation)
+    else:
+        tf = load_graph_index(file_type='regulation')
+    if tf_changed:
+        tf = encode_statements(tf.reindex(columns=statement_columns), ids)
+    else:
+        tf = _encoded(tf, ids)
+
+    # retract the old source rows and merge the new ones
+    print('\nUpdating the graph index...')
+    edges_index = _encoded(load_graph_index(), ids)
+    nodes_index = _encoded_nodes(load_graph_index(file_type='concepts'), ids)
+    print('Retracted {} statements and {} nodes.'.format((edges_index.source == source).sum(),
+                                                          (nodes_index.source == source).sum()))
+    old_rows = edges_index[edges_index.source == source]
+    if source != 'regulation':
+        edges_index = replace_source(edges_index, source, prepare_source_edges(edges_df, source, ids))
+    nodes_index = replace_source(nodes_index, source, prepare_source_nodes(nodes_df, source, ids))
+
+    # attach the tf network to the graph without regulation edges, as graph_nodes()
+    print('\nMerging tf-gene network to the graph...')
+    if tf_changed:
+        statements = assemble_edges(edges_index[edges_index.source != 'regulation'])
+        merged = prepare_source_edges(attach_regulation(statements, tf, ids), 'regulation', ids)
+    else:
+        merged = _reattach_regulation(edges_index, old_rows, source, tf, ids)
+    print(merged.shape)
+    edges_index = replace_source(edges_index, 'regulation', merged)
+    if tf_changed:
+        save_graph_index(tf, file_type='regulation')
+    save_graph_index(edges_index)
+    save_graph_index(nodes_index, file_type='concepts')
+
+    # assemble the graph
+    statements = assemble_edges(edges_index)
+    nodes = assemble_nodes(nodes_index, statements, ids=ids)
+    save_id_dictionary(ids)
+
+    # save graph
+    print('\nSaving final graph...')
+    path = os.getcwd() + "/graph"
+    saved = save_dataframe(statements[statement_columns], '{}/graph_edges_v{}.csv'.format(path, today))
+    saved += save_dataframe(nodes[node_columns], '{}/graph_nodes_v{}.csv'.format(path, today))
+    print('\n* This is the size of the graph: {} edges, {} nodes'.format(statements.shape, nodes.shape))
+    print('\nThe knowledge graph edges and nodes are updated and saved at: {}\n'.format(' and '.join(saved)))
+    print('\nFinished update_graph().\n')
+
+    return statements, nodes
+
+
+def rollup_nodes(nodes, ontology_index, categories):
+    """
+    This function rolls up graph nodes to ontology categories, e.g. to MONDO disease branches.
+    :param nodes: graph nodes dataframe
+    :param ontology_index: mondo_class.closure object
+    :param categories: list of category class IDs, in order of preference
+    :return: nodes dataframe with the 'category' column (first category the node falls under, otherwise NA)
+    """
+
+    nodes = nodes.copy()
+    nodes['category'] = 'NA'
+    for category in reversed(categories):
+        branch = ontology_index.descendants(category)
+        branch.add(category)
+        nodes.loc[nodes.id.isin(branch), 'category'] = category
+    print('\n* Nodes rolled up per category:\n{}'.format(nodes.category.value_counts()))
+
+    return nodes
+
+
+# MERGE EQUIVALENT NODES
+
+def _union_find(first, second, size):
+    """
+    This function clusters elements 0..size-1 linked by pairs with union-find (path compression, the smallest \
+    element is the root).
+    :param first: array of elements
+    :param second: array of elements linked to the first ones
+    :param size: number of elements int
+    :return: array of the cluster root of every element
+    """
+
+    parent = list(range(size))
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return np.array([find(x) for x in range(size)], dtype=np.int64)
+
+
+def _same_family(equivalences, nodes=None):
+    """
+    This function checks which equivalences link IDs of the same namespace family (see namespace_families) \
+    or, if the nodes are given, of the same semantic group.
+    :param equivalences: dataframe of equivalent IDs (subject_id, object_id)
+    :param nodes: graph nodes dataframe (optional)
+    :return: boolean array
+    """
+
+    def family(ids):
+        namespace = ids.astype(str).str.split(':').str[0].str.lower()
+        return namespace.map(namespace_families).fillna(namespace)
+
+    same = (family(equivalences.subject_id) == family(equivalences.object_id)).values.copy()
+    if nodes is not None:
+        groups = nodes.drop_duplicates(subset=['id']).set_index('id').semantic_groups
+        subject_groups = equivalences.subject_id.map(groups)
+        known = subject_groups.notna() & (subject_groups != 'NA')
+        same |= (known & (subject_groups == equivalences.object_id.map(groups))).values
+
+    return same
+
+
+def cluster_equivalent_ids(statements, mappings=None, properties=None, priority=None, nodes=None):
+    """
+    This function clusters equivalent node IDs, linked by equivalence edges or mapping tables, and picks the \
+    canonical ID of every cluster by namespace priority. Conflicting clusters are not merged.
+    :param statements: graph edges dataframe
+    :param mappings: dictionary or 2-column dataframe of equivalent IDs (optional)
+    :param properties: list of equivalence property_id (default equivalence_properties)
+    :param priority: list of namespaces, in order of priority (default canonical_namespaces)
+    :param nodes: graph nodes dataframe, to check the semantic groups (optional)
+    :return: clusters dataframe (id, canonical, conflict)
+    """
+
+    properties = equivalence_properties if properties is None else properties
+    priority = canonical_namespaces if priority is None else priority
+    equivalences = statements.loc[statements.property_id.isin(properties), ['subject_id', 'object_id']]
+    if mappings is not None:
+        if isinstance(mappings, dict):
+            mappings = pd.DataFrame({'subject_id': list(mappings.keys()), 'object_id': list(mappings.values())})
+        mappings = mappings.iloc[:, :2].set_axis(['subject_id', 'object_id'], axis=1)
+        equivalences = pd.concat([equivalences, mappings], ignore_index=True)
+    equivalences = equivalences.dropna()
+    same = _same_family(equivalences, nodes)
+    if not same.all():
+        rejected = equivalences[~same]
+        print('* Equivalences across semantic groups, not merged: {}. For example: {}'.format(
+            len(rejected), ', '.join('{} = {}'.format(*pair) for pair in rejected.values[:10].tolist())))
+        equivalences = equivalences[same]
+
+    # union-find over the IDs in equivalences
+    positions, ids = pd.factorize(pd.concat([equivalences.subject_id, equivalences.object_id], ignore_index=True))
+    n = len(equivalences)
+    roots = _union_find(positions[:n], positions[n:], len(ids))
+    clusters = pd.DataFrame({'id': np.asarray(ids, dtype=object), 'cluster': roots})
+    namespace = clusters.id.astype(str).str.split(':').str[0].str.lower()
+    clusters['rank'] = namespace.map({ns.lower(): i for i, ns in enumerate(priority)}).fillna(len(priority))
+
+    # canonical ID: first ID of the best ranked namespace, conflicts: more than one
+    clusters = clusters.sort_values(['cluster', 'rank'], kind='mergesort')
+    best = clusters.groupby('cluster')['rank'].transform('min') == clusters['rank']
+    canonical = clusters[best].drop_duplicates(subset='cluster').set_index('cluster').id
+    clusters['canonical'] = clusters.cluster.map(canonical)
+    clusters['conflict'] = clusters.cluster.map(clusters[best].groupby('cluster').size() > 1)
+
+    return clusters[['id', 'canonical', 'conflict']].reset_index(drop=True)
+
+
+def merge_equivalent_nodes(statements, nodes, mappings=None, properties=None, priority=None, ids=None):
+    """
+    This function merges equivalent nodes of the graph (see cluster_equivalent_ids()) into their canonical ID. \
+    The clusters are saved at graph/.
+    :param statements: graph edges dataframe (with the node codes of ids, otherwise they are encoded)
+    :param nodes: graph nodes dataframe (with the node codes of ids, otherwise they are encoded)
+    :param mappings: dictionary or 2-column dataframe of equivalent IDs (optional)
+    :param properties: list of equivalence property_id (default equivalence_properties)
+    :param priority: list of namespaces, in order of priority (default canonical_namespaces)
+    :param ids: IdDictionary object of the build (default the saved one, see load_id_dictionary())
+    :return: graph edges dataframe, graph nodes dataframe
+    """
+
+    print('\nThe function "merge_equivalent_nodes()" is running...')
+    properties = equivalence_properties if properties is None else properties
+    clusters = cluster_equivalent_ids(statements, mappings=mappings, properties=properties, priority=priority,
+                                      nodes=nodes)
+    merged = clusters[~clusters.conflict & (clusters.id != clusters.canonical)]
+    print('* Equivalent IDs: {}, merged into canonical IDs: {}, in conflict clusters: {}'.format(
+        len(clusters), len(merged), clusters.conflict.sum()))
+
+    # canonical code of every node code (unknown codes, -1, use the last position)
+    build_ids = ids is None
+    ids = load_id_dictionary() if build_ids else ids
+    statements = add_fingerprint(_encoded(statements, ids))
+    nodes = _encoded_nodes(nodes, ids)
+    merged_codes, merged_canonical = ids.encode(merged.id), ids.encode(merged.canonical)
+    canonical_codes = np.append(np.arange(len(ids), dtype=np.int32), np.int32(-1))
+    canonical_codes[merged_codes] = merged_canonical
+    is_merged = np.zeros(len(ids) + 1, dtype=bool)
+    is_merged[merged_codes] = True
+
+    # rewrite the merged IDs, only the rewritten statements are fingerprinted again
+    rewritten = np.zeros(len(statements), dtype=bool)
+    for column in ['subject', 'object']:
+        codes = statements[column + '_code'].values
+        rows = is_merged[codes]
+        rewritten |= rows
+        statements[column + '_id'] = statements[column + '_id'].mask(rows, pd.Series(
+            ids.decode(canonical_codes[codes]), index=statements.index))
+        statements[column + '_code'] = canonical_codes[codes]
+    statements = add_fingerprint(statements, rows=rewritten)
+    loops = statements.property_id.isin(properties).values & \
+            (statements.subject_code.values == statements.object_code.values)
+    statements = drop_duplicate_statements(statements[~loops]).reset_index(drop=True)
+    print('* Graph edges: {}'.format(statements.shape))
+
+    node_codes = nodes.code.values
+    nodes = nodes.assign(id=nodes.id.mask(is_merged[node_codes], pd.Series(
+        ids.decode(canonical_codes[node_codes]), index=nodes.index)), code=canonical_codes[node_codes])
+    nodes = nodes.iloc[np.argsort(is_merged[node_codes], kind='mergesort')].drop_duplicates(subset=['code'],
+                                                                                          keep='first')
+    nodes = nodes.reset_index(drop=True)
+    print('* Graph nodes: {}'.format(nodes.shape))
+    if build_ids:
+        save_id_dictionary(ids)
+
+    # save clusters
+    path = os.getcwd() + "/graph"
+    if not os.path.isdir(path): os.makedirs(path)
+    saved = save_dataframe(clusters, '{}/node_equivalences_v{}.csv'.format(path, today))
+    print('\nThe node equivalence clusters are saved at: {}\n'.format(' and '.join(saved)))
+
+    return statements, nodes
+
+
+# VALIDATE GRAPH
+
+def _in_sorted(values, sorted_values, size):
+    """
+    This function returns the membership of codes in an array of codes. Node codes are dense, so it is \
+    a lookup in a boolean array indexed by code (unknown codes, -1, use the last position).
+    """
+
+    members = np.zeros(size + 1, dtype=bool)
+    members[sorted_values] = True
+    return members[values]
+
+
+def validate_graph(edges, nodes, strict=False, sample_size=10, ids=None):
+    """
+    This function checks the integrity of the graph, e.g. edges to missing nodes or duplicated node IDs, and \
+    saves a report in JSON format at graph/.
+    :param edges: graph edges dataframe (with the node codes of ids, otherwise they are encoded)
+    :param nodes: graph nodes dataframe (with the node codes of ids, otherwise they are encoded)
+    :param strict: False (default value) or True to raise an error if the graph is not valid
+    :param sample_size: number of example IDs per check in the report
+    :param ids: IdDictionary object of the build (default the saved one, see load_id_dictionary())
+    :return: report dictionary
+    """
+
+    print('\nThe function "validate_graph()" is running...')
+    ids = load_id_dictionary() if ids is None else ids
+    edges = _encoded(edges, ids)
+    subject_codes = edges.subject_code.values
+    object_codes = edges.object_code.values
+    node_codes = _encoded_nodes(nodes, ids).code.values
+    sorted_nodes, node_counts = np.unique(node_codes, return_counts=True)
+    sorted_endpoints = np.unique(np.concatenate([subject_codes, object_codes]))
+
+    def sample(codes):
+        return [str(curie) for curie in ids.decode(np.unique(codes)[:sample_size])]
+
+    checks = dict()
+    dangling = np.concatenate([subject_codes[~_in_sorted(subject_codes, sorted_nodes, len(ids))],
+                               object_codes[~_in_sorted(object_codes, sorted_nodes, len(ids))]])
+    checks['dangling_endpoints'] = {'count': int(len(np.unique(dangling))), 'sample': sample(dangling)}
+    duplicated = sorted_nodes[node_counts > 1]
+    checks['duplicated_ids'] = {'count': int(len(duplicated)), 'sample': sample(duplicated)}
+    unannotated = nodes.semantic_groups.isin(['NA']).values | nodes.semantic_groups.isna().values | \
+                  nodes.preflabel.isin(['NA']).values | nodes.preflabel.isna().values
+    checks['unannotated_nodes'] = {'count': int(unannotated.sum()), 'sample': sample(node_codes[unannotated])}
+    orphans = node_codes[~_in_sorted(node_codes, sorted_endpoints, len(ids))]
+    checks['orphan_nodes'] = {'count': int(len(orphans)), 'sample': sample(orphans)}
+    loops = subject_codes[subject_codes == object_codes]
+    checks['self_loops'] = {'count': int(len(loops)), 'sample': sample(loops)}
+    # property URIs are checked once per distinct value
+    uri_codes, uris = pd.factorize(edges.property_uri)
+    known = np.append(pd.Series(uris, dtype=object).str.startswith(tuple(set(curie_dct.values()))).values, False)
+    unknown = edges.property_uri[~known[uri_codes].astype(bool)].fillna('NA').astype(str)
+    checks['unknown_property_uris'] = {'count': int(len(unknown)),
+                                       'sample': unknown.value_counts().head(sample_size).to_dict()}
+
+    errors = ['dangling_endpoints', 'duplicated_ids']
+    report = {
+        'date': str(today),
+        'edges': int(len(edges)),
+        'nodes': int(len(nodes)),
+        'valid': all(checks[check]['count'] == 0 for check in errors),
+        'errors': {check: checks[check] for check in errors},
+        'warnings': {check: checks[check] for check in checks if check not in errors}
+    }
+
+    # save report
+    path = os.getcwd() + "/graph"
+    if not os.path.isdir(path): os.makedirs(path)
+    with open('{}/graph_validation_v{}.json'.format(path, today), 'w') as f:
+        json.dump(report, f, indent=2)
+    for check, result in checks.items():
+        print('* {}: {}'.format(check, result['count']))
+    print('\nThe graph is {}. The validation report is saved at: {}/graph_validation_v{}.json\n'.format(
+        'valid' if report['valid'] else 'NOT valid', path, today))
+    if strict and not report['valid']:
+        raise ValueError('The graph is not valid: {}'.format(
+            {check: checks[check]['count'] for check in errors if checks[check]['count']}))
+
+    return report
+
+
 # USER FUNCTIONS
 
 def _build(network_list):
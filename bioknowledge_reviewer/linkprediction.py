@@ -0,0 +1,511 @@
+# @name: linkprediction.py
+# @description: Module for in-process link prediction on the graph adjacency matrix
+# @version: 1.0
+
+# The scores are the neo4j gds.alpha.linkprediction functions over all the relationships in both directions,
+# with N(x) the set of neighbours of node x:
+# commonNeighbors: |N(x) & N(y)|
+# adamicAdar: sum of 1/log(|N(u)|) over u in N(x) & N(y)
+# resourceAllocation: sum of 1/|N(u)| over u in N(x) & N(y)
+# preferentialAttachment: |N(x)| * |N(y)|
+# totalNeighbors: |N(x) | N(y)|
+"""Module for link prediction scores computed on a sparse adjacency matrix, without a running database"""
+
+import datetime
+import json
+import os
+import pickle
+import re
+import sys
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+import utils
+
+
+# VARIABLES
+today = datetime.date.today()
+
+# link prediction scores, named as the neo4j functions
+score_columns = ['adamicAdar', 'commonNeighbors', 'preferentialAttachment', 'resourceAllocation',
+                 'totalNeighbors']
+
+# result columns, as recommender.query_targets
+result_columns = ['Node1.preflabel', 'Node2.preflabel', 'Node2.id'] + score_columns
+
+
+# FUNCTIONS
+
+def read_edge_list(filename):
+    """
+    This function reads the subject and object IDs of a graph edges file: graph_edges_v* (CSV or columnar), \
+    a neo4j import statements CSV, or the neo4j import manifest (HD_statements.json) of the split files.
+    :param filename: path_to_file_name string
+    :return: edge list dataframe with 'subject_id' and 'object_id' columns
+    """
+
+    if filename.endswith('.json'):
+        with open(filename) as f:
+            manifest = json.load(f)
+        path = os.path.dirname(filename)
+        columns = pd.read_csv('{}/{}'.format(path, manifest['header']), nrows=0).columns.tolist()
+        usecols = [columns.index(':START_ID'), columns.index(':END_ID')]
+        parts = [pd.read_csv('{}/{}'.format(path, part), header=None, usecols=usecols, dtype=str,
+                             keep_default_na=False) for part in manifest['parts']]
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=usecols)
+        df.columns = [columns[i] for i in usecols]
+    else:
+        df = utils.get_dataframe_from_file(filename)
+    df = df.rename(columns={':START_ID': 'subject_id', ':END_ID': 'object_id'})
+
+    return df[['subject_id', 'object_id']]
+
+
+def _attach_shared_memory(name):
+    """
+    This function attaches to a shared memory block without tracking it, as track=False of Python 3.13: the \
+    block is unlinked by its creator, not by the resource tracker when the attached process ends. Registering \
+    and unregistering the block instead would also drop it from the tracker shared with the creator.
+    :param name: shared memory block name string
+    :return: SharedMemory object
+    """
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class GraphAdjacency(object):
+    """
+    Undirected adjacency matrix of the graph in CSR format: the neighbours of the node with code i are \
+    indices[indptr[i]:indptr[i+1]]. Node codes are the ones of the IdDictionary, so the link prediction scores \
+    of a seed against all its 2-hop candidates are computed with a few sparse products.
+    """
+
+    def __init__(self, subjects, objects, ids=None, preflabels=None):
+        """
+        :param subjects: iterable of subject CURIE strings
+        :param objects: iterable of object CURIE strings
+        :param ids: IdDictionary object of the node codes (default a new dictionary of the graph)
+        :param preflabels: series of node preflabels indexed by CURIE (optional)
+        """
+
+        if sp is None:
+            raise ImportError('scipy is required to build the graph adjacency matrix.')
+        self.ids = utils.IdDictionary() if ids is None else ids
+        subject_codes = self.ids.encode(subjects)
+        object_codes = self.ids.encode(objects)
+        if preflabels is not None:
+            self.ids.add(preflabels.index)
+        n = len(self.ids)
+
+        # binary symmetric matrix: parallel edges and edge directions collapse, self loops are dropped
+        keep = (subject_codes >= 0) & (object_codes >= 0) & (subject_codes != object_codes)
+        rows = np.concatenate([subject_codes[keep], object_codes[keep]])
+        cols = np.concatenate([object_codes[keep], subject_codes[keep]])
+        matrix = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+        matrix.sum_duplicates()
+        # the number of statements of every node pair is kept to apply removed statements
+        counts = matrix.data.astype(np.int32)
+        matrix.data[:] = 1.
+
+        node_preflabels = np.full(n, None, dtype=object)
+        if preflabels is not None:
+            codes = self.ids.encode(preflabels.index, add=False)
+            node_preflabels[codes[codes >= 0]] = np.asarray(preflabels, dtype=object)[codes >= 0]
+        self._set_matrix(matrix, node_preflabels, counts)
+
+    def _set_matrix(self, matrix, preflabels=None, counts=None):
+        """This method sets the adjacency matrix and the node degrees and weights derived from it."""
+
+        self.matrix = matrix
+        self.counts = counts
+        self.degree = np.diff(matrix.indptr).astype(np.float64)
+        self.preflabels = np.full(matrix.shape[0], None, dtype=object) if preflabels is None else preflabels
+
+        # weights of a common neighbour u: 1/log(|N(u)|) and 1/|N(u)|. A common neighbour of two different nodes
+        # has at least two neighbours, so nodes with less are weighted 0 instead of infinity.
+        with np.errstate(divide='ignore'):
+            self.adamic_adar_weight = np.where(self.degree > 1, 1. / np.log(self.degree), 0.)
+            self.resource_allocation_weight = np.where(self.degree > 0, 1. / self.degree, 0.)
+
+    @classmethod
+    def from_matrix(cls, matrix, ids=None, preflabels=None, counts=None):
+        """
+        This method returns the adjacency of a CSR matrix, e.g. attached from shared memory.
+        :param matrix: binary symmetric scipy CSR matrix
+        :param ids: IdDictionary object of the node codes (optional)
+        :param preflabels: node preflabels array by code (optional)
+        :param counts: number of statements of every matrix entry, aligned with matrix.indices (optional)
+        :return: GraphAdjacency object
+        """
+
+        adjacency = cls.__new__(cls)
+        adjacency.ids = utils.IdDictionary() if ids is None else ids
+        adjacency._set_matrix(matrix, preflabels, counts)
+        return adjacency
+
+    def save(self, filename):
+        """
+        This method saves the adjacency into a pickle file.
+        :param filename: path_to_file_name string
+        :return: None object
+        """
+
+        with open(filename, 'wb') as f:
+            pickle.dump({'indptr': self.matrix.indptr, 'indices': self.matrix.indices,
+                         'ids': np.asarray(self.ids.decode(np.arange(len(self.ids)))),
+                         'preflabels': self.preflabels, 'counts': self.counts}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        This method loads an adjacency saved into a pickle file. Node codes are the same as when it was saved.
+        :param filename: path_to_file_name string
+        :return: GraphAdjacency object
+        """
+
+        if sp is None:
+            raise ImportError('scipy is required to load the graph adjacency matrix.')
+        with open(filename, 'rb') as f:
+            arrays = pickle.load(f)
+        n = len(arrays['indptr']) - 1
+        matrix = sp.csr_matrix((np.ones(len(arrays['indices'])), arrays['indices'], arrays['indptr']), shape=(n, n))
+        return cls.from_matrix(matrix, utils.IdDictionary(arrays['ids']), arrays['preflabels'], arrays.get('counts'))
+
+    def to_shared_memory(self):
+        """
+        This method copies the adjacency matrix arrays into shared memory blocks. The caller closes and \
+        unlinks the blocks when the workers are done.
+        :return: tuple (list of SharedMemory objects, description dictionary for from_shared_memory)
+        """
+
+        blocks, description = [], {'shape': self.matrix.shape}
+        for name in ('data', 'indices', 'indptr'):
+            array = getattr(self.matrix, name)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            blocks.append(block)
+            description[name] = (block.name, array.shape, array.dtype.str)
+        return blocks, description
+
+    @classmethod
+    def from_shared_memory(cls, description):
+        """
+        This method attaches to an adjacency matrix in shared memory. The matrix is read-only.
+        :param description: description dictionary of to_shared_memory
+        :return: tuple (list of SharedMemory objects to close, GraphAdjacency object without IDs or preflabels)
+        """
+
+        blocks, arrays = [], dict()
+        for name in ('data', 'indices', 'indptr'):
+            block_name, shape, dtype = description[name]
+            block = _attach_shared_memory(block_name)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            arrays[name].flags.writeable = False
+            blocks.append(block)
+        matrix = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=description['shape'],
+                               copy=False)
+        return blocks, cls.from_matrix(matrix)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @classmethod
+    def from_statements(cls, edges, nodes=None, ids=None):
+        """
+        This method builds the adjacency matrix of a graph.
+        :param edges: statements dataframe
+        :param nodes: concepts dataframe, to add the preflabels (optional)
+        :param ids: IdDictionary object of the node codes (default a new dictionary of the graph)
+        :return: GraphAdjacency object
+        """
+
+        preflabels = None if nodes is None else pd.Series(nodes.preflabel.values, index=nodes.id.values)
+        return cls(edges.subject_id, edges.object_id, ids=ids, preflabels=preflabels)
+
+    @classmethod
+    def from_file(cls, edges_file, nodes_file=None, ids=None):
+        """
+        This method builds the adjacency matrix of a graph file, e.g. graph/graph_edges_v*.csv or the neo4j \
+        import statements.
+        :param edges_file: path_to_file_name string of the edges (see read_edge_list)
+        :param nodes_file: path_to_file_name string of the nodes, to add the preflabels (optional)
+        :param ids: IdDictionary object of the node codes (default a new dictionary of the graph)
+        :return: GraphAdjacency object
+        """
+
+        print('\nLoading the graph adjacency matrix from: {}'.format(edges_file))
+        edges = read_edge_list(edges_file)
+        nodes = None
+        if nodes_file is not None:
+            nodes = utils.get_dataframe_from_file(nodes_file)
+            nodes = nodes.rename(columns={'id:ID': 'id'})
+        adjacency = cls.from_statements(edges, nodes, ids=ids)
+        print('Adjacency matrix of {} nodes and {} edges.'.format(len(adjacency), adjacency.matrix.nnz // 2))
+
+        return adjacency
+
+    def neighbours(self, code):
+        """
+        This method returns the neighbour codes of a node.
+        :param code: node code int
+        :return: int32 codes array
+        """
+
+        return self.matrix.indices[self.matrix.indptr[code]:self.matrix.indptr[code + 1]]
+
+    def score_codes(self, seed_code, candidate_codes=None):
+        """
+        This method computes the link prediction scores between a seed and its 2-hop candidates, i.e. the nodes \
+        with at least one common neighbour with the seed, other than the seed itself.
+        :param seed_code: node code int of the seed
+        :param candidate_codes: array of node codes to score (default all the 2-hop candidates). Candidates without \
+        common neighbours are dropped.
+        :return: tuple (candidate codes array, scores array of shape (candidates, score_columns))
+        """
+
+        row = self.matrix[seed_code]
+        # common neighbours, Adamic-Adar and resource allocation: the seed row, unweighted and weighted by the
+        # degree of the common neighbour, times the adjacency matrix
+        paths = sp.vstack([row,
+                           row.multiply(self.adamic_adar_weight),
+                           row.multiply(self.resource_allocation_weight)]).tocsr()
+        if candidate_codes is None:
+            paths = paths @ self.matrix
+            candidate_codes = paths[0].indices
+            candidate_codes = candidate_codes[candidate_codes != seed_code]
+            common, adamic_adar, resource_allocation = paths[:, candidate_codes].toarray()
+        else:
+            # only the candidate rows of the symmetric matrix, so the cost depends on the candidates
+            candidate_codes = np.asarray(candidate_codes, dtype=np.int32)
+            candidate_codes = candidate_codes[candidate_codes != seed_code]
+            common, adamic_adar, resource_allocation = (self.matrix[candidate_codes] @ paths.T).toarray().T
+        connected = common > 0
+        candidate_codes = candidate_codes[connected]
+        common = common[connected]
+
+        seed_degree = self.degree[seed_code]
+        candidate_degree = self.degree[candidate_codes]
+        scores = np.column_stack([adamic_adar[connected],
+                                  common,
+                                  seed_degree * candidate_degree,
+                                  resource_allocation[connected],
+                                  seed_degree + candidate_degree - common])
+
+        return candidate_codes, scores
+
+    def scores(self, seed, targets=None):
+        """
+        This method computes the link prediction scores between a seed node and its 2-hop candidates.
+        :param seed: seed node CURIE string
+        :param targets: iterable of target CURIE strings to score (default all the 2-hop candidates)
+        :return: scores dataframe with the columns of recommender.query_targets, one row per candidate
+        """
+
+        seed_code = self.ids.encode([seed], add=False)[0]
+        if seed_code < 0 or seed_code >= len(self):
+            print('The seed {} is not in the graph.'.format(seed))
+            return pd.DataFrame(columns=result_columns)
+        candidate_codes = None
+        if targets is not None:
+            candidate_codes = self.ids.encode(targets, add=False)
+            candidate_codes = candidate_codes[(candidate_codes >= 0) & (candidate_codes < len(self))]
+        candidate_codes, scores = self.score_codes(seed_code, candidate_codes)
+
+        df = pd.DataFrame(scores, columns=score_columns)
+        df.insert(0, 'Node2.id', self.ids.decode(candidate_codes))
+        df.insert(0, 'Node2.preflabel', self.preflabels[candidate_codes])
+        df.insert(0, 'Node1.preflabel', self.preflabels[seed_code])
+
+        return df
+
+
+
+def get_graph_version(filename):
+    """
+    This function returns the graph version of a graph file name, e.g. 2022-07-24 for graph_edges_v2022-07-24.csv.
+    :param filename: path_to_file_name string
+    :return: graph version string (the file name without extension if it has no version)
+    """
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    match = re.search(r'_v([^_]+)$', name)
+    return match.group(1) if match else name
+
+
+def get_adjacency_file(version):
+    """
+    This function returns the path to the adjacency file of a graph version.
+    :param version: graph version string
+    :return: path_to_file_name string
+    """
+
+    path = os.getcwd() + "/graph"
+    if not os.path.isdir(path): os.makedirs(path)
+    return '{}/graph_adjacency_v{}.pickle'.format(path, version)
+
+
+def load_adjacency(edges_file, nodes_file=None):
+    """
+    This function returns the adjacency of a graph version. It is built once and saved at \
+    graph/graph_adjacency_v{version}.pickle, then loaded from there while it is more recent than the edges file.
+    :param edges_file: path_to_file_name string of the edges (see read_edge_list)
+    :param nodes_file: path_to_file_name string of the nodes, to add the preflabels (optional)
+    :return: GraphAdjacency object
+    """
+
+    adjacency_file = get_adjacency_file(get_graph_version(edges_file))
+    sources = [utils.get_columnar_file(f) or f for f in (edges_file, nodes_file) if f]
+    if os.path.isfile(adjacency_file) and \
+            os.path.getmtime(adjacency_file) >= max(os.path.getmtime(f) for f in sources if os.path.isfile(f)):
+        print('\nLoading the graph adjacency matrix from: {}'.format(adjacency_file))
+        return GraphAdjacency.load(adjacency_file)
+    adjacency = GraphAdjacency.from_file(edges_file, nodes_file)
+    adjacency.save(adjacency_file)
+    print('Graph adjacency matrix saved at: {}'.format(adjacency_file))
+
+    return adjacency
+
+
+# INCREMENTAL UPDATES
+
+def update_adjacency(adjacency, added=None, removed=None):
+    """
+    This function applies a graph delta to an adjacency. New node IDs are added to the dictionary, so the codes \
+    of the previous adjacency stay valid. A node pair stays adjacent while it has any statement left.
+    :param adjacency: GraphAdjacency object of the previous graph version
+    :param added: added statements dataframe (subject_id, object_id), e.g. from neo4jlib.get_delta()
+    :param removed: removed statements dataframe (subject_id, object_id)
+    :return: tuple (GraphAdjacency object of the new version, codes array of the nodes whose neighbours changed)
+    """
+
+    if adjacency.counts is None:
+        raise ValueError('The adjacency has no statement counts, please rebuild it from the graph edges.')
+    ids = utils.IdDictionary(adjacency.ids.decode(np.arange(len(adjacency.ids))))
+    subjects, objects, signs = [], [], []
+    for delta, sign, add in ((added, 1, True), (removed, -1, False)):
+        if delta is None or delta.empty:
+            continue
+        delta = delta.rename(columns={':START_ID': 'subject_id', ':END_ID': 'object_id'})
+        subject_codes = ids.encode(delta.subject_id, add=add)
+        object_codes = ids.encode(delta.object_id, add=add)
+        keep = (subject_codes >= 0) & (object_codes >= 0) & (subject_codes != object_codes)
+        subjects.append(subject_codes[keep])
+        objects.append(object_codes[keep])
+        signs.append(np.full(keep.sum(), sign, dtype=np.int32))
+    n, old_n = len(ids), len(adjacency)
+    if not subjects:
+        return adjacency, np.array([], dtype=np.int32)
+
+    rows = np.concatenate(subjects + objects)
+    cols = np.concatenate(objects + subjects)
+    signs = np.concatenate(signs * 2)
+    indptr = np.concatenate([adjacency.matrix.indptr,
+                             np.full(n - old_n, adjacency.matrix.indptr[-1], dtype=adjacency.matrix.indptr.dtype)])
+    old_counts = sp.csr_matrix((adjacency.counts, adjacency.matrix.indices, indptr), shape=(n, n))
+    counts = (old_counts + sp.csr_matrix((signs, (rows, cols)), shape=(n, n))).tocsr()
+    counts.data[counts.data < 0] = 0
+    counts.eliminate_zeros()
+    counts.sort_indices()
+    matrix = sp.csr_matrix((np.ones(counts.nnz), counts.indices, counts.indptr), shape=(n, n))
+
+    # nodes of the pairs that became adjacent or not adjacent
+    before = np.asarray(old_counts[rows, cols]).ravel() > 0
+    after = np.asarray(counts[rows, cols]).ravel() > 0
+    changed = np.unique(np.concatenate([rows[before != after], cols[before != after]])).astype(np.int32)
+
+    preflabels = np.concatenate([adjacency.preflabels, np.full(n - old_n, None, dtype=object)])
+    new_adjacency = GraphAdjacency.from_matrix(matrix, ids, preflabels, counts.data.astype(np.int32))
+    print('Graph delta applied: {} nodes with changed neighbours.'.format(len(changed)))
+
+    return new_adjacency, changed
+
+
+def get_affected_candidates(old_adjacency, new_adjacency, seed_code, changed):
+    """
+    This function returns the candidates whose scores with a seed can change after a graph delta: the nodes with \
+    changed neighbours (degree and common neighbours change), and the neighbours of those nodes that are \
+    adjacent to the seed (their common neighbour weight changes).
+    :param old_adjacency: GraphAdjacency object before the delta
+    :param new_adjacency: GraphAdjacency object after the delta
+    :param seed_code: node code int of the seed
+    :param changed: codes array of the nodes whose neighbours changed (see update_adjacency)
+    :return: candidate codes array, or None when all the candidates of the seed are affected
+    """
+
+    changed = np.asarray(changed)
+    if seed_code >= len(old_adjacency) or np.isin(seed_code, changed):
+        return None
+    affected = [changed]
+    for adjacency in (old_adjacency, new_adjacency):
+        nodes = changed[changed < len(adjacency)]
+        nodes = nodes[np.isin(nodes, adjacency.neighbours(seed_code))]
+        affected.extend(adjacency.neighbours(code) for code in nodes)
+    return np.unique(np.concatenate(affected)).astype(np.int32)
+
+
+def update_scores(table, old_adjacency, new_adjacency, seed_code, changed):
+    """
+    This function updates the score table of a seed after a graph delta, recomputing only the affected \
+    candidates (see get_affected_candidates).
+    :param table: scores dataframe of the seed with 'Node2.code' and score_columns columns, or None
+    :param old_adjacency: GraphAdjacency object before the delta
+    :param new_adjacency: GraphAdjacency object after the delta
+    :param seed_code: node code int of the seed
+    :param changed: codes array of the nodes whose neighbours changed (see update_adjacency)
+    :return: updated scores dataframe
+    """
+
+    candidate_codes = None if table is None else \
+        get_affected_candidates(old_adjacency, new_adjacency, seed_code, changed)
+    codes, scores = new_adjacency.score_codes(seed_code, candidate_codes)
+    df = pd.DataFrame(scores, columns=score_columns)
+    df.insert(0, 'Node2.code', codes)
+    if candidate_codes is None:
+        return df
+    table = table[~table['Node2.code'].isin(candidate_codes)]
+    return pd.concat([table, df], ignore_index=True)
+
+
+def get_scores_file(seed, version):
+    """
+    This function returns the path to the score table file of a seed in a graph version.
+    :param seed: seed node CURIE string
+    :param version: graph version string
+    :return: path_to_file_name string
+    """
+
+    path = '{}/graph/scores_v{}'.format(os.getcwd(), version)
+    if not os.path.isdir(path): os.makedirs(path)
+    return '{}/{}.pickle'.format(path, re.sub(r'[^\w.-]', '_', seed))
+
+
+def load_scores(seed, version):
+    """
+    This function loads the score table of a seed in a graph version.
+    :param seed: seed node CURIE string
+    :param version: graph version string
+    :return: scores dataframe, or None if there is none saved
+    """
+
+    scores_file = get_scores_file(seed, version)
+    if not os.path.isfile(scores_file):
+        return None
+    return pd.read_pickle(scores_file)
+
+if __name__ == '__main__':
+    # score the recommender seed against all its 2-hop candidates
+    adjacency = GraphAdjacency.from_file('./graph/graph_edges_v2022-07-24.csv', './graph/graph_nodes_v2022-07-24.csv')
+    results = adjacency.scores('MONDO:0007739')
+    print(results.sort_values(by='totalNeighbors'))
+    results.to_csv('linkprediction_targets_v{}.csv'.format(today), index=False)
@@ -14,6 +14,7 @@ import sys,os
 import json
 import datetime
 import pandas as pd
+import utils
 from biothings_client import get_client
 from tqdm import tqdm
 import pickle
@@ -740,13 +741,13 @@ def build_edges(edges_df):
     print('df',df.shape)
     df = df[['subject_id', 'property_id', 'object_id', 'reference_uri', 'reference_supporting_text', 'reference_date', \
              'property_label', 'property_description', 'property_uri']]
-    df.fillna('NA').to_csv('{}/monarch_edges_v{}.csv'.format(path,today), index=False)
+    saved = utils.save_dataframe(df, '{}/monarch_edges_v{}.csv'.format(path,today))
 
     # print info
     print('\n* This is the size of the edges file data structure: {}'.format(pd.DataFrame(edges_l).shape))
     print('* These are the edges attributes: {}'.format(pd.DataFrame(edges_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(edges_l).head(1)))
-    print('\nThe Monarch network edges are built and saved at: {}/monarch_edges_v{}.csv\n'.format(path,today))
+    print('\nThe Monarch network edges are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_edges().\n')
 
     return edges_l
@@ -899,13 +900,13 @@ def build_nodes(edges_df):
     df = pd.DataFrame(nodes_l)
     df = df[['id', 'semantic_groups', 'preflabel', 'synonyms', 'description', 'name']]
     #TODO: check why i am saving as csv but naming the file tsv
-    df.fillna('NA').to_csv('{}/monarch_nodes_v{}.csv'.format(path,today), index=False)
+    saved = utils.save_dataframe(df, '{}/monarch_nodes_v{}.csv'.format(path,today))
 
     # print info
     print('\n* This is the size of the nodes file data structure: {}'.format(pd.DataFrame(nodes_l).shape))
     print('* These are the nodes attributes: {}'.format(pd.DataFrame(nodes_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(nodes_l).head(1)))
-    print('\nThe Monarch network nodes are built and saved at: {}/monarch_nodes_v{}.csv\n'.format(path,today))
+    print('\nThe Monarch network nodes are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_nodes().\n')
 
     return nodes_l
@@ -9,7 +9,194 @@ Created on Sep 30, 2016
 @license: CC0
 '''
 
-import re, sys
+import sys
+import os
+from bisect import bisect_right
+import hashlib
+import pickle
+import xml.etree.ElementTree as ET
+
+# namespaces used in the OWL/XML serialization
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDFS = 'http://www.w3.org/2000/01/rdf-schema#'
+OWL = 'http://www.w3.org/2002/07/owl#'
+OBOINOWL = 'http://www.geneontology.org/formats/oboInOwl#'
+OBO = 'http://purl.obolibrary.org/obo/'
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+prefixes = {RDF: 'rdf', RDFS: 'rdfs', OWL: 'owl', OBOINOWL: 'oboInOwl', OBO: 'obo', SKOS: 'skos',
+            'http://purl.org/dc/elements/1.1/': 'dc', 'http://purl.org/dc/terms/': 'dcterms',
+            'http://purl.obolibrary.org/obo/mondo#': 'mondo'}
+
+# bump when the compiled ontology structure changes to invalidate old caches
+cache_version = 3
+
+# cross-reference prefixes aliases to the graph CURIE prefixes
+xref_prefixes = {'ORPHA': 'Orphanet', 'ORDO': 'Orphanet', 'MIM': 'OMIM'}
+
+
+def _qname(tag):
+    """
+    This function returns the prefixed name of an ElementTree tag, e.g. '{http://www.w3.org/2000/01/rdf-schema#}label' \
+    as 'rdfs:label'. Unknown namespaces are prefixed with their last path segment.
+    :param tag: ElementTree tag string
+    :return: prefixed name string
+    """
+
+    ns, local = tag[1:].split('}', 1)
+    prefix = prefixes.get(ns) or ns.rstrip('#/').rsplit('/', 1)[-1].replace(':', '_')
+    return '{}:{}'.format(prefix, local)
+
+
+def _file_digest(filename, blocksize=1 << 20):
+    """
+    This function returns the SHA-1 hex digest of a file read in blocks.
+    :param filename: path to file string
+    :param blocksize: block size in bytes
+    :return: hex digest string
+    """
+
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def parse_owl(owl_path):
+    """
+    This function parses an OWL/XML ontology file in a single streaming pass.
+    :param owl_path: path to the OWL/XML ontology file string
+    :return: compiled ontology dictionary with 'metadata' (list of term dictionaries: id, iri, label, synonyms, \
+    definition), 'xrefs' ({id: [xref]}), 'equivalents' ({id: [iri]}), 'relations' ([(subject_id, property, \
+    object_iri)]) and 'deprecated' ({id}) keys
+    """
+
+    about = '{%s}about' % RDF
+    resource = '{%s}resource' % RDF
+    owl_class = '{%s}Class' % OWL
+    label_tag = '{%s}label' % RDFS
+    synonym_tag = '{%s}hasExactSynonym' % OBOINOWL
+    definition_tag = '{%s}IAO_0000115' % OBO
+    xref_tag = '{%s}hasDbXref' % OBOINOWL
+    equivalent_tag = '{%s}equivalentClass' % OWL
+    deprecated_tag = '{%s}deprecated' % OWL
+
+    metadata = []
+    xrefs = {}
+    equivalents = {}
+    relations = []
+    deprecated = set()
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(owl_path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        # only top-level declarations (direct children of rdf:RDF)
+        if depth != 1:
+            continue
+        iri = elem.get(about)
+        if elem.tag == owl_class and iri:
+            id = iri.rsplit('/', 1)[1].replace('_', ':')
+            label = 'NA'
+            definition = 'NA'
+            synonyms_l = []
+            xrefs_l = []
+            equivalents_l = []
+            for child in elem:
+                if child.tag == label_tag:
+                    if label == 'NA' and child.text:
+                        label = child.text
+                elif child.tag == synonym_tag:
+                    if child.text:
+                        synonyms_l.append(child.text)
+                elif child.tag == definition_tag:
+                    if definition == 'NA' and child.text:
+                        definition = child.text
+                elif child.tag == xref_tag:
+                    if child.text:
+                        xrefs_l.append(child.text.strip())
+                elif child.tag == deprecated_tag:
+                    if child.text and child.text.strip() == 'true':
+                        deprecated.add(id)
+                # named class axioms only (anonymous restrictions are not resources)
+                object_iri = child.get(resource)
+                if object_iri:
+                    if child.tag == equivalent_tag:
+                        equivalents_l.append(object_iri)
+                    relations.append((id, _qname(child.tag), object_iri))
+            metadata.append({
+                'id': id,
+                'iri': iri,
+                'label': label,
+                'synonyms': '|'.join(synonyms_l) if synonyms_l else 'NA',
+                'definition': definition
+            })
+            if xrefs_l:
+                xrefs[id] = xrefs_l
+            if equivalents_l:
+                equivalents[id] = equivalents_l
+        # free the subtree already processed
+        root.clear()
+
+    return {'metadata': metadata, 'xrefs': xrefs, 'equivalents': equivalents, 'relations': relations,
+            'deprecated': deprecated}
+
+
+def iri_to_curie(iri):
+    """
+    This function returns the CURIE of a class IRI, e.g. 'http://www.orpha.net/ORDO/Orphanet_869' as 'Orphanet:869'.
+    :param iri: IRI string
+    :return: CURIE string
+    """
+
+    if 'identifiers.org/omim/' in iri or 'omim.org/entry/' in iri:
+        return 'OMIM:' + iri.rstrip('/').rsplit('/', 1)[1]
+    return iri.rsplit('/', 1)[1].replace('_', ':', 1)
+
+
+def normalize_xref(xref):
+    """
+    This function normalizes the prefix of a cross-reference CURIE, e.g. 'ORPHA:869' as 'Orphanet:869'.
+    :param xref: CURIE string
+    :return: CURIE string
+    """
+
+    if ':' not in xref:
+        return xref
+    prefix, local = xref.split(':', 1)
+    return '{}:{}'.format(xref_prefixes.get(prefix.upper(), prefix), local.strip())
+
+
+def load_owl(owl_path, cache_dir=None):
+    """
+    This function returns the compiled ontology from parse_owl(), cached by the hash of the OWL file.
+    :param owl_path: path to the OWL/XML ontology file string
+    :param cache_dir: directory to store the cache string (default: the OWL file directory)
+    :return: compiled ontology dictionary
+    """
+
+    digest = _file_digest(owl_path)
+    if cache_dir is None:
+        cache_dir = os.path.dirname(os.path.abspath(owl_path))
+    if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+    cache_f = os.path.join(cache_dir, '.{}.v{}.{}.pickle'.format(os.path.basename(owl_path), cache_version,
+                                                                 digest[:16]))
+    if os.path.isfile(cache_f):
+        with open(cache_f, 'rb') as f:
+            return pickle.load(f)
+
+    ontology = parse_owl(owl_path)
+    tmp_f = '{}.{}.tmp'.format(cache_f, os.getpid())
+    with open(tmp_f, 'wb') as f:
+        pickle.dump(ontology, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_f, cache_f)
+
+    return ontology
+
 
 class term(object):
     '''
@@ -17,93 +204,37 @@ class term(object):
     '''
 
 
-    def __init__(self, mondo_owl):
+    def __init__(self, mondo_owl, cache_dir=None):
         '''
         Constructor
+        :param mondo_owl: path to the OWL/XML ontology file
+        :param cache_dir: directory of the compiled ontology cache (default: the OWL file directory)
         '''
 
         self.metadata = []
         self.doid2orpha = {}
 
         # Input
-        with open(mondo_owl, 'r') as mondo_f:
-            mondo_d = mondo_f.read()
-        mondo_f.close()
-
-        # RE patterns
-        iri_pattern = re.compile(r'<owl:Class rdf:about="(.+)"(.*)>')
-        label_pattern = re.compile(r'<rdfs:label(.+)>(.+)</rdfs:label>')
-        exact_synonym_pattern = re.compile(r'<oboInOwl:hasExactSynonym(.+)>(.+)</oboInOwl:hasExactSynonym>')
-        definition_pattern = re.compile(r'<obo1:IAO_0000115(.+)>(.+)</obo1:IAO_0000115>')
-        doid_pattern = re.compile(r' <owl:Class rdf:about="http://purl.obolibrary.org/obo/DOID_(.+)">')
-        orpha_pattern = re.compile(r'<owl:equivalentClass rdf:resource="http://www.orpha.net/ORDO/Orphanet_(.+)"/>')
-
-        # Algorithm
-        # Classes in chunks
-        mondo_terms = mondo_d.strip().split('</rdf:RDF>')[0].split('// Classes')[1].split('<!-- ')[1:]
+        ontology = load_owl(mondo_owl, cache_dir)
 
         # Get term metadata
-        # Parse chunks and extract mappings, term info
-        for term in mondo_terms:
-            concept = {}
-            # get term id, iri
-            iri_match = iri_pattern.search(term)
-            try:
-                iri = iri_match.group(1)
-            except AttributeError:
-                #print('term that is not a class: ',term)
-                continue
-            id = iri.rsplit('/',1)[1].replace('_',':')
-
-            # get term info: label, synonyms, definition
-            label_match = label_pattern.search(term)
-            if not label_match:
-                label = 'NA'
-            else:
-                label = label_match.group(2)
-            synonym_matches = exact_synonym_pattern.finditer(term)
-            synonyms_l = []
-            for synonym_match in synonym_matches:
-                synonym = synonym_match.group(2)
-                synonyms_l.append(synonym)
-            synonyms = "|".join(synonyms_l)
-            if not synonyms:
-                synonyms = 'NA'
-            definition_match = definition_pattern.search(term)
-            if not definition_match:
-                definition = 'NA'
-            else:
-                definition = definition_match.group(2)
-
-            # build the concept dictionary
-            concept['id'] = id
-            concept['iri'] = iri
-            concept['label'] = label
-            concept['synonyms'] = synonyms
-            concept['definition'] = definition
-
-            # append the concept to the list of terms
-            self.metadata.append(concept)
-
+        self.metadata = ontology['metadata']
+        self.xrefs = ontology['xrefs']
+        self.equivalents = ontology['equivalents']
+        self.deprecated = ontology['deprecated']
+        self._xref_index = None
+        self._metadata_dct = {concept['id']: concept for concept in self.metadata}
 
         # Get do2orpha mappings
-        # Parse chunks and extract mappings, term info
-        for term in mondo_terms:
-            # DOID class
-            doid_match = doid_pattern.search(term)
-            if not doid_match:
-                continue
-            doid_code = 'DOID:' + doid_match.group(1)
-
-            # Orphanet equivalent classes (mappings)
-            orpha_matches = orpha_pattern.finditer(term)
-            if not orpha_matches:
+        # DOID classes and their Orphanet equivalent classes (mappings)
+        for concept in self.metadata:
+            if not concept['iri'].startswith('http://purl.obolibrary.org/obo/DOID_'):
                 continue
             orpha_l = []
-            for orpha_match in orpha_matches:
-                orpha_code = 'Orphanet:' + orpha_match.group(1)
-                orpha_l.append(orpha_code)
-            self.doid2orpha[doid_code] = set(orpha_l)
+            for iri in self.equivalents.get(concept['id'], []):
+                if iri.startswith('http://www.orpha.net/ORDO/Orphanet_'):
+                    orpha_l.append('Orphanet:' + iri.rsplit('_', 1)[1])
+            self.doid2orpha[concept['id']] = set(orpha_l)
 
     def get_metadata_per_id(self, id):
         '''
@@ -115,10 +246,7 @@ class term(object):
         if '_' in id:
             id = id.replace('_',':')
 
-        concept = 0
-        for term in self.metadata:
-            if term['id'] == id:
-                concept = term
+        concept = self._metadata_dct.get(id, 0)
         if concept:
             return concept
         else:
@@ -172,16 +300,51 @@ class term(object):
         '''
         return self.doid2orpha.get(doid, ['NA'])
 
+    def get_xref_index(self, namespace='MONDO'):
+        '''
+        This function returns the reverse cross-reference index of the ontology: every equivalent class and database \
+        cross-reference (hasDbXref) CURIE mapped to the class of the namespace that declares it. Equivalent classes \
+        take precedence. Deprecated classes and CURIEs shared by more than one class are left out.
+        :param namespace: namespace of the target classes, e.g. 'MONDO'
+        :return: dict, {xref CURIE: class ID}, e.g. {'OMIM:143100': 'MONDO:0007739'}
+        '''
+
+        if self._xref_index is not None and self._xref_index[0] == namespace:
+            return self._xref_index[1]
+
+        prefix = namespace + ':'
+        xref_dct = {}
+        # cross-references first, then equivalent classes on top of them
+        for mappings, to_curie in ((self.xrefs, normalize_xref), (self.equivalents, iri_to_curie)):
+            mapping_dct = {}
+            ambiguous = set()
+            for id, values in mappings.items():
+                if not id.startswith(prefix) or id in self.deprecated:
+                    continue
+                for value in values:
+                    curie = to_curie(value)
+                    if mapping_dct.setdefault(curie, id) != id:
+                        ambiguous.add(curie)
+            for curie in ambiguous:
+                del mapping_dct[curie]
+            xref_dct.update(mapping_dct)
+        self._xref_index = (namespace, xref_dct)
+
+        return xref_dct
+
 
 class hierarchy(object):
     '''
     Inferred ontology - extraction of the hierarchy
     '''
 
-    def __init__(self, mondo_owl):
+    def __init__(self, mondo_owl, outfile='/home/nuria/soft/neo4j-community-3.0.3/import/mondo/mondo_statements.tsv',
+                 cache_dir=None):
         '''
         Constructor
-        :param mondo_owl:
+        :param mondo_owl: path to the OWL/XML ontology file
+        :param outfile: path to the neo4j statements output file
+        :param cache_dir: directory of the compiled ontology cache (default: the OWL file directory)
         '''
 
         self.totalNumberOfTerms = 0
@@ -189,44 +352,28 @@ class hierarchy(object):
         self.predicates = {}
 
         # Input
-        with open(mondo_owl, 'r') as mondo_f:
-            mondo_d = mondo_f.read()
+        ontology = load_owl(mondo_owl, cache_dir)
+        self.totalNumberOfTerms = len(ontology['metadata'])
 
         # Output
-        out_f = open('/home/nuria/soft/neo4j-community-3.0.3/import/mondo/mondo_statements.tsv', 'w')
+        out_f = open(outfile, 'w')
         out_f.write(':START_ID,:TYPE,association_type,pid,:END_ID,reference_uri,reference_supporting_text,reference_date\n')
 
-        # RE patterns
-        subjectIri_pattern = re.compile(r'<owl:Class rdf:about="(.+)">')
-        propertyObjectIris_pattern = re.compile(r'<(.+) rdf:resource="(.+)"/>')
-
         # Algorithm
-        # Classes in chunks
-        mondo_terms = mondo_d.strip().split('</rdf:RDF>')[0].split('// Classes')[1].split('<!-- ')[1:]
-        self.totalNumberOfTerms = len(mondo_terms)
-
-        # Parse chunks and extract relationships
+        # Class axioms: relationships
         pid = 'P279'
         reference_uri = "http://purl.obolibrary.org/obo/upheno/mondo.owl"
         reference_text = "No sentence because edge extracted from the MONDO ontology"
         reference_date = "2017-05-02"
-        for term in mondo_terms:
-            # extract relationships in each class disclosure
-            subjectIri_match = subjectIri_pattern.search(term)
-            subjectIri = subjectIri_match.group(1)
-            subjectId = subjectIri.rsplit('/',1)[1].replace('_',':')
-            objectPropertyIris_matches = propertyObjectIris_pattern.finditer(term)
-            for objectPropertyIris_match in objectPropertyIris_matches:
-                propertyIri = objectPropertyIris_match.group(1)
-                objectIri = objectPropertyIris_match.group(2)
-                propertyId = propertyIri.split(':')[1]
-                objectId = objectIri.rsplit('/',1)[1].replace('_', ':')
-                out_f.write('{},{},{},{},{},{},"{}",{}\n'.format(subjectId,propertyId,propertyId,pid,objectId,reference_uri,reference_text,reference_date))
-
-                # get information: distinct property and namespace types
-                self.predicates[propertyIri] = 1
-                ns = objectIri.rsplit('/',1)[1].split('_')[0]
-                self.namespaces[ns] = 1
+        for subjectId, propertyIri, objectIri in ontology['relations']:
+            propertyId = propertyIri.split(':', 1)[1]
+            objectId = iri_to_curie(objectIri)
+            out_f.write('{},{},{},{},{},{},"{}",{}\n'.format(subjectId,propertyId,propertyId,pid,objectId,reference_uri,reference_text,reference_date))
+
+            # get information: distinct property and namespace types
+            self.predicates[propertyIri] = 1
+            ns = objectIri.rsplit('/',1)[1].split('_')[0]
+            self.namespaces[ns] = 1
         out_f.close()
 
     def get_total_number_of_terms(self):
@@ -236,6 +383,175 @@ class hierarchy(object):
     def get_object_namespaces(self):
         return print('Distinct objects namespaces: {}'.format(self.namespaces.keys()))
 
+class closure(object):
+    '''
+    Transitive closure of the ontology hierarchy: ancestors and descendants of every class \
+    encoded as sorted post-order number intervals
+    '''
+
+    def __init__(self, subclass_pairs):
+        '''
+        Constructor
+        :param subclass_pairs: iterable of (child_id, parent_id) tuples, e.g. ('MONDO:0007739', 'MONDO:0005071')
+        '''
+
+        children = {}
+        parents = {}
+        for child, parent in subclass_pairs:
+            children.setdefault(child, [])
+            parents.setdefault(parent, [])
+            if child == parent:
+                continue
+            children.setdefault(parent, []).append(child)
+            parents.setdefault(child, []).append(parent)
+
+        # descending (subclasses) and ascending (superclasses) interval indexes
+        self._down = _interval_index(children, parents)
+        self._up = _interval_index(parents, children)
+
+    @classmethod
+    def from_owl(cls, *owl_paths, cache_dir=None):
+        '''
+        This function builds the closure from the named rdfs:subClassOf axioms of one or more OWL/XML \
+        ontologies, e.g. mondo.owl and go.owl.
+        :param owl_paths: paths to OWL/XML ontology files
+        :param cache_dir: directory of the compiled ontology cache (default: the OWL file directory)
+        :return: closure object
+        '''
+
+        pairs = []
+        for owl_path in owl_paths:
+            ontology = load_owl(owl_path, cache_dir)
+            for subject_id, property, object_iri in ontology['relations']:
+                if property == 'rdfs:subClassOf':
+                    pairs.append((subject_id, iri_to_curie(object_iri)))
+        return cls(pairs)
+
+    def __contains__(self, id):
+        return id in self._down[0]
+
+    def __len__(self):
+        return len(self._down[2])
+
+    def is_a(self, x, y):
+        '''
+        This function returns whether the class x is subsumed by the class y (reflexive).
+        :param x: class ID string
+        :param y: class ID string
+        :return: bool
+        '''
+
+        return _in_intervals(self._down, x, y)
+
+    def ancestors(self, id):
+        '''
+        This function returns all the superclasses of the queried class.
+        :param id: class ID string
+        :return: set of class IDs
+        '''
+
+        return _expand_intervals(self._up, id)
+
+    def descendants(self, id):
+        '''
+        This function returns all the subclasses of the queried class.
+        :param id: class ID string
+        :return: set of class IDs
+        '''
+
+        return _expand_intervals(self._down, id)
+
+    def rollup(self, id, categories):
+        '''
+        This function returns the categories, e.g. disease branches, under which the queried class falls.
+        :param id: class ID string
+        :param categories: list of class IDs
+        :return: list of class IDs
+        '''
+
+        return [category for category in categories if self.is_a(id, category)]
+
+
+def _interval_index(adjacency, reverse):
+    """
+    This function numbers a DAG in depth-first post-order and assigns every node the merged intervals \
+    of post-order numbers of the nodes it reaches.
+    :param adjacency: {node: [next nodes]} dictionary
+    :param reverse: {node: [previous nodes]} dictionary, used to start the traversal from the roots
+    :return: (post-order {node: int}, intervals {node: (starts, ends)}, nodes by post-order list) tuple
+    """
+
+    post = {}
+    intervals = {}
+    by_post = []
+    discovered = {}
+    roots = [node for node in adjacency if not reverse.get(node)]
+    for start in roots + list(adjacency):
+        if start in discovered:
+            continue
+        discovered[start] = len(by_post)
+        stack = [(start, iter(adjacency.get(start, ())))]
+        while stack:
+            node, nexts = stack[-1]
+            for next_node in nexts:
+                if next_node not in discovered:
+                    discovered[next_node] = len(by_post)
+                    stack.append((next_node, iter(adjacency.get(next_node, ()))))
+                    break
+            else:
+                stack.pop()
+                post[node] = len(by_post)
+                by_post.append(node)
+                # own spanning tree interval plus the intervals of every reachable node
+                # (nodes still on the stack close a cycle and are skipped)
+                merged = [(discovered[node], post[node])]
+                for next_node in adjacency.get(node, ()):
+                    if next_node in intervals:
+                        merged.extend(zip(*intervals[next_node]))
+                merged.sort()
+                starts = [merged[0][0]]
+                ends = [merged[0][1]]
+                for s, e in merged[1:]:
+                    if s <= ends[-1] + 1:
+                        if e > ends[-1]:
+                            ends[-1] = e
+                    else:
+                        starts.append(s)
+                        ends.append(e)
+                intervals[node] = (tuple(starts), tuple(ends))
+
+    return post, intervals, by_post
+
+
+def _in_intervals(index, x, y):
+    """
+    This function returns whether node x is reachable from node y (reflexive) in an interval index.
+    """
+
+    post, intervals, by_post = index
+    if x not in post or y not in post:
+        return False
+    p = post[x]
+    starts, ends = intervals[y]
+    i = bisect_right(starts, p) - 1
+    return i >= 0 and p <= ends[i]
+
+
+def _expand_intervals(index, id):
+    """
+    This function returns the nodes reachable from a node in an interval index, the node excluded.
+    """
+
+    post, intervals, by_post = index
+    if id not in post:
+        return set()
+    nodes = set()
+    for s, e in zip(*intervals[id]):
+        nodes.update(by_post[s:e + 1])
+    nodes.discard(id)
+    return nodes
+
+
 if __name__ == '__main__':
 
     try:
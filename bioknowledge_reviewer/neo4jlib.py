@@ -29,24 +29,69 @@
 """Module for Neo4j"""
 
 import datetime
+import json
 import os, sys
+import shutil
 import subprocess
 import re
+import socket
+import threading
 import time
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from utils import *
+import graph
+try:
+    from neo4j import GraphDatabase
+    import neo4j.exceptions
+except ImportError:
+    GraphDatabase = None
 
 # VARIABLES
 today = datetime.date.today()
 
+# server ports: bolt and http
+neo4j_host = 'localhost'
+neo4j_ports = (7687, 7474)
+
+# plugins installed by the server set up
+setup_plugins = ('neo4j-graph-data-science-2.3.2.jar', 'neosemantics-5.1.0.0.jar', 'apoc-5.1.0-core.jar')
+
+# bolt connection, from the environment or the server defaults
+bolt_uri = os.environ.get('NEO4J_URI', 'bolt://localhost:7687')
+bolt_auth = (os.environ.get('NEO4J_USER', 'neo4j'), os.environ.get('NEO4J_PASSWORD', 'HD'))
+
+# pooled drivers shared by the module functions, per (uri, auth)
+_drivers = dict()
+_drivers_lock = threading.Lock()
+
+# statement properties identifying a relationship (property_description is not imported)
+relationship_properties = ['reference_uri', 'reference_supporting_text', 'reference_date', 'property_label',
+                           'property_uri']
+
 # NETWORK MANAGEMENT FUNCTIONS
 
 
-def save_neo4j_files(object, neo4j_path, file_type = 'statements'):
+def _link_or_copy(source, destination):
+    """This function hard-links a file, or copies it if the file system does not support it."""
+
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def save_neo4j_files(object, neo4j_path, file_type = 'statements', max_rows=1000000, compress=True):
     """
-    This function saves the neo4j graph files in CSV format into the neo4j import directory.
+    This function saves the neo4j graph files in CSV format into the neo4j import directory, as a header file \
+    and parts of max_rows rows at most, listed in a manifest JSON file read by do_import().
     :param object: graph nodes or edges dataframe
     :param neo4j_path: path to neo4j directory string
     :param file_type: statements (default value) or concepts string
+    :param max_rows: maximum number of rows per part int
+    :param compress: True (default value) to gzip the parts
     :return: None object
     """
 
@@ -54,29 +99,78 @@ def save_neo4j_files(object, neo4j_path, file_type = 'statements'):
     # path = os.getcwd() + "/neo4j"
     # if not os.path.isdir(path): os.makedirs(path)
 
+    if file_type == 'statements':
+        name, split_column = 'HD_statements', ':TYPE'
+    elif file_type == 'concepts':
+        name, split_column = 'HD_concepts', ':LABEL'
+    else:
+        return print('The user should provide the "file_type" argument with any of the [statements or concepts] value.')
+
     # path_to_import
     graph_version = 'v{}'.format(today)
     path_to_import = neo4j_path + '/import/HD'
     path_to_version = neo4j_path + '/import/HD/' + graph_version
     for dir in path_to_import, path_to_version:
         if not os.path.isdir(dir): os.makedirs(dir)
-    # save filling null and with sep=','
-    if file_type == 'statements':
-        object.to_csv('{}/HD_statements.csv'.format(path_to_import),
-                          index=False, na_rep='NA')
-        object.to_csv('{}/HD_statements.csv'.format(path_to_version),
-                          index=False, na_rep='NA')
-        # object.fillna('NA').to_csv('{}/HD_statements_v{}.csv'.format(path,today), index=False)
-        return print("\nFile '{}/HD_statements.csv' saved.".format(path_to_import))
-    elif file_type == 'concepts':
-        object.to_csv('{}/HD_concepts.csv'.format(path_to_import),
-                        index=False, na_rep='NA')
-        object.to_csv('{}/HD_concepts.csv'.format(path_to_version),
-                    index=False, na_rep='NA')
-        # object.fillna('NA').to_csv('{}/HD_concepts_v{}.csv'.format(path, today), index=False)
-        return print("\nFile '{}/HD_concepts.csv' saved.".format(path_to_import))
-    else:
-        return print('The user should provide the "file_type" argument with any of the [statements or concepts] value.')
+
+    # remove the parts of the previous import and of a previous save of this version
+    for filename in os.listdir(path_to_version):
+        if filename.startswith(name + '_'):
+            os.remove('{}/{}'.format(path_to_version, filename))
+    manifest_file = '{}/{}.json'.format(path_to_import, name)
+    if os.path.isfile(manifest_file):
+        with open(manifest_file) as f:
+            previous = json.load(f)
+        for filename in [previous['header']] + previous['parts']:
+            if os.path.isfile('{}/{}'.format(path_to_import, filename)):
+                os.remove('{}/{}'.format(path_to_import, filename))
+
+    # save header and parts filling null and with sep=','
+    extension = '.csv.gz' if compress else '.csv'
+    manifest = {'header': '{}_header.csv'.format(name), 'parts': list()}
+    object.head(0).to_csv('{}/{}'.format(path_to_version, manifest['header']), index=False)
+    groups = set()
+    for group, df in object.groupby(object[split_column].fillna('NA'), sort=True):
+        # file name of the group, with a suffix if another group has the same name once sanitized
+        filegroup = re.sub(r'[^\w.-]', '_', str(group))
+        suffix = 0
+        while filegroup in groups:
+            suffix += 1
+            filegroup = '{}-{}'.format(re.sub(r'[^\w.-]', '_', str(group)), suffix)
+        if suffix:
+            print('{} {} saved as {} because of a file name collision.'.format(split_column, group, filegroup))
+        groups.add(filegroup)
+        for part, start in enumerate(range(0, len(df), max_rows)):
+            filename = '{}_{}_{}{}'.format(name, filegroup, part, extension)
+            df.iloc[start:start + max_rows].to_csv('{}/{}'.format(path_to_version, filename), index=False,
+                                                    header=False, na_rep='NA',
+                                                    compression='gzip' if compress else None)
+            manifest['parts'].append(filename)
+    with open('{}/{}.json'.format(path_to_version, name), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # link the version files into the import directory
+    for filename in [manifest['header']] + manifest['parts'] + ['{}.json'.format(name)]:
+        _link_or_copy('{}/{}'.format(path_to_version, filename), '{}/{}'.format(path_to_import, filename))
+
+    return print("\nFiles '{}/{}_*' saved: {} parts.".format(path_to_import, name, len(manifest['parts'])))
+
+
+def get_import_files(path_to_import, name):
+    """
+    This function returns the neo4j-admin import argument of a graph file: the header followed by the parts \
+    listed in the manifest, or the single CSV file saved by previous versions.
+    :param path_to_import: path to the import directory string
+    :param name: HD_statements or HD_concepts string
+    :return: comma separated path_to_file_names string
+    """
+
+    manifest_file = '{}/{}.json'.format(path_to_import, name)
+    if not os.path.isfile(manifest_file):
+        return '{}/{}.csv'.format(path_to_import, name)
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    return ','.join('{}/{}'.format(path_to_import, filename) for filename in [manifest['header']] + manifest['parts'])
 
 
 # CHECK GRAPH SCHEMA AND NORMALIZE TO NEO4J FORMAT
@@ -129,16 +223,54 @@ def get_concepts(nodes):
 
 
 # CREATE Neo4j Community Server
-def create_neo4j_instance(version='5.1.0'):
+def create_neo4j_instance(version='5.1.0', reuse=True):
     """
     This function downloads an creates a Neo4j Community v3.5 server instance.
     :param version: Neo4j server version number string (default '4.2.1')
+    :param reuse: True (default value) to skip the download, configuration and plugins install of an instance \
+    already set up, or False to set it up again
     :return: Neo4j server directory name string
     """
 
     print('Creating a Neo4j community v{} server instance...'.format(version))
-    # download neo4j community server v3.5.X
     directory = 'neo4j-community-{}'.format(version)
+    # marker of a finished set up (server, configuration and plugins)
+    setup_marker = os.path.join('.', directory, '.setup_done')
+    setup_done = reuse and os.path.isfile(setup_marker)
+    if setup_done:
+        print('Reusing the server set up at: ./{}'.format(directory))
+    else:
+        if os.path.isfile(setup_marker):
+            os.remove(setup_marker)
+        setup_done = _setup_neo4j_instance(version, directory)
+
+    # start server and check is running (return answer)
+    if not os.path.isfile('{}/run/neo4j.pid'.format(directory)) or not wait_for_neo4j(timeout=1):
+        print('Starting the server...')
+        cmd = './{}/bin/neo4j restart'.format(directory)
+        subprocess.call(cmd, shell=True)
+
+    # wait until the server accepts connections, then mark the set up as finished
+    if wait_for_neo4j():
+        print('Neo4j v{} is running.'.format(version))
+        if setup_done and not os.path.isfile(setup_marker):
+            with open(setup_marker, 'w') as f:
+                f.write('{}\n'.format(today))
+    else:
+        print('Neo4j v{} is NOT running. Some problem occurred and should be checked. Bye!'.format(version))
+
+    return directory
+
+
+def _setup_neo4j_instance(version, directory):
+    """
+    This function downloads and prepares a Neo4j Community server: configuration and plugins.
+    :param version: Neo4j server version number string
+    :param directory: Neo4j server directory name string
+    :return: True if the server and plugins are in place, otherwise False
+    """
+
+    # download neo4j community server v3.5.X
     if not os.path.isfile('neo4j-community-{}-unix.tar.gz'.format(version)):
         print('Downloading the server from neo4j.org...')
         cmd = 'wget http://dist.neo4j.org/neo4j-community-{}-unix.tar.gz'.format(version)
@@ -200,24 +332,47 @@ def create_neo4j_instance(version='5.1.0'):
         subprocess.call(cmd, shell=True)
         cmd = 'mv {}/labs/apoc-5.1.0-core.jar {}/apoc-5.1.0-core.jar'.format(directory, plugin_filepath)
         subprocess.call(cmd, shell=True)
-	with open(os.path.join('.', directory, 'conf', 'apoc.conf')) as file:
-		file.write("apoc.export.file.enabled=true")
+        with open(os.path.join('.', directory, 'conf', 'apoc.conf'), 'a') as file:
+            file.write("apoc.export.file.enabled=true\n")
 
+    # check the set up
+    required = [os.path.join('.', directory, 'bin', 'neo4j')] + [
+        os.path.join('.', directory, 'plugins', plugin) for plugin in setup_plugins]
+    missing = [filepath for filepath in required if not os.path.isfile(filepath)]
+    if missing:
+        print('The server set up is not complete, missing: {}'.format(missing))
+    return not missing
 
-    # start server and check is running (return answer)
-    if not os.path.isfile('{}/run/neo4j.pid'.format(directory)):
-        print('Starting the server...')
-        cmd = './{}/bin/neo4j restart'.format(directory)
-        subprocess.call(cmd, shell=True)
 
-    # wait for 5 seconds and check
-    time.sleep(30)
-    if os.path.isfile('{}/run/neo4j.pid'.format(directory)):
-        print('Neo4j v{} is running.'.format(version))
-    else:
-        print('Neo4j v{} is NOT running. Some problem occurred and should be checked. Bye!'.format(version))
+def wait_for_neo4j(host=None, ports=None, timeout=120, delay=0.5, max_delay=8):
+    """
+    This function waits until the Neo4j server accepts connections on the bolt and http ports, probing them \
+    with exponential backoff between attempts.
+    :param host: server host string (default neo4j_host)
+    :param ports: ports to probe (default neo4j_ports)
+    :param timeout: maximum seconds to wait
+    :param delay: seconds to wait after the first attempt, doubled after every attempt up to max_delay
+    :param max_delay: maximum seconds between attempts
+    :return: True if the server is ready, otherwise False
+    """
 
-    return directory
+    host = host or neo4j_host
+    pending = list(ports or neo4j_ports)
+    deadline = time.time() + timeout
+    while True:
+        for port in list(pending):
+            try:
+                with socket.create_connection((host, port), timeout=min(delay, 5)):
+                    pending.remove(port)
+            except OSError:
+                pass
+        if not pending:
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
 
 
 # LOAD GRAPH
@@ -232,7 +387,8 @@ def do_import(neo4j_path):
     print('\nThe function "do_import()" is running...')
     try:
         path_to_import = neo4j_path + '/import/HD'
-        # stop neo4j
+        # stop neo4j (pooled connections to it are closed)
+        close_drivers()
         cmd = '{}/bin/neo4j stop'.format(neo4j_path)
         subprocess.call(cmd, shell=True)
         # rm any database in the database dir
@@ -244,18 +400,20 @@ def do_import(neo4j_path):
         subprocess.call(cmd, shell=True)
         # neo4j-import
         cmd = '{}/bin/neo4j-admin database import full --id-type=string --overwrite-destination=true	 ' \
-              '--nodes {}/HD_concepts.csv ' \
-              '--relationships {}/HD_statements.csv'.format(neo4j_path, path_to_import, path_to_import)
+              '--nodes={} ' \
+              '--relationships={}'.format(neo4j_path, get_import_files(path_to_import, 'HD_concepts'),
+                                          get_import_files(path_to_import, 'HD_statements'))
         subprocess.call(cmd, shell=True)
         # start neo4j from database dir
         cmd = 'cd {}/data/databases/graph.db'.format(neo4j_path)
         subprocess.call(cmd, shell=True)
         cmd = '{}/bin/neo4j restart'.format(neo4j_path)
         subprocess.call(cmd, shell=True)
-        # wait for 5 seconds and check
-        time.sleep(30)
-        if os.path.isfile('{}/run/neo4j.pid'.format(neo4j_path)):
+        # wait until the server accepts connections, and create the id indexes
+        if wait_for_neo4j():
             neo4j_msg = 'Neo4j is running.'
+            if GraphDatabase is not None:
+                create_indexes()
         else:
             neo4j_msg = 'Neo4j is NOT running. Some problem occurred and should be checked.'
     except:
@@ -265,11 +423,326 @@ def do_import(neo4j_path):
         return print('\nThe graph is imported into the server. {}'
                      'You can start exploring and querying for hypothesis. \n'.format(neo4j_msg))
 
+# CONNECTION
+
+def get_driver(uri=None, auth=None):
+    """
+    This function returns the shared Neo4j driver to the bolt server. The driver keeps a pool of connections, \
+    so it is created once per server and reused by all the queries.
+    :param uri: bolt uri string (default bolt_uri)
+    :param auth: (user, password) tuple (default bolt_auth)
+    :return: neo4j driver object
+    """
+
+    if GraphDatabase is None:
+        raise ImportError('The neo4j python driver is required to connect to the server.')
+    key = (uri or bolt_uri, tuple(auth or bolt_auth))
+    with _drivers_lock:
+        if key not in _drivers:
+            _drivers[key] = GraphDatabase.driver(key[0], auth=key[1])
+        return _drivers[key]
+
+
+@atexit.register
+def close_drivers():
+    """
+    This function closes the shared Neo4j drivers, e.g. after a server restart. It is called at exit.
+    :return: None object
+    """
+
+    with _drivers_lock:
+        for driver in _drivers.values():
+            driver.close()
+        _drivers.clear()
+
+
+def run_query(query, session=None, **parameters):
+    """
+    This function runs a parameterized cypher query and returns the result as a dataframe. Values should be \
+    passed as parameters, not formatted into the query, so the server reuses the query plan.
+    :param query: cypher query string
+    :param session: neo4j session object to reuse (default a session of the shared driver)
+    :param parameters: query parameters
+    :return: result dataframe
+    """
+
+    if session is None:
+        with get_driver().session() as session:
+            return run_query(query, session, **parameters)
+    result = session.run(query, **parameters)
+    values = result.values()
+    return pd.DataFrame(values, columns=result.keys())
+
+
+def iter_query(query, chunksize=100000, session=None, **parameters):
+    """
+    This function runs a parameterized cypher query and yields the records in dataframe chunks.
+    :param query: cypher query string
+    :param chunksize: number of records per chunk
+    :param session: neo4j session object to reuse (default a session of the shared driver)
+    :param parameters: query parameters
+    :return: generator of result dataframes
+    """
+
+    if session is None:
+        with get_driver().session() as session:
+            yield from iter_query(query, chunksize, session, **parameters)
+        return
+    result = session.run(query, **parameters)
+    columns = result.keys()
+    values = []
+    for record in result:
+        values.append(record.values())
+        if len(values) == chunksize:
+            yield pd.DataFrame(values, columns=columns)
+            values = []
+    if values:
+        yield pd.DataFrame(values, columns=columns)
+
+
+# INDEXES AND QUERIES
+
+def _name(label, key):
+    """This function returns the name of the constraint or index of a label and property."""
+
+    return '{}_{}'.format(re.sub(r'\W', '_', label), key)
+
+
+def create_indexes(labels=None, uri=None, auth=None, timeout=300):
+    """
+    This function creates a uniqueness constraint on id and an index on preflabel for every node label and \
+    waits until they are online.
+    :param labels: list of node labels (default all labels in the database)
+    :param uri: bolt uri string (default bolt_uri)
+    :param auth: (user, password) tuple (default bolt_auth)
+    :param timeout: maximum seconds to wait for the indexes to be online
+    :return: list of labels indexed
+    """
+
+    print('\nCreating indexes...')
+    driver = get_driver(uri, auth)
+    with driver.session() as session:
+        if labels is None:
+            labels = [record[0] for record in session.run('CALL db.labels()')]
+        for label in labels:
+            label = label.replace('`', '')
+            session.run('CREATE CONSTRAINT `{}` IF NOT EXISTS FOR (n:`{}`) REQUIRE n.id IS UNIQUE'.format(
+                _name(label, 'id'), label)).consume()
+            session.run('CREATE INDEX `{}` IF NOT EXISTS FOR (n:`{}`) ON (n.preflabel)'.format(
+                _name(label, 'preflabel'), label)).consume()
+        session.run('CALL db.awaitIndexes($timeout)', timeout=timeout).consume()
+    print('Indexes on id and preflabel are online for labels: {}'.format(labels))
+
+    return labels
+
+
+def node_pattern(variable, label=None, parameter='id', key='id'):
+    """
+    This function returns a labelled cypher node pattern matching a node property by a query parameter, \
+    e.g. node_pattern('n', 'DISO', 'seed') is (n:`DISO` {id: $seed}).
+    :param variable: node variable string
+    :param label: node label string (without label the lookup scans all nodes)
+    :param parameter: query parameter name string
+    :param key: node property string, id (default value) or preflabel
+    :return: cypher node pattern string
+    """
+
+    return '({}{} {{{}: ${}}})'.format(variable, _label(label) if label else '', key, parameter)
+
+
+def get_node_labels(ids, session):
+    """
+    This function returns the label of nodes given their ids, with one index seek per label.
+    :param ids: list of node id strings
+    :param session: neo4j session object
+    :return: dictionary {node id: label}
+    """
+
+    labels = [record[0] for record in session.run('CALL db.labels()')]
+    if not labels:
+        return dict()
+    query = ' UNION ALL '.join('UNWIND $ids AS id MATCH (n{} {{id: id}}) RETURN n.id AS id, "{}" AS label'.format(
+        _label(label), label.replace('"', '')) for label in labels)
+    return {record['id']: record['label'] for record in session.run(query, ids=list(ids))}
+
+
+# ONLINE GRAPH UPDATES
+
+def _label(value):
+    """This function returns the cypher labels pattern of a ':LABEL' value, e.g. 'GENE;PHYS' to :`GENE`:`PHYS`."""
+
+    return ''.join(':`{}`'.format(label.replace('`', '')) for label in str(value).split(';') if label)
+
+
+def _records(df):
+    """This function converts a dataframe into a list of dictionaries of strings, 'NA' for missing values as in \
+    the import files."""
+
+    return df.fillna('NA').astype(str).to_dict('records')
+
+
+def _write_batch(driver, query, batch, retries=5, backoff=0.5):
+    """
+    This function writes one batch in a transaction, retried with exponential backoff on transient errors \
+    (e.g. deadlocks between concurrent transactions) or lost connections.
+    :param driver: neo4j driver object
+    :param query: cypher query string with the $batch parameter
+    :param batch: list of dictionaries
+    :param retries: number of retries int
+    :param backoff: seconds to wait before the first retry float
+    :return: number of rows written int
+    """
+
+    for attempt in range(retries + 1):
+        try:
+            with driver.session() as session:
+                with session.begin_transaction() as tx:
+                    tx.run(query, batch=batch).consume()
+                    tx.commit()
+            return len(batch)
+        except (neo4j.exceptions.TransientError, neo4j.exceptions.ServiceUnavailable,
+                neo4j.exceptions.SessionExpired):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _write_groups(driver, groups, batch_size=10000, max_workers=4, retries=5):
+    """
+    This function writes groups of rows in batches with a bounded number of concurrent transactions.
+    :param driver: neo4j driver object
+    :param groups: list of (cypher query string, dataframe) tuples
+    :param batch_size: number of rows per transaction int
+    :param max_workers: number of concurrent transactions int
+    :param retries: number of retries of a batch int
+    :return: number of rows written int
+    """
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_write_batch, driver, query, _records(df.iloc[start:start + batch_size]), retries)
+                   for query, df in groups for start in range(0, len(df), batch_size)]
+        return sum(future.result() for future in futures)
+
+
+def _statement_groups(statements, labels, query):
+    """
+    This function groups statements by relationship type and by labels of the subject and object nodes, which \
+    cannot be parameters, and returns the query of every group.
+    :param statements: neo4j statements dataframe
+    :param labels: dictionary {node id: ':LABEL'} (nodes without label are matched by id only)
+    :param query: cypher query template with {type}, {subject_label} and {object_label} fields
+    :return: list of (cypher query string, dataframe) tuples
+    """
+
+    statements = statements.rename(columns={':START_ID': 'subject_id', ':TYPE': 'property_id', ':END_ID': 'object_id'})
+    statements = statements.assign(subject_label=statements.subject_id.map(labels).fillna(''),
+                                   object_label=statements.object_id.map(labels).fillna(''))
+    groups = list()
+    for (rel_type, subject_label, object_label), df in statements.groupby(
+            ['property_id', 'subject_label', 'object_label'], sort=False):
+        groups.append((query.format(type=rel_type.replace('`', ''), subject_label=_label(subject_label),
+                                    object_label=_label(object_label)),
+                       df[['subject_id', 'object_id'] + relationship_properties]))
+    return groups
+
+
+def get_delta(old, new, file_type='statements'):
+    """
+    This function compares two versions of the graph edges or nodes by their fingerprints. Nodes are \
+    identified by id: changed nodes are added rows, to update in place, and only the nodes no longer in the \
+    graph are removed rows.
+    :param old: previous graph edges or nodes dataframe
+    :param new: new graph edges or nodes dataframe
+    :param file_type: statements (default value) or concepts string
+    :return: added rows dataframe, removed rows dataframe (to format with get_statements() or get_concepts())
+    """
+
+    columns = None if file_type == 'statements' else graph.node_columns
+    old = add_fingerprint(check_format(old, file_type=file_type), columns=columns)
+    new = add_fingerprint(check_format(new, file_type=file_type), columns=columns)
+    added = new[~new.fingerprint.isin(old.fingerprint)].drop(columns='fingerprint')
+    if file_type == 'statements':
+        removed = old[~old.fingerprint.isin(new.fingerprint)].drop(columns='fingerprint')
+    else:
+        removed = old[~old.id.isin(new.id)].drop(columns='fingerprint')
+    print('{}: {} added, {} removed'.format(file_type, len(added), len(removed)))
+
+    return added, removed
+
+
+def load_online(concepts=None, statements=None, removed_concepts=None, removed_statements=None, nodes=None,
+                old_nodes=None, uri=None, auth=None, batch_size=10000, max_workers=4, retries=5):
+    """
+    This function loads concept and statement deltas into a running Neo4j server over bolt, in batches of \
+    concurrent transactions. Removals are applied first.
+    :param concepts: neo4j concepts dataframe to merge (see get_concepts())
+    :param statements: neo4j statements dataframe to merge (see get_statements())
+    :param removed_concepts: neo4j concepts dataframe to delete, with their relationships
+    :param removed_statements: neo4j statements dataframe to delete
+    :param nodes: neo4j concepts dataframe of the graph, to match statement nodes by label (default concepts)
+    :param old_nodes: neo4j concepts dataframe of the previous graph, to relabel changed nodes (optional)
+    :param uri: bolt uri string (default bolt_uri)
+    :param auth: (user, password) tuple (default bolt_auth)
+    :param batch_size: number of rows per transaction int
+    :param max_workers: number of concurrent transactions int
+    :param retries: number of retries of a batch int
+    :return: dictionary with the number of rows written per operation
+    """
+
+    print('\nThe function "load_online()" is running...')
+    nodes = nodes if nodes is not None else concepts
+    labels = dict(zip(nodes['id:ID'], nodes[':LABEL'])) if nodes is not None else dict()
+    counts = dict()
+    driver = get_driver(uri, auth)
+    if removed_statements is not None and len(removed_statements):
+        query = ('UNWIND $batch AS row '
+                 'MATCH (s{subject_label} {{id: row.subject_id}})-[r:`{type}`]->(o{object_label} {{id: row.object_id}}) '
+                 'WHERE ' + ' AND '.join('r.{0} = row.{0}'.format(p) for p in relationship_properties) + ' '
+                 'DELETE r')
+        counts['removed_statements'] = _write_groups(driver, _statement_groups(removed_statements, labels, query),
+                                                     batch_size, max_workers, retries)
+    if removed_concepts is not None and len(removed_concepts):
+        groups = [('UNWIND $batch AS row MATCH (n{} {{id: row.id}}) DETACH DELETE n'.format(_label(label)),
+                   df[['id:ID']].rename(columns={'id:ID': 'id'}))
+                  for label, df in removed_concepts.fillna({':LABEL': ''}).groupby(':LABEL', sort=False)]
+        counts['removed_concepts'] = _write_groups(driver, groups, batch_size, max_workers, retries)
+    if concepts is not None and len(concepts) and old_nodes is not None:
+        old_labels = concepts['id:ID'].map(dict(zip(old_nodes['id:ID'], old_nodes[':LABEL'].fillna(''))))
+        relabelled = concepts.assign(old_label=old_labels, new_label=concepts[':LABEL'].fillna(''))
+        relabelled = relabelled[relabelled.old_label.notna() & (relabelled.old_label != relabelled.new_label)]
+        groups = [('UNWIND $batch AS row MATCH (n{} {{id: row.id}})'.format(_label(old_label)) +
+                   (' REMOVE n{}'.format(_label(old_label)) if old_label else '') +
+                   (' SET n{}'.format(_label(new_label)) if new_label else ''),
+                   df[['id:ID']].rename(columns={'id:ID': 'id'}))
+                  for (old_label, new_label), df in relabelled.groupby(['old_label', 'new_label'], sort=False)]
+        counts['relabelled_concepts'] = _write_groups(driver, groups, batch_size, max_workers, retries)
+    if concepts is not None and len(concepts):
+        properties = [c for c in concepts.columns if c not in ('id:ID', ':LABEL') and not c.endswith(':IGNORE')]
+        groups = [('UNWIND $batch AS row MERGE (n{} {{id: row.id}}) SET '.format(_label(label)) +
+                   ', '.join('n.{0} = row.{0}'.format(p) for p in properties),
+                   df[['id:ID'] + properties].rename(columns={'id:ID': 'id'}))
+                  for label, df in concepts.fillna({':LABEL': ''}).groupby(':LABEL', sort=False)]
+        counts['concepts'] = _write_groups(driver, groups, batch_size, max_workers, retries)
+    if statements is not None and len(statements):
+        query = ('UNWIND $batch AS row '
+                 'MATCH (s{subject_label} {{id: row.subject_id}}) MATCH (o{object_label} {{id: row.object_id}}) '
+                 'MERGE (s)-[r:`{type}` {{' +
+                 ', '.join('{0}: row.{0}'.format(p) for p in relationship_properties) +
+                 '}}]->(o)')
+        counts['statements'] = _write_groups(driver, _statement_groups(statements, labels, query),
+                                             batch_size, max_workers, retries)
+    print('\nThe graph is updated online: {}\n'.format(counts))
+
+    return counts
+
+
 if __name__ == '__main__':
     create_neo4j_instance()
     ## get edges and files for neo4j
     edges = get_dataframe_from_file('./graph/graph_edges_v2022-07-24.csv')
     nodes = get_dataframe_from_file('./graph/graph_nodes_v2022-07-24.csv')
+    # check the graph integrity before the import
+    graph.validate_graph(edges, nodes, strict=True)
     statements = get_statements(edges)    
     concepts = get_concepts(nodes)
 
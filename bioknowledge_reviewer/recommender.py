@@ -8,19 +8,22 @@ Created on Sat Aug 13 11:28:59 2022
 Edge prediction module
 """
 
-from neo4j import GraphDatabase
-import sys,os
-import json
-import yaml
+import os
 import datetime
-import neo4j.exceptions
+import tempfile
+import multiprocessing
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+import neo4jlib
+import linkprediction
 
 
 
 today = datetime.date.today()
-port = "7687"
+# seed node of the predictions, matched with its label to use the id index
+seed = "MONDO:0007739"
+seed_label = "DISO"
 topologicalAlg = {"adamicadar": "adamicAdar", 
  "Cneighours": "commonNeighbors",
  "prefAttach": "preferentialAttachment",
@@ -30,21 +33,25 @@ topologicalAlg = {"adamicadar": "adamicAdar",
 # same community is not a reasonable algorithm to use, except if
 # we define a community value, based on network modules or something
 
+# link prediction scores of a Node1-Node2 pair
+scores = """gds.alpha.linkprediction.adamicAdar(Node1, Node2) AS adamicAdar,
+        gds.alpha.linkprediction.commonNeighbors(Node1, Node2) AS commonNeighbors,
+        gds.alpha.linkprediction.preferentialAttachment(Node1, Node2) AS preferentialAttachment,
+        gds.alpha.linkprediction.resourceAllocation(Node1, Node2) AS resourceAllocation,
+        gds.alpha.linkprediction.totalNeighbors(Node1, Node2) AS totalNeighbors"""
+score_columns = ("adamicAdar", "commonNeighbors", "preferentialAttachment", "resourceAllocation",
+                 "totalNeighbors")
+# scores weighted by the number of common neighbours in the recommendations
+weighted_columns = ("adamicAdar", "resourceAllocation", "preferentialAttachment")
+
 # test query on 25 limit
 
-print("started")
 def test_query(algorithm="adamicAdar", limit=25):
-    try:
-        driver = GraphDatabase.driver("bolt://localhost:{}".format(port), auth=("neo4j", "HD"))
-    except neo4j.exceptions.ServiceUnavailable:
-        raise
-    with driver.session() as session:
-        query = """ MATCH (p1)-[]-()-[]-(p2) RETURN p1.id, p2.id, gds.alpha.linkprediction.{}(p1, p2) AS {}score LIMIT {};""".format(algorithm, algorithm, limit)
-        result = session.run(query)
-        result_list = result.values()
-        df = pd.DataFrame(result_list, columns=["Concept 1", "Concept 2",
-                                                algorithm + "score"])
-        print(df)
+    # the algorithm is a function name and cannot be a parameter
+    query = """ MATCH (p1)-[]-()-[]-(p2) RETURN p1.id, p2.id, gds.alpha.linkprediction.{}(p1, p2) AS {}score LIMIT $limit;""".format(algorithm, algorithm)
+    df = neo4jlib.run_query(query, limit=limit)
+    df.columns = ["Concept 1", "Concept 2", algorithm + "score"]
+    print(df)
         
 # for shorthand in topologicalAlg:
 #     test_query(topologicalAlg[shorthand])
@@ -52,51 +59,38 @@ def test_query(algorithm="adamicAdar", limit=25):
 
 # 279 395 988 total pair-comparisons to be done. just calling them takes 2,3551 minutes
 # focus on predicting edges originating from HTT?
-text = """MATCH (Node1:GENE {id:"MONDO:0007739"})-[]->()-[]->(Node2) RETURN Node1.id, Node2.id, gds.alpha.linkprediction.adamicAdar(Node1, Node2) AS adamicAdar,
-        gds.alpha.linkprediction.commonNeighbors(Node1, Node2) AS commonNeighbors,
-        gds.alpha.linkprediction.preferentialAttachment(Node1, Node2) AS preferentialAttachment,
-        gds.alpha.linkprediction.resourceAllocation(Node1, Node2) AS resourceAllocation,
-        gds.alpha.linkprediction.totalNeighbors(Node1, Node2) AS totalNeighbors;"""
+text = "MATCH " + neo4jlib.node_pattern('Node1', seed_label, 'seed') + """-[]->()-[]->(Node2) RETURN Node1.id, Node2.id, """ + scores + ";"
 
-def multi_query(limit=25):
-    try:
-        driver = GraphDatabase.driver("bolt://localhost:{}".format(port), auth=("neo4j", "HD"))
-    except neo4j.exceptions.ServiceUnavailable:
-        raise
-    with driver.session() as session:
-        query = """ MATCH (Node1)-[]-()-[]-(Node2)
-        RETURN Node1.id, Node2.id, gds.alpha.linkprediction.adamicAdar(Node1, Node2) AS adamicAdar,
-        gds.alpha.linkprediction.commonNeighbors(Node1, Node2) AS commonNeighbors,
-        gds.alpha.linkprediction.preferentialAttachment(Node1, Node2) AS preferentialAttachment,
-        gds.alpha.linkprediction.resourceAllocation(Node1, Node2) AS resourceAllocation,
-        gds.alpha.linkprediction.totalNeighbors(Node1, Node2) AS totalNeighbors;"""
-        result = session.run(query)
-        result_list = result.values()
-        df = pd.DataFrame(result_list, columns=result.keys())
-        # sort by the least populated areas of the graph to maximise relative information gain.
-        print(df.sort_values(by="totalNeighbors"))
-        return df.sort_values(by="totalNeighbors")
+def multi_query(limit=25, k=None, inter=float(1), chunksize=100000):
+    """
+    This function scores all the 2-hop node pairs of the graph.
+    :param k: number of recommendations to return. By default all the pairs are returned sorted by \
+    totalNeighbors, otherwise the pairs are streamed once and ranked with recommend_top
+    :param inter: weight of understandable results, see recommend
+    :param chunksize: number of pairs per streamed chunk
+    :return: scores dataframe
+    """
+
+    query = """ MATCH (Node1)-[]-()-[]-(Node2)
+        RETURN Node1.id, Node2.id, """ + scores + ";"
+    if k is not None:
+        return recommend_top(lambda: neo4jlib.iter_query(query, chunksize), k=k, inter=inter)
+    df = neo4jlib.run_query(query)
+    # sort by the least populated areas of the graph to maximise relative information gain.
+    print(df.sort_values(by="totalNeighbors"))
+    return df.sort_values(by="totalNeighbors")
 
 #df = multi_query()
 
-def get_targets():
-    try:
-        driver = GraphDatabase.driver("bolt://localhost:{}".format(port), auth=("neo4j", "HD"))
-    except neo4j.exceptions.ServiceUnavailable:
-        raise
+def get_targets(seed=seed, seed_label=seed_label):
     print("get targets")
-    with driver.session() as session:
-        # WHERE filter removes hommologous edges.
-        query = """ MATCH (n {id:"MONDO:0007739"})-[]-()-[]-(Node2)
+    # WHERE filter removes hommologous edges.
+    query = " MATCH " + neo4jlib.node_pattern('n', seed_label, 'seed') + """-[]-()-[]-(Node2)
         RETURN collect(distinct Node2.id);"""
-        result = session.run(query)
-        result_list = result.values()
-        df = pd.Series(result_list)
-        # sort by the least populated areas of the graph to maximise relative information gain.
-        #print(df.sort_values(by="totalNeighbors"))
-        return df
-
-targets = get_targets()
+    df = neo4jlib.run_query(query, seed=seed)
+    # sort by the least populated areas of the graph to maximise relative information gain.
+    #print(df.sort_values(by="totalNeighbors"))
+    return pd.Series(df.values.tolist())
 
 
 def filter_paths(targets):
@@ -110,42 +104,75 @@ def filter_paths(targets):
     filtered_targets = targets[0][0]
     return filtered_targets
 
-filtered_targets = filter_paths(targets)
 
 
-def query_targets(df):
-    try:
-        driver = GraphDatabase.driver("bolt://localhost:{}".format(port),
-                                      auth=("neo4j", "ngly1"))
-    except neo4j.exceptions.ServiceUnavailable:
-        raise
-    result_pd = pd.DataFrame(index=["Node1.preflabel", "Node2.preflabel", "Node2.id", "adamicAdar",
-                                    "commonNeighbors", 
-                                    "preferentialAttachment", 
-                                    "resourceAllocation", "totalNeighbors"])
+def query_targets(df, seed=seed, seed_label=seed_label, batch_size=1000):
+    """
+    This function calculates the link prediction scores between the seed and its target nodes, querying \
+    the targets in batches per label.
+    :param df: list or series of target node id strings
+    :param seed: seed node id string
+    :param seed_label: seed node label string
+    :param batch_size: number of targets per query, or 0 to send one query per target
+    :return: scores dataframe with one row per target connected to the seed
+    """
+
     print("\n calculate scores")
-    for target in tqdm(df):
-        with driver.session() as session:
-            query = """MATCH (Node1 {id:"MONDO:0007739"})-[]-()-[]-(Node2 {id:"%s"}) RETURN Node1.preflabel, Node2.preflabel, Node2.id, gds.alpha.linkprediction.adamicAdar(Node1, Node2) AS adamicAdar,
-            gds.alpha.linkprediction.commonNeighbors(Node1, Node2) AS commonNeighbors,
-            gds.alpha.linkprediction.preferentialAttachment(Node1, Node2) AS preferentialAttachment,
-            gds.alpha.linkprediction.resourceAllocation(Node1, Node2) AS resourceAllocation,
-            gds.alpha.linkprediction.totalNeighbors(Node1, Node2) AS totalNeighbors;"""%(target)
-            result = session.run(query)
-            result_list = result.values()[0]
-            result_pd = pd.concat([ pd.Series(result_list, 
-                                              index=["Node1.preflabel", "Node2.preflabel", "Node2.id",
-                                                     "adamicAdar", 
-                                                     "commonNeighbors",
-                                                     "preferentialAttachment",
-                                                     "resourceAllocation",
-                                                     "totalNeighbors"]),
-                                   result_pd], axis=1)
-    return result_pd.T
-        
-results = query_targets(filtered_targets)
-print(results)
-results.to_csv("query_targets_noonto.csv")
+    targets = pd.unique(pd.Series(list(df), dtype=object))
+    position = {target: i for i, target in enumerate(targets)}
+    columns = ["Node1.preflabel", "Node2.preflabel", "Node2.id"] + list(score_columns)
+    values = {column: np.full(len(targets), None, dtype=object) for column in columns[:3]}
+    values.update({column: np.full(len(targets), np.nan) for column in score_columns})
+    found = np.zeros(len(targets), dtype=bool)
+    with neo4jlib.get_driver().session() as session:
+        labels = neo4jlib.get_node_labels(targets, session)
+        groups = dict()
+        for target in targets:
+            groups.setdefault(labels.get(target), []).append(target)
+        batch_size = batch_size or 1
+        with tqdm(total=len(targets)) as progress:
+            for label, group in groups.items():
+                if label is None:
+                    progress.update(len(group))
+                    continue
+                query = "MATCH " + neo4jlib.node_pattern('Node1', seed_label, 'seed') + """
+                    UNWIND $targets AS target
+                    MATCH (Node2:`""" + label + """` {id: target})
+                    WHERE (Node1)-[]-()-[]-(Node2)
+                    RETURN Node1.preflabel, Node2.preflabel, Node2.id, """ + scores + ";"
+                for start in range(0, len(group), batch_size):
+                    batch = group[start:start + batch_size]
+                    for record in session.run(query, seed=seed, targets=batch):
+                        i = position[record["Node2.id"]]
+                        found[i] = True
+                        for column in columns:
+                            values[column][i] = record[column]
+                    progress.update(len(batch))
+    result_pd = pd.DataFrame(values, columns=columns)[found]
+    return result_pd.reset_index(drop=True)
+
+def filter_branch(results, ontology_index, branch, column="Node2.id"):
+    """
+    This function keeps the candidate targets that fall under
+    an ontology branch, e.g. a MONDO disease subtree.
+    ontology_index:
+        mondo_class.closure object
+    branch:
+        class ID of the branch root, E.G. "MONDO:0005071"
+    """
+    members = ontology_index.descendants(branch)
+    members.add(branch)
+    return results[results[column].isin(members)]
+
+def _weighted_scores(results, weight):
+    """
+    This function returns the adamicAdar, resourceAllocation and preferentialAttachment scores divided by \
+    the number of common neighbours times the weight, before normalization.
+    """
+
+    common = results["commonNeighbors"].to_numpy(dtype=float) + 1 #TODO remove the +1 and find a way to prevent /0
+    return {"weighted" + column: results[column].to_numpy(dtype=float) / (common * weight)
+            for column in weighted_columns}
 
 def recommend(results, inter=float(1)):
     """
@@ -164,22 +191,8 @@ def recommend(results, inter=float(1)):
         inter = 0.0001
     weight = 1/inter # adamicadar OR resource allocation score / (number of common neigbours * weight)
     
-    results["weightedadamicAdar"] = results["adamicAdar"] / (
-        (results["commonNeighbors"] + 1) * weight) #TODO remove the +1 and find a way to prevent /0
-    results["weightedadamicAdar"] = results[
-        "weightedadamicAdar"] / results["weightedadamicAdar"].max()
-    
-    results["weightedresourceAllocation"] = results["resourceAllocation"] / (
-        (results["commonNeighbors"] + 1) * weight)
-    results["weightedresourceAllocation"] = results[
-        "weightedresourceAllocation"] / results[
-            "weightedresourceAllocation"].max()
-            
-    results["weightedpreferentialAttachment"] = results["preferentialAttachment"] / (
-        (results["commonNeighbors"] + 1) * weight)
-    results["weightedpreferentialAttachment"] = results[
-        "weightedpreferentialAttachment"] / results[
-            "weightedpreferentialAttachment"].max()
+    for column, values in _weighted_scores(results, weight).items():
+        results[column] = values / pd.Series(values).max()
             
     # sort results by the three new weighted scores
     results["recommendationscore"] = results["weightedadamicAdar"] + results[
@@ -188,6 +201,235 @@ def recommend(results, inter=float(1)):
     results["recommendationscore"] = results["recommendationscore"] / 3
     return results
 
-Recommended = recommend(results)
-print(Recommended)
-Recommended.to_csv("recommended_edges_noonto.csv")
+def _recommendation_scores(chunk, maxima):
+    """
+    This function returns the recommendation scores of the weighted scores of a chunk normalized by maxima, \
+    -inf for missing scores.
+    """
+    score = sum(chunk["weighted" + column].to_numpy() / maxima["weighted" + column] for column in weighted_columns)
+    return np.nan_to_num(score / 3, nan=-np.inf)
+
+def _read_spilled(spilled, last):
+    """
+    This function yields the spilled chunks, read back one at a time, and the last chunk.
+    """
+    for file in spilled:
+        yield pd.read_pickle(file)
+    yield last
+
+def recommend_top(chunks, k=100, inter=float(1)):
+    """
+    This function returns the k best recommendations, scored as recommend, reading the results once in chunks. \
+    The chunks are spilled to disk while the maxima are computed and ranked with the final maxima.
+    chunks:
+        function returning an iterable of score dataframes, e.g.
+        lambda: neo4jlib.iter_query(query) or lambda: [results]
+    k:
+        number of recommendations, int
+    inter:
+        see recommend
+    """
+    if k is None or k <= 0:
+        raise ValueError("The number of recommendations k should be a positive int, not {}".format(k))
+    if inter == 0:
+        inter = 0.0001
+    weight = 1/inter
+
+    maxima = dict()
+    best = None
+    with tempfile.TemporaryDirectory() as spill_dir:
+        # pass 1: weighted scores and their maxima, every chunk but the last spilled to disk
+        spilled, last = list(), None
+        for chunk in chunks():
+            if not len(chunk):
+                continue
+            weighted = _weighted_scores(chunk, weight)
+            chunk = chunk.reset_index(drop=True)
+            for column, values in weighted.items():
+                chunk[column] = values
+                maxima[column] = np.fmax(maxima.get(column, np.nan), pd.Series(values).max())
+            if last is not None:
+                spilled.append(os.path.join(spill_dir, "chunk_{}.pkl".format(len(spilled))))
+                last.to_pickle(spilled[-1])
+            last = chunk
+        if last is None:
+            return pd.DataFrame()
+
+        # pass 2: k best recommendations with the final maxima
+        for chunk in _read_spilled(spilled, last):
+            if best is not None:
+                chunk = pd.concat([best, chunk], ignore_index=True)
+            if len(chunk) > k:
+                chunk = chunk.iloc[np.argpartition(-_recommendation_scores(chunk, maxima), k - 1)[:k]]
+            best = chunk
+
+    best = best.reset_index(drop=True)
+    best["recommendationscore"] = _recommendation_scores(best, maxima)
+    best = best.sort_values(by="recommendationscore", ascending=False, kind="mergesort").head(k)
+    for column in weighted_columns:
+        best["weighted" + column] = best["weighted" + column] / maxima["weighted" + column]
+    best["recommendationscore"] = best["recommendationscore"].replace(-np.inf, np.nan)
+    return best.reset_index(drop=True)
+
+# MULTI-SEED RECOMMENDATIONS
+
+# adjacency matrix of a worker process, attached to the shared memory of the runner
+_adjacency = None
+_blocks = []
+
+def _init_worker(description):
+    """
+    This function attaches a worker process to the adjacency matrix in shared memory.
+    """
+    global _adjacency, _blocks
+    _blocks, _adjacency = linkprediction.GraphAdjacency.from_shared_memory(description)
+
+def _rank(df, k, inter):
+    """
+    This function returns the k best recommendations of a seed score table.
+    """
+    if df.empty:
+        return df
+    return recommend_top(lambda: [df], k=k or len(df), inter=inter)
+
+def _recommend_code(arguments):
+    """
+    This function scores the 2-hop candidates of a seed code in a worker process, saves the score table and \
+    returns the k best recommendations with the candidate codes.
+    """
+    seed_code, k, inter, scores_file = arguments
+    codes, values = _adjacency.score_codes(seed_code)
+    df = pd.DataFrame(values, columns=list(score_columns))
+    df.insert(0, "Node2.code", codes)
+    if scores_file:
+        df.to_pickle(scores_file)
+    return seed_code, _rank(df, k, inter)
+
+def _seed_codes(adjacency, seeds):
+    """
+    This function returns the codes of the seeds in the graph, in the seed list order.
+    """
+    seeds = list(pd.unique(pd.Series(list(seeds), dtype=object)))
+    seed_codes = adjacency.ids.encode(seeds, add=False)
+    missing = [seed for seed, code in zip(seeds, seed_codes) if code < 0 or code >= len(adjacency)]
+    if missing:
+        print("Seeds not in the graph: {}".format(missing))
+    return {code: i for i, code in enumerate(seed_codes) if 0 <= code < len(adjacency)}
+
+def _decode_recommendations(adjacency, seed_code, df):
+    """
+    This function replaces the candidate codes of the ranked recommendations of a seed by the node ids and \
+    preflabels.
+    """
+    df = df.copy()
+    df.insert(0, "rank", np.arange(1, len(df) + 1))
+    df.insert(0, "Node1.preflabel", adjacency.preflabels[seed_code])
+    df.insert(0, "Node1.id", adjacency.ids.decode([seed_code])[0])
+    codes = df.pop("Node2.code").to_numpy()
+    df.insert(3, "Node2.id", adjacency.ids.decode(codes))
+    df.insert(4, "Node2.preflabel", adjacency.preflabels[codes])
+    return df
+
+def _save_recommendations(results, seed_order, version):
+    """
+    This function saves the recommendations of all the seeds into one file, ranked per seed in the seed \
+    list order.
+    """
+    if not results:
+        return pd.DataFrame()
+    for seed_code, df in results.items():
+        df["seed_order"] = seed_order[seed_code]
+    results = pd.concat(list(results.values()), ignore_index=True).sort_values(by=["seed_order", "rank"])
+    results = results.drop(columns="seed_order").reset_index(drop=True)
+    path = os.getcwd() + "/graph"
+    if not os.path.isdir(path): os.makedirs(path)
+    output_file = "{}/recommended_edges_v{}.csv".format(path, version)
+    results.to_csv(output_file, index=False)
+    print("\nThe recommendations of {} seeds are saved at: {}\n".format(len(seed_order), output_file))
+    return results
+
+def recommend_seeds(seeds, edges_file, nodes_file=None, k=100, inter=float(1), processes=None, save_scores=True):
+    """
+    This function recommends edges for many seed nodes of a graph version, scoring the seeds in parallel \
+    over one shared adjacency matrix.
+    seeds:
+        list of seed node ids, E.G. all the diseases and key genes
+    edges_file:
+        graph edges file, E.G. "./graph/graph_edges_v2022-07-24.csv"
+    nodes_file:
+        graph nodes file, to add the preflabels (optional)
+    k:
+        number of recommendations per seed, int (None for all the candidates)
+    inter:
+        see recommend
+    processes:
+        number of worker processes (default the number of CPUs)
+    save_scores:
+        save the score table of every seed in the graph version, for update_seeds
+    returns the recommendations of all the seeds, ranked per seed, also saved at
+    graph/recommended_edges_v{graph version}.csv
+    """
+    version = linkprediction.get_graph_version(edges_file)
+    adjacency = linkprediction.load_adjacency(edges_file, nodes_file)
+    seed_order = _seed_codes(adjacency, seeds)
+
+    print("\n recommend for {} seeds".format(len(seed_order)))
+    results = dict()
+    blocks, description = adjacency.to_shared_memory()
+    try:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(description,)) as pool:
+            arguments = [(code, k, inter, linkprediction.get_scores_file(adjacency.ids.decode([code])[0], version)
+                          if save_scores else None) for code in seed_order]
+            for seed_code, df in tqdm(pool.imap_unordered(_recommend_code, arguments), total=len(arguments)):
+                results[seed_code] = _decode_recommendations(adjacency, seed_code, df)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return _save_recommendations(results, seed_order, version)
+
+def update_seeds(seeds, version, added=None, removed=None, new_version=None, k=100, inter=float(1)):
+    """
+    This function updates the recommendations of the seeds after a graph delta, rescoring only the \
+    candidates near the changed edges in the score tables saved by recommend_seeds.
+    seeds:
+        list of seed node ids
+    version:
+        previous graph version, E.G. "2022-07-24"
+    added, removed:
+        added and removed statements dataframes, E.G. from neo4jlib.get_delta
+    new_version:
+        new graph version (default today)
+    k, inter:
+        see recommend_seeds
+    returns the recommendations of all the seeds, ranked per seed, also saved at
+    graph/recommended_edges_v{new graph version}.csv
+    """
+    new_version = str(today) if new_version is None else new_version
+    old_adjacency = linkprediction.GraphAdjacency.load(linkprediction.get_adjacency_file(version))
+    adjacency, changed = linkprediction.update_adjacency(old_adjacency, added, removed)
+    adjacency.save(linkprediction.get_adjacency_file(new_version))
+    seed_order = _seed_codes(adjacency, seeds)
+
+    print("\n update the recommendations of {} seeds".format(len(seed_order)))
+    results = dict()
+    for seed_code in tqdm(seed_order):
+        seed = adjacency.ids.decode([seed_code])[0]
+        table = linkprediction.load_scores(seed, version)
+        table = linkprediction.update_scores(table, old_adjacency, adjacency, seed_code, changed)
+        table.to_pickle(linkprediction.get_scores_file(seed, new_version))
+        results[seed_code] = _decode_recommendations(adjacency, seed_code, _rank(table, k, inter))
+
+    return _save_recommendations(results, seed_order, new_version)
+
+if __name__ == '__main__':
+    print("started")
+    targets = get_targets()
+    filtered_targets = filter_paths(targets)
+    results = query_targets(filtered_targets)
+    print(results)
+    results.to_csv("query_targets_noonto.csv")
+    Recommended = recommend(results)
+    print(Recommended)
+    Recommended.to_csv("recommended_edges_noonto.csv")
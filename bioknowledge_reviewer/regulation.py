@@ -15,6 +15,7 @@ import gseapy as gs
 from biothings_client import get_client
 import gzip
 import pandas as pd
+import utils
 
 # VARIABLES
 today = datetime.date.today()
@@ -784,13 +785,13 @@ def build_edges(edges):
         edges_l.append(edge)
 
     # save edges file
-    pd.DataFrame(edges_l).fillna('NA').to_csv('{}/regulation_edges_v{}.csv'.format(graph,today), index=False)
+    saved = utils.save_dataframe(pd.DataFrame(edges_l), '{}/regulation_edges_v{}.csv'.format(graph,today))
 
     # print edges info
     print('\n* This is the size of the edges file data structure: {}'.format(pd.DataFrame(edges_l).shape))
     print('* These are the edges attributes: {}'.format(pd.DataFrame(edges_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(edges_l).head(1)))
-    print('\nThe regulation network edges are built and saved at: {}/regulation_edges_v{}.csv\n'.format(graph,today))
+    print('\nThe regulation network edges are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_edges().\n')
 
     return edges_l
@@ -910,14 +911,14 @@ def build_nodes(edges):
         nodes_l.append(node)
 
     # save nodes file
-    pd.DataFrame(nodes_l).fillna('NA').to_csv('{}/regulation_nodes_v{}.csv'.format(graph,today), index=False)
+    saved = utils.save_dataframe(pd.DataFrame(nodes_l), '{}/regulation_nodes_v{}.csv'.format(graph,today))
     #print(len(nodes_l))
 
     # print nodes info
     print('\n* This is the size of the nodes file data structure: {}'.format(pd.DataFrame(nodes_l).shape))
     print('* These are the nodes attributes: {}'.format(pd.DataFrame(nodes_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(nodes_l).head(1)))
-    print('\nThe regulation network nodes are built and saved at: {}/regulation_nodes_v{}.csv\n'.format(graph,today))
+    print('\nThe regulation network nodes are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_nodes().\n')
 
     return nodes_l
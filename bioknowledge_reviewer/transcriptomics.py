@@ -10,6 +10,7 @@
 
 import datetime
 import pandas as pd
+import utils
 import os
 from biothings_client import get_client
 from Node import Node
@@ -236,13 +237,13 @@ def build_edges(edges):
     # save edges file
     path = os.getcwd() + '/graph'
     if not os.path.isdir(path): os.makedirs(path)
-    pd.DataFrame(edges_l).fillna('NA').to_csv('{}/rna_edges_v{}.csv'.format(path,today), index=False)
+    saved = utils.save_dataframe(pd.DataFrame(edges_l), '{}/rna_edges_v{}.csv'.format(path,today))
 
     # print edges info
     print('\n* This is the size of the edges file data structure: {}'.format(pd.DataFrame(edges_l).shape))
     print('* These are the edges attributes: {}'.format(pd.DataFrame(edges_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(edges_l).head(1)))
-    print('\nThe transcriptomics network edges are built and saved at: {}/rna_edges_v{}.csv\n'.format(path,today))
+    print('\nThe transcriptomics network edges are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_edges().\n')
 
     return edges_l
@@ -406,13 +407,13 @@ def build_nodes(edges):
     # save nodes file
     path = os.getcwd() + '/graph'
     if not os.path.isdir(path): os.makedirs(path)
-    pd.DataFrame(nodes_l).fillna('NA').to_csv('{}/rna_nodes_v{}.csv'.format(path,today), index=False)
+    saved = utils.save_dataframe(pd.DataFrame(nodes_l), '{}/rna_nodes_v{}.csv'.format(path,today))
 
     # print nodes info
     print('\n* This is the size of the nodes file data structure: {}'.format(pd.DataFrame(nodes_l).shape))
     print('* These are the nodes attributes: {}'.format(pd.DataFrame(nodes_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(nodes_l).head(1)))
-    print('\nThe transcriptomics network nodes are built and saved at: {}/rna_nodes_v{}.csv\n'.format(path,today))
+    print('\nThe transcriptomics network nodes are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_nodes().\n')
 
     return nodes_l, node_dict
@@ -456,13 +457,13 @@ def rework_edges(edges, nodes):
     # save edges file
     path = os.getcwd() + '/graph'
     if not os.path.isdir(path): os.makedirs(path)
-    pd.DataFrame(edges_l).fillna('NA').to_csv('{}/rna_edges_v{}.csv'.format(path,today), index=False)
+    saved = utils.save_dataframe(pd.DataFrame(edges_l), '{}/rna_edges_v{}.csv'.format(path,today))
 
     # print edges info
     print('\n* This is the size of the edges file data structure: {}'.format(pd.DataFrame(edges_l).shape))
     print('* These are the edges attributes: {}'.format(pd.DataFrame(edges_l).columns))
     print('* This is the first record:\n{}'.format(pd.DataFrame(edges_l).head(1)))
-    print('\nThe transcriptomics network edges are built and saved at: {}/rna_edges_v{}.csv\n'.format(path,today))
+    print('\nThe transcriptomics network edges are built and saved at: {}\n'.format(' and '.join(saved)))
     print('\nFinished build_edges().\n')
     return edges_l
 
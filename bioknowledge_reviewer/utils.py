@@ -10,11 +10,38 @@
 
 
 import datetime
+import os
+import pickle
+import sys
+import numpy as np
 import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # VARIABLES
 today = datetime.date.today()
 
+# statements format
+statement_columns = ['subject_id', 'property_id', 'object_id', 'reference_uri',
+                     'reference_supporting_text', 'reference_date', 'property_label',
+                     'property_description', 'property_uri']
+
+# hash keys (16 bytes) of the statement fingerprints: fixed, so fingerprints are stable across runs
+fingerprint_keys = ['bioknowledgerev1', 'bioknowledgerev2']
+
+# graph artifacts: columnar format written by the builders ('feather', 'parquet' or None for CSV only)
+columnar_format = 'feather'
+columnar_extensions = ['.feather', '.parquet']
+# also write the CSV file of the graph artifacts (CSV is otherwise only the neo4j export format)
+csv_artifacts = False
+# strings read as missing values from CSV files, replaced by nulls in the columnar files too
+csv_na_values = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                 '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
 
 # FUNCTIONS
 
@@ -33,23 +60,189 @@ def get_dataframe(object):
         return df
 
 
+def get_columnar_file(filename):
+    """
+    This function returns the columnar file of a graph artifact. For a CSV path_to_file_name, it is the feather \
+    or parquet file with the same name when it is at least as recent as the CSV file.
+    :param filename: path_to_file_name string
+    :return: columnar path_to_file_name string or None
+    """
+
+    stem, extension = os.path.splitext(filename)
+    if pa is None:
+        return None
+    if extension in columnar_extensions:
+        return filename
+    csv_time = os.path.getmtime(filename) if os.path.isfile(filename) else 0
+    for columnar_extension in columnar_extensions:
+        columnar_filename = stem + columnar_extension
+        if os.path.isfile(columnar_filename) and os.path.getmtime(columnar_filename) >= csv_time:
+            return columnar_filename
+    return None
+
+
+def read_columnar_file(filename, categorical=False):
+    """
+    This function reads a feather or parquet file memory-mapped into a dataframe.
+    :param filename: columnar path_to_file_name string
+    :param categorical: return dictionary-encoded columns as pandas categoricals (default False: strings)
+    :return: dataframe
+    """
+
+    if filename.endswith('.parquet'):
+        table = pq.read_table(filename, memory_map=True)
+    else:
+        table = feather.read_table(filename, memory_map=True)
+    return _arrow_to_dataframe(table, categorical)
+
+
+def _arrow_to_dataframe(table, categorical=False):
+    """This function converts an arrow table or record batch into a dataframe, decoding dictionary columns."""
+
+    df = table.to_pandas()
+    if not categorical:
+        for column in df.columns[df.dtypes == 'category']:
+            df[column] = df[column].astype(object)
+    return df
+
+
+def iter_dataframe_from_file(filename, chunksize=100000):
+    """
+    This function reads a file in chunks of rows. Feather or parquet files are read as for \
+    get_dataframe_from_file().
+    :param filename: CSV, feather or parquet path_to_file_name string
+    :param chunksize: number of rows per chunk
+    :return: generator of dataframes
+    """
+
+    columnar_filename = get_columnar_file(filename)
+    if columnar_filename is None:
+        for chunk in pd.read_csv('{}'.format(filename), low_memory=False, chunksize=chunksize):
+            yield chunk
+    elif columnar_filename.endswith('.parquet'):
+        for batch in pq.ParquetFile(columnar_filename, memory_map=True).iter_batches(batch_size=chunksize):
+            yield _arrow_to_dataframe(batch)
+    else:
+        for batch in feather.read_table(columnar_filename, memory_map=True).to_batches(max_chunksize=chunksize):
+            yield _arrow_to_dataframe(batch)
+
+
 def get_dataframe_from_file(filename):
     """
-    This function opens a file and returns a dataframe.
-    :param filename: CSV path_to_file_name string
+    This function opens a file and returns a dataframe. Feather or parquet files, passed or next to \
+    the CSV file, are read instead of parsing the CSV file.
+    :param filename: CSV, feather or parquet path_to_file_name string
     :return: dataframe
     """
 
     try:
-        df = pd.read_csv('{}'.format(filename), low_memory=False)
+        columnar_filename = get_columnar_file(filename)
+        if columnar_filename is not None:
+            df = read_columnar_file(columnar_filename)
+        else:
+            df = pd.read_csv('{}'.format(filename), low_memory=False)
     except OSError:
         print('cannot open: ', filename)
-        print('Please, provide the correct file path and file name and the file in CSV format.')
+        print('Please, provide the correct file path and file name and the file in CSV, feather or parquet format.')
         raise
     else:
         return df
 
 
+def save_dataframe(df, filename, na_rep='NA'):
+    """
+    This function saves a graph artifact dataframe. It is written as a dictionary-encoded feather or parquet \
+    file next to the CSV path_to_file_name (see columnar_format) and as CSV when csv_artifacts is set \
+    or pyarrow is not installed.
+    :param df: dataframe
+    :param filename: CSV path_to_file_name string
+    :param na_rep: missing values representation string in the CSV file
+    :return: list of written path_to_file_name strings
+    """
+
+    columnar = columnar_format and pa is not None
+    written = []
+    # CSV first: the columnar file is read instead of the CSV file when it is not older
+    if csv_artifacts or not columnar:
+        df.to_csv(filename, index=False, na_rep=na_rep)
+        written.append(filename)
+    if columnar:
+        columnar_filename = os.path.splitext(filename)[0] + '.' + columnar_format
+        table = get_columnar_table(df)
+        if columnar_format == 'parquet':
+            pq.write_table(table, columnar_filename, use_dictionary=True)
+        else:
+            # uncompressed so that it can be memory-mapped
+            feather.write_feather(table, columnar_filename, compression='uncompressed')
+        written.append(columnar_filename)
+
+    return written
+
+
+def save_dataframe_chunks(chunks, filename, na_rep='NA'):
+    """
+    This function saves a graph artifact given in chunks, e.g. by a generator, writing one chunk at a time. \
+    The columnar file is written in parquet format, with string columns, since it is written in row groups.
+    :param chunks: iterable of dataframes with the same columns
+    :param filename: CSV path_to_file_name string
+    :param na_rep: missing values representation string in the CSV file
+    :return: number of rows written, list of written path_to_file_name strings
+    """
+
+    columnar = columnar_format and pa is not None
+    stem = os.path.splitext(filename)[0]
+    columnar_filename = stem + '.parquet'
+    # stale artifacts with the same name would be read instead
+    for artifact in [filename] + [stem + extension for extension in columnar_extensions]:
+        if os.path.isfile(artifact):
+            os.remove(artifact)
+
+    rows = 0
+    writer = None
+    written = [filename] if csv_artifacts or not columnar else []
+    if columnar:
+        written.append(columnar_filename)
+    try:
+        for chunk in chunks:
+            if csv_artifacts or not columnar:
+                chunk.to_csv(filename, index=False, na_rep=na_rep, mode='a', header=rows == 0)
+            if columnar:
+                table = get_columnar_table(chunk.astype(object))
+                if writer is None:
+                    schema = pa.schema([(column, pa.string()) for column in table.column_names])
+                    writer = pq.ParquetWriter(columnar_filename, schema, use_dictionary=True)
+                writer.write_table(table.cast(schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows, written
+
+
+def get_columnar_table(df):
+    """
+    This function converts a dataframe into an arrow table with dictionary-encoded string columns. Missing values \
+    are the same as when reading the CSV file of the dataframe.
+    :param df: dataframe
+    :return: pyarrow table
+    """
+
+    df = df.copy()
+    for column in [c for c in df.columns if df[c].dtype == object or pd.api.types.is_string_dtype(df[c].dtype)]:
+        values = df[column].where(df[column].notna(), None)
+        # mixed types are written as their CSV strings
+        if not values.dropna().map(type).eq(str).all():
+            values = values.map(lambda value: value if value is None else str(value))
+        df[column] = values.where(~values.isin(csv_na_values), None)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+
+    return table
+
+
 def check_format(df, file_type='statements'):
     """
     This function checks if dataframe contains the expected columns before concatenation.
@@ -68,9 +261,7 @@ def check_format(df, file_type='statements'):
             return df
     else:
         try:
-            df = df[['subject_id', 'property_id', 'object_id', 'reference_uri',
-                        'reference_supporting_text', 'reference_date', 'property_label',
-                        'property_description', 'property_uri']]
+            df = df[statement_columns]
         except:
             print('Statements dataframe does not contain the expected columns. Raised error: ', sys.exc_info()[0])
             raise
@@ -78,6 +269,230 @@ def check_format(df, file_type='statements'):
             return df
 
 
+def fingerprint_columns(name='fingerprint', bits=64):
+    """
+    This function returns the column names holding a fingerprint: one uint64 column for 64 bits, two for 128 bits.
+    :param name: fingerprint column name string
+    :param bits: 64 (default value) or 128
+    :return: list of column names
+    """
+
+    if bits == 64:
+        return [name]
+    elif bits == 128:
+        return [name, name + '_2']
+    raise ValueError('Fingerprints are 64 or 128 bits long.')
+
+
+def add_fingerprint(df, columns=None, name='fingerprint', bits=64, rows=None):
+    """
+    This function adds a stable fingerprint of every record as uint64 column(s) to the dataframe. Values are \
+    hashed as strings, missing values as '', so the fingerprint does not depend on the column types. Records \
+    carrying a fingerprint keep it, only the rows whose values changed are hashed again.
+    :param df: statements dataframe
+    :param columns: list of columns identifying a record (default: statement_columns)
+    :param name: fingerprint column name string
+    :param bits: 64 (default value) or 128
+    :param rows: boolean array of the records to hash again (default none)
+    :return: dataframe with the fingerprint column(s)
+    """
+
+    if columns is None:
+        columns = statement_columns
+    names = fingerprint_columns(name, bits)
+    carried = all(column in df.columns and df[column].dtype == np.uint64 for column in names)
+    if carried:
+        rows = np.zeros(len(df), dtype=bool) if rows is None else np.asarray(rows, dtype=bool)
+        if not rows.any():
+            return df
+    else:
+        rows = np.ones(len(df), dtype=bool)
+    df = df.copy()
+    records = df[rows].reindex(columns=columns).astype(object).fillna('').astype(str)
+    for column, key in zip(names, fingerprint_keys):
+        values = df[column].to_numpy(dtype=np.uint64, copy=True) if carried else np.zeros(len(df), dtype=np.uint64)
+        values[rows] = pd.util.hash_pandas_object(records, index=False, hash_key=key).values
+        df[column] = values
+
+    return df
+
+
+def concat_statements(frames, name='fingerprint', bits=64):
+    """
+    This function concatenates statements dataframes, fingerprinting only the frames without the fingerprint \
+    column(s).
+    :param frames: list of statements dataframes
+    :param name: fingerprint column name string
+    :param bits: 64 (default value) or 128
+    :return: statements dataframe
+    """
+
+    frames = [add_fingerprint(df, name=name, bits=bits) for df in frames]
+    return pd.concat(frames, ignore_index=True, join="outer")
+
+
+def drop_duplicate_statements(df, keep='first', name='fingerprint', bits=64):
+    """
+    This function drops duplicated statements comparing their fingerprints instead of the full text columns.
+    :param df: statements dataframe
+    :param keep: 'first' (default value) or 'last'
+    :param name: fingerprint column name string
+    :param bits: 64 (default value) or 128
+    :return: statements dataframe without duplicates
+    """
+
+    df = add_fingerprint(df, name=name, bits=bits)
+    return df[~df.duplicated(subset=fingerprint_columns(name, bits), keep=keep)]
+
+
+def changed_rows(before, after):
+    """
+    This function compares two versions of the same dataframe rows, missing values being equal.
+    :param before: dataframe
+    :param after: dataframe with the same index and columns
+    :return: boolean array of the rows with any changed value
+    """
+
+    before, after = before.to_numpy(dtype=object), after.to_numpy(dtype=object)
+    equal = (before == after) | (pd.isna(before) & pd.isna(after))
+    return ~equal.all(axis=1)
+
+
+def merge_statement_references(df, sep='|'):
+    """
+    This function collapses statements with the same subject, property and object into one, keeping the first \
+    statement and merging the distinct reference_uri values of all of them.
+    :param df: statements dataframe
+    :param sep: separator of the merged references string
+    :return: statements dataframe with one statement per subject-property-object
+    """
+
+    df = add_fingerprint(df, columns=['subject_id', 'property_id', 'object_id'], name='spo_fingerprint')
+    refs = df[['spo_fingerprint', 'reference_uri']].dropna()
+    refs = refs.assign(reference_uri=refs.reference_uri.astype(str).str.split(sep)).explode('reference_uri')
+    refs = refs[~refs.reference_uri.isin(['', 'NA'])].drop_duplicates()
+    references = refs.groupby('spo_fingerprint', sort=False).reference_uri.agg(sep.join)
+
+    merged = df[~df.duplicated(subset='spo_fingerprint', keep='first')]
+    before = merged[['reference_uri']]
+    merged = merged.assign(reference_uri=merged.spo_fingerprint.map(references).fillna(merged.reference_uri))
+    merged = merged.drop(columns='spo_fingerprint')
+    # the statement fingerprint of the merged statements changed with the references
+    if 'fingerprint' in merged.columns:
+        merged = add_fingerprint(merged, rows=changed_rows(before, merged[['reference_uri']]))
+
+    return merged
+
+
+class IdDictionary(object):
+    """
+    Dictionary of node IDs of one graph build: every CURIE gets a dense int32 code the first time it is seen, \
+    so edge and node tables can be joined and deduplicated on integer arrays and translated back to CURIEs only \
+    at export.
+    """
+
+    def __init__(self, ids=()):
+        self._codes = dict()
+        self._ids = []
+        self._array = None
+        self.add(ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, curie):
+        return curie in self._codes
+
+    def _lookup(self, uniques):
+        """This method returns the codes of distinct IDs, -1 for unknown IDs."""
+
+        get = self._codes.get
+        return np.fromiter((get(curie, -1) for curie in uniques), dtype=np.int32, count=len(uniques))
+
+    def add(self, ids):
+        """
+        This method adds the new IDs to the dictionary in one batch.
+        :param ids: iterable of CURIE strings
+        :return: int32 codes array
+        """
+
+        uniques = pd.unique(pd.Series(ids, dtype=object).dropna())
+        new = uniques[self._lookup(uniques) < 0]
+        if len(new):
+            if len(self._ids) + len(new) > np.iinfo(np.int32).max:
+                raise OverflowError('The ID dictionary is full.')
+            self._codes.update(zip(new, range(len(self._ids), len(self._ids) + len(new))))
+            self._ids.extend(new)
+            self._array = None
+        return self._lookup(uniques)
+
+    def encode(self, ids, add=True):
+        """
+        This method returns the codes of the IDs.
+        :param ids: iterable of CURIE strings
+        :param add: True (default value) to add unknown IDs, otherwise they are coded as -1
+        :return: int32 codes array
+        """
+
+        # every distinct ID is looked up once
+        positions, uniques = pd.factorize(pd.Series(ids, dtype=object))
+        uniques = np.asarray(uniques, dtype=object)
+        codes = self._lookup(uniques)
+        if add and (codes < 0).any():
+            self.add(uniques[codes < 0])
+            codes = self._lookup(uniques)
+        # missing values (position -1) are coded as -1
+        return np.append(codes, -1).astype(np.int32)[positions]
+
+    def decode(self, codes):
+        """
+        This method returns the IDs of the codes.
+        :param codes: array of int codes (-1 for unknown IDs)
+        :return: CURIE strings array (None for unknown IDs)
+        """
+
+        codes = np.asarray(codes)
+        if self._array is None:
+            self._array = np.array(self._ids + [None], dtype=object)
+        return self._array.take(np.where(codes >= 0, codes, -1))
+
+    def save(self, filename):
+        """
+        This method saves the dictionary into a pickle file.
+        :param filename: path_to_file_name string
+        :return: None object
+        """
+
+        with open(filename, 'wb') as f:
+            pickle.dump(np.asarray(self._ids, dtype=object), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        This method loads a dictionary saved into a pickle file. Codes are the same as when it was saved.
+        :param filename: path_to_file_name string
+        :return: IdDictionary object
+        """
+
+        with open(filename, 'rb') as f:
+            return cls(pickle.load(f))
+
+
+def encode_statements(df, ids):
+    """
+    This function adds the subject and object codes of a node IDs dictionary to a statements dataframe.
+    :param df: statements dataframe
+    :param ids: IdDictionary object of the graph build
+    :return: statements dataframe with int32 'subject_code' and 'object_code' columns
+    """
+
+    df = df.copy()
+    df['subject_code'] = ids.encode(df.subject_id)
+    df['object_code'] = ids.encode(df.object_id)
+
+    return df
+
+
 def add_elem_dictionary2(dictionary, key, elem, repet = False):
     """
     This functions adds an element to a passed key and dictionary. \
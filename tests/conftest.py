@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the library modules import each other by name (import utils, from utils import *)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bioknowledge_reviewer'))
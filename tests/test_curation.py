@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('gsheets')
+pytest.importorskip('googleapiclient')
+pytest.importorskip('biothings_client')
+
+import curation
+
+
+def test_normalize_gene_ids():
+    ids = pd.Series(['NCBIGene:4851', 'NCBIGene:173028', 'NCBIGene:1', 'MONDO:0007739', None, 'NCBIGene:4851'])
+    entrez2hgnc = pd.Series({'4851': '7881'})
+    normalized = curation._normalize_gene_ids(ids, entrez2hgnc)
+    assert normalized.tolist()[:4] == ['HGNC:7881', 'WormBase:WBGene00010160', 'NCBIGene:1', 'MONDO:0007739']
+    assert pd.isna(normalized[4]) and normalized[5] == 'HGNC:7881'
+
+
+def test_split_curies_without_ids():
+    prefix, local, has_ns = curation._split_curies(pd.Series([], dtype=object))
+    assert prefix.empty and local.empty and has_ns.empty
+    prefix, local, has_ns = curation._split_curies(pd.Series(['NCBIGene:1:a', 'nan']))
+    assert prefix.tolist() == ['ncbigene', 'nan'] and local.tolist() == ['1:a', ''] and has_ns.tolist() == [True, False]
+
+
+def test_normalize_gene_ids_without_hgnc_mappings():
+    ids = pd.Series(['MONDO:0007739', 'NCBIGene:11826'])
+    assert curation._normalize_gene_ids(ids, pd.Series(dtype=object)).tolist() == ['MONDO:0007739', 'MGI:103201']
+
+
+def write_sheets(directory, sheet_id, text):
+    sheet_path = directory / sheet_id
+    sheet_path.mkdir(parents=True, exist_ok=True)
+    (sheet_path / 'network_edges.csv').write_text(text)
+
+
+def test_download_networks_only_changed_spreadsheets(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(curation, 'spreadsheetsIds_dct', {'sheet1': 'one', 'sheet2': 'two'})
+    source = curation.DirectorySource(str(tmp_path / 'drive'))
+    write_sheets(tmp_path / 'drive', 'sheet1', 'a,b\n')
+    write_sheets(tmp_path / 'drive', 'sheet2', 'c,d\n')
+    curation.download_networks(source=source)
+    assert "downloaded: ['one', 'two']" in capsys.readouterr().out
+    curation.download_networks(source=source)
+    assert 'downloaded: []' in capsys.readouterr().out
+    write_sheets(tmp_path / 'drive', 'sheet2', 'c,d\ne,f\n')
+    curation.download_networks(source=source)
+    assert "downloaded: ['two']" in capsys.readouterr().out
+    data_path = tmp_path / 'curation' / 'data' / curation.version
+    assert (data_path / 'network_edges.csv').read_text() == 'c,d\ne,f\n'
+
+
+def test_read_network_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(curation, 'path', str(tmp_path))
+    monkeypatch.setattr(curation, '_network_cache', dict())
+    data_path = tmp_path / 'data' / 'v1'
+    data_path.mkdir(parents=True)
+    (data_path / 'a_edges.tsv').write_text('subject_id\tobject_id\nHGNC:1\tHGNC:2\n')
+    (data_path / 'a_nodes.tsv').write_text('id\tpreflabel\nHGNC:1\tNGLY1\n')
+    edges, nodes = curation.read_network(version='v1')
+    assert edges.shape == (1, 2) and nodes.shape == (1, 2)
+    assert len(list(data_path.glob('.network_*.pickle'))) == 1
+    monkeypatch.setattr(curation, '_network_cache', dict())
+    cached_edges, _ = curation.read_network(version='v1')
+    assert cached_edges.equals(edges)
+    (data_path / 'b_edges.tsv').write_text('subject_id\tobject_id\nHGNC:3\tHGNC:4\n')
+    edges, _ = curation.read_network(version='v1')
+    assert len(edges) == 2 and len(list(data_path.glob('.network_*.pickle'))) == 1
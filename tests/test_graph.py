@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import graph
+import utils
+
+
+def edges(*triples):
+    return pd.DataFrame([{'subject_id': s, 'property_id': p, 'object_id': o, 'reference_uri': 'PMID:1',
+                          'reference_supporting_text': 'text', 'reference_date': '2020-01-01',
+                          'property_label': 'label', 'property_description': 'NA', 'property_uri': 'NA'}
+                         for s, p, o in triples], columns=utils.statement_columns)
+
+
+def nodes(*ids, label='node'):
+    return pd.DataFrame([{'id': id, 'semantic_groups': 'GENE', 'preflabel': '{} {}'.format(label, id),
+                          'synonyms': 'NA', 'name': 'NA', 'description': 'NA'} for id in ids])
+
+
+curation = edges(('HGNC:1', 'RO:0002434', 'HGNC:2'), ('HGNC:2', 'RO:0002434', 'MONDO:1'))
+monarch = edges(('HGNC:2', 'RO:0002434', 'HGNC:3'))
+monarch_updated = edges(('HGNC:4', 'RO:0002434', 'HGNC:5'), ('HGNC:1', 'RO:0002434', 'HGNC:3'))
+rna = edges(('HGNC:1', 'RO:0002434', 'HGNC:6'))
+tf = edges(('HGNC:7', 'RO:0002449', 'HGNC:3'), ('HGNC:8', 'RO:0002449', 'HGNC:5'),
+           ('HGNC:9', 'RO:0002449', 'HGNC:10'))
+curation_nodes = nodes('HGNC:1', 'HGNC:2', 'MONDO:1', label='curated')
+monarch_nodes = nodes('HGNC:2', 'HGNC:3')
+monarch_updated_nodes = nodes('HGNC:1', 'HGNC:3', 'HGNC:4', 'HGNC:5')
+rna_nodes = nodes('HGNC:6')
+tf_nodes = nodes('HGNC:3', 'HGNC:5', 'HGNC:7', 'HGNC:8', 'HGNC:9', 'HGNC:10', label='tf')
+
+
+def full_build(monarch, monarch_nodes):
+    _, merged = graph.graph_nodes(curation, monarch, rna, tf)
+    statements = graph.build_edges(curation, monarch, rna, merged)
+    return statements, graph.build_nodes(statements, curation_nodes, monarch_nodes, rna_nodes, tf_nodes)
+
+
+def sort(df, columns):
+    return df.astype(str).sort_values(columns).reset_index(drop=True)
+
+
+@pytest.fixture(autouse=True)
+def cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def test_resolve_property_uris_without_skos_statements():
+    statements = pd.DataFrame({'property_id': ['RO:0002434', 'skos:exactMatch'], 'property_uri': [None, None]})
+    resolved = graph.resolve_property_uris(statements.iloc[:1].copy())
+    assert resolved.property_uri.tolist() == ['http://purl.obolibrary.org/obo/RO_0002434']
+    resolved = graph.resolve_property_uris(statements.copy())
+    assert resolved.property_uri[1] == 'http://www.w3.org/2004/02/skos/core#exactMatch'
+
+
+def test_attach_regulation_keeps_tf_edges_touching_the_graph():
+    network = edges(('HGNC:1', 'RO:0002434', 'HGNC:2'))
+    regulation = edges(('HGNC:1', 'RO:0002449', 'HGNC:20'), ('HGNC:30', 'RO:0002449', 'HGNC:2'),
+                       ('HGNC:30', 'RO:0002449', 'HGNC:20'), ('HGNC:1', 'RO:0002449', 'HGNC:20'))
+    merged = graph.attach_regulation(network, regulation)
+    assert merged[['subject_id', 'object_id']].values.tolist() == [['HGNC:1', 'HGNC:20'], ['HGNC:30', 'HGNC:2']]
+
+
+def test_attach_regulation_joins_on_build_codes():
+    ids = utils.IdDictionary()
+    statements = utils.encode_statements(pd.concat([curation, monarch], ignore_index=True), ids)
+    merged = graph.attach_regulation(statements, tf, ids)
+    assert merged[['subject_id', 'object_id']].values.tolist() == [['HGNC:7', 'HGNC:3']]
+    assert ids.decode(merged[['subject_code', 'object_code']].values[0]).tolist() == ['HGNC:7', 'HGNC:3']
+
+
+def test_prepare_source_nodes_without_labels_or_synonyms():
+    df = pd.DataFrame({'id': ['HGNC:1', 'HGNC:2'], 'semantic_groups': 'GENE', 'preflabel': [np.nan, np.nan],
+                       'synonyms': [np.nan, np.nan], 'description': 'NA'})
+    prepared = graph.prepare_source_nodes(df, 'monarch')
+    assert prepared.preflabel.isna().all() and prepared.synonyms.isna().all()
+    df = df.assign(preflabel=['a\\b', 1.0], synonyms=[['x\\y', 'z'], np.nan])
+    prepared = graph.prepare_source_nodes(df, 'monarch')
+    assert prepared.preflabel.tolist() == ['ab', 1.0]
+    assert prepared.synonyms[0] == 'xy|z'
+
+
+def test_merge_equivalent_nodes_within_semantic_groups(capsys):
+    statements = edges(('NCBIGene:1', 'RO:0002205', 'HGNC:1'), ('HGNC:1', 'RO:0002434', 'MONDO:0007739'),
+                       ('KEGG-path:map04976', 'skos:exactMatch', 'MONDO:0007739'),
+                       ('OMIM:1', 'skos:exactMatch', 'MONDO:0007739'))
+    graph_nodes = pd.concat([nodes('NCBIGene:1', 'HGNC:1'), nodes('KEGG-path:map04976').assign(semantic_groups='PHYS'),
+                             nodes('MONDO:0007739', 'OMIM:1').assign(semantic_groups='DISO')], ignore_index=True)
+    merged_statements, merged_nodes = graph.merge_equivalent_nodes(statements, graph_nodes)
+    assert sorted(merged_nodes.id) == ['HGNC:1', 'KEGG-path:map04976', 'MONDO:0007739']
+    assert ['KEGG-path:map04976', 'skos:exactMatch', 'MONDO:0007739'] in \
+        merged_statements[['subject_id', 'property_id', 'object_id']].values.tolist()
+    assert 'KEGG-path:map04976 = MONDO:0007739' in capsys.readouterr().out
+
+
+def test_prepare_source_edges_fingerprints_the_resolved_statements():
+    df = pd.concat([edges(('HGNC:1', 'RO:0002434', 'HGNC:2')),
+                    edges(('HGNC:1', 'RO:0002434', 'HGNC:2')).assign(
+                        property_uri='http://purl.obolibrary.org/obo/RO_0002434')], ignore_index=True)
+    prepared = graph.prepare_source_edges(utils.add_fingerprint(df), 'curation')
+    assert len(prepared) == 1
+    assert prepared.fingerprint[0] == utils.add_fingerprint(df).fingerprint[1]
+
+
+def test_merge_equivalent_nodes_fingerprints_only_rewritten_statements(monkeypatch):
+    statements = utils.add_fingerprint(edges(('NCBIGene:1', 'RO:0002205', 'HGNC:1'),
+                                             ('NCBIGene:1', 'RO:0002434', 'MONDO:1'),
+                                             ('HGNC:1', 'RO:0002434', 'MONDO:1'), ('HGNC:2', 'RO:0002434', 'MONDO:1')))
+    rows = list()
+    hash_pandas_object = pd.util.hash_pandas_object
+    monkeypatch.setattr(pd.util, 'hash_pandas_object',
+                        lambda records, **kwargs: rows.append(len(records)) or hash_pandas_object(records, **kwargs))
+    merged, _ = graph.merge_equivalent_nodes(statements, nodes('NCBIGene:1', 'HGNC:1', 'HGNC:2', 'MONDO:1'))
+    assert merged[['subject_id', 'object_id']].values.tolist() == [['HGNC:1', 'MONDO:1'], ['HGNC:2', 'MONDO:1']]
+    assert rows == [2]
+
+
+def test_update_graph_matches_full_build():
+    full_build(monarch, monarch_nodes)
+    statements, graph_nodes = graph.update_graph('monarch', monarch_updated, monarch_updated_nodes)
+    # node codes of the build dictionary, extended with the new nodes
+    ids = graph.load_id_dictionary()
+    assert ids.decode(graph_nodes.code).tolist() == graph_nodes.id.tolist()
+    assert ids.decode(statements.subject_code).tolist() == statements.subject_id.tolist()
+    expected_statements, expected_nodes = full_build(monarch_updated, monarch_updated_nodes)
+    # the tf edge of HGNC:5 is attached to the new monarch nodes
+    assert 'HGNC:8' in set(statements.subject_id)
+    # node codes are the ones of each build
+    columns = utils.statement_columns + ['fingerprint']
+    assert sort(statements[columns], ['subject_id', 'object_id']).equals(
+        sort(expected_statements[columns], ['subject_id', 'object_id']))
+    assert sort(graph_nodes[graph.node_columns], ['id']).equals(sort(expected_nodes[graph.node_columns], ['id']))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_update_graph_reattaches_regulation_as_a_full_build(seed):
+    rng = np.random.default_rng(seed)
+
+    def network(n, size=30):
+        pairs = rng.integers(0, size, (n, 2))
+        return edges(*[('HGNC:{}'.format(s), 'RO:0002434', 'HGNC:{}'.format(o)) for s, o in pairs])
+
+    sources = [network(10), network(10), network(5), network(40, size=60)]
+    new_monarch = network(12)
+    node_frames = [nodes(*['HGNC:{}'.format(i) for i in range(60)])] * 4
+
+    def build(monarch):
+        _, merged = graph.graph_nodes(sources[0], monarch, sources[2], sources[3])
+        statements = graph.build_edges(sources[0], monarch, sources[2], merged)
+        return statements, graph.build_nodes(statements, *node_frames)
+
+    build(sources[1])
+    statements, _ = graph.update_graph('monarch', new_monarch, node_frames[1])
+    expected, _ = build(new_monarch)
+    columns = utils.statement_columns
+    assert sort(statements[columns], columns).equals(sort(expected[columns], columns))
+
+
+def test_update_graph_prepares_only_the_touched_regulation_edges(monkeypatch):
+    full_build(monarch, monarch_nodes)
+    prepared = list()
+    prepare_source_edges = graph.prepare_source_edges
+
+    def counted(edges, source, ids=None):
+        prepared.append((source, len(edges)))
+        return prepare_source_edges(edges, source, ids)
+
+    monkeypatch.setattr(graph, 'prepare_source_edges', counted)
+    graph.update_graph('monarch', monarch_updated, monarch_updated_nodes)
+    # HGNC:4 and HGNC:5 are added and HGNC:3 stays in the graph with HGNC:1: only the tf edge of HGNC:5
+    assert prepared == [('monarch', 2), ('regulation', 1)]
+
+
+def test_update_graph_keeps_the_index_in_source_order():
+    full_build(monarch, monarch_nodes)
+    graph.update_graph('curation', curation, curation_nodes)
+    for file_type in ('statements', 'concepts'):
+        rank = graph.load_graph_index(file_type).source.map(graph.graph_sources.index).values
+        assert (np.diff(rank) >= 0).all()
+
+
+def test_build_edges_chunked_matches_build_edges(tmp_path):
+    rng = np.random.default_rng(0)
+    files = list()
+    for i in range(4):
+        pairs = rng.integers(0, 30, size=(200, 2))
+        df = edges(*[('HGNC:{}'.format(s), 'RO:0002434', 'HGNC:{}'.format(o)) for s, o in pairs])
+        df.loc[::7, 'reference_uri'] = np.nan
+        files.append(str(tmp_path / 'source{}.csv'.format(i)))
+        df.to_csv(files[-1], index=False)
+    expected = graph.build_edges(*files, input_from_file=True)
+    n = graph.build_edges_chunked(*files, chunksize=50, partitions=3)
+    built = utils.get_dataframe_from_file('graph/graph_edges_v{}.csv'.format(graph.today))
+    assert n == len(expected) == len(built)
+    columns = utils.statement_columns
+    assert sort(built[columns].fillna('NA'), columns).equals(sort(expected[columns].fillna('NA'), columns))
+    assert not list((tmp_path / 'graph').glob('spill_*'))
+
+
+def test_validate_graph_report():
+    statements = graph.resolve_property_uris(edges(('HGNC:1', 'RO:0002434', 'HGNC:2'),
+                                                   ('HGNC:2', 'RO:0002434', 'HGNC:9'),
+                                                   ('HGNC:1', 'RO:0002434', 'HGNC:1')))
+    graph_nodes = pd.concat([nodes('HGNC:1', 'HGNC:2', 'HGNC:3'), nodes('HGNC:2').assign(semantic_groups='PHYS')],
+                            ignore_index=True)
+    report = graph.validate_graph(statements, graph_nodes)
+    assert not report['valid']
+    assert report['errors']['dangling_endpoints'] == {'count': 1, 'sample': ['HGNC:9']}
+    assert report['errors']['duplicated_ids'] == {'count': 1, 'sample': ['HGNC:2']}
+    assert report['warnings']['orphan_nodes']['sample'] == ['HGNC:3']
+    assert report['warnings']['self_loops']['count'] == 1
+    assert report['warnings']['unknown_property_uris']['count'] == 0
+    with pytest.raises(ValueError):
+        graph.validate_graph(statements, graph_nodes, strict=True)
+    assert graph.validate_graph(statements[:1], nodes('HGNC:1', 'HGNC:2'), strict=True)['valid']
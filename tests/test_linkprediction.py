@@ -0,0 +1,103 @@
+import math
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import linkprediction
+
+
+def test_workers_attach_shared_memory_untracked(monkeypatch):
+    registered = list()
+    monkeypatch.setattr(resource_tracker, 'register', lambda name, rtype: registered.append(name))
+    monkeypatch.setattr(resource_tracker, 'unregister', lambda name, rtype: None)
+    block = shared_memory.SharedMemory(create=True, size=8)
+    try:
+        attached = linkprediction._attach_shared_memory(block.name)
+        attached.close()
+    finally:
+        block.close()
+        block.unlink()
+    assert len(registered) == 1
+
+
+def random_graph(n, m, seed):
+    rng = np.random.default_rng(seed)
+    subjects, objects = rng.integers(0, n, m), rng.integers(0, n, m)
+    return pd.DataFrame({'subject_id': ['N{}'.format(i) for i in subjects],
+                         'object_id': ['N{}'.format(i) for i in objects]})
+
+
+def neighbours(edges):
+    neighbours = dict()
+    for subject, object in zip(edges.subject_id, edges.object_id):
+        if subject != object:
+            neighbours.setdefault(subject, set()).add(object)
+            neighbours.setdefault(object, set()).add(subject)
+    return neighbours
+
+
+def brute_force_scores(edges, seed):
+    nb = neighbours(edges)
+    common = dict()
+    for node in nb.get(seed, ()):
+        for candidate in nb[node] - {seed}:
+            common.setdefault(candidate, set()).add(node)
+    return pd.DataFrame([{'Node2.id': candidate,
+                          'adamicAdar': sum(1 / math.log(len(nb[u])) for u in nodes),
+                          'commonNeighbors': len(nodes),
+                          'preferentialAttachment': len(nb[seed]) * len(nb[candidate]),
+                          'resourceAllocation': sum(1 / len(nb[u]) for u in nodes),
+                          'totalNeighbors': len(nb[seed] | nb[candidate])} for candidate, nodes in common.items()],
+                        columns=['Node2.id'] + linkprediction.score_columns)
+
+
+def table(adjacency, scores):
+    """Score table of a seed indexed by candidate id."""
+    ids = adjacency.ids.decode(scores['Node2.code']) if 'Node2.code' in scores else scores['Node2.id']
+    return pd.DataFrame(scores[linkprediction.score_columns].values, index=ids,
+                        columns=linkprediction.score_columns).sort_index()
+
+
+def test_scores_match_brute_force():
+    edges = random_graph(300, 1500, seed=0)
+    nodes = pd.DataFrame({'id': ['N{}'.format(i) for i in range(300)], 'preflabel': 'label'})
+    adjacency = linkprediction.GraphAdjacency.from_statements(edges, nodes)
+    for seed in ('N5', 'N17'):
+        scores = adjacency.scores(seed)
+        expected = table(adjacency, brute_force_scores(edges, seed))
+        got = table(adjacency, scores)
+        assert list(got.index) == list(expected.index)
+        assert np.allclose(got.values, expected.values)
+        assert (scores['Node1.preflabel'] == 'label').all()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_update_matches_rescoring(seed):
+    rng = np.random.default_rng(seed)
+    edges = random_graph(120, 400, seed)
+    # parallel statements keep a pair adjacent when one of them is removed
+    edges = pd.concat([edges, edges.iloc[:20]], ignore_index=True)
+    old_adjacency = linkprediction.GraphAdjacency(edges.subject_id, edges.object_id)
+    removed = edges.iloc[rng.choice(len(edges), 15, replace=False)]
+    added = random_graph(125, 15, seed + 100)
+    new_edges = pd.concat([edges.drop(index=removed.index), added], ignore_index=True)
+    new_adjacency, changed = linkprediction.update_adjacency(old_adjacency, added, removed)
+    expected_adjacency = linkprediction.GraphAdjacency(new_edges.subject_id, new_edges.object_id)
+
+    for seed_id in ['N{}'.format(i) for i in range(0, 125, 5)]:
+        seed_code = new_adjacency.ids.encode([seed_id], add=False)[0]
+        if seed_code < 0:
+            continue
+        scores = None
+        if seed_code < len(old_adjacency):
+            codes, values = old_adjacency.score_codes(seed_code)
+            scores = pd.DataFrame(values, columns=linkprediction.score_columns)
+            scores.insert(0, 'Node2.code', codes)
+        updated = linkprediction.update_scores(scores, old_adjacency, new_adjacency, seed_code, changed)
+        expected = expected_adjacency.scores(seed_id)
+        got = table(new_adjacency, updated)
+        expected = table(expected_adjacency, expected)
+        assert list(got.index) == list(expected.index), seed_id
+        assert np.allclose(got.values, expected.values), seed_id
@@ -0,0 +1,83 @@
+import os
+
+import mondo_class
+
+owl = os.path.join(os.path.dirname(__file__), 'data', 'mini.owl')
+
+
+def test_qname_known_and_unknown_namespaces():
+    assert mondo_class._qname('{http://www.w3.org/2004/02/skos/core#}exactMatch') == 'skos:exactMatch'
+    assert mondo_class._qname('{http://purl.obolibrary.org/obo/mondo#}excluded_subClassOf') == \
+        'mondo:excluded_subClassOf'
+    assert mondo_class._qname('{http://example.org/vocab#}relatedTo') == 'vocab:relatedTo'
+
+
+def test_parse_owl_relations():
+    ontology = mondo_class.parse_owl(owl)
+    assert sorted(ontology['relations']) == [
+        ('MONDO:0007739', 'rdfs:subClassOf', 'http://purl.obolibrary.org/obo/MONDO_0000001'),
+        ('MONDO:0007739', 'skos:exactMatch', 'http://identifiers.org/omim/143100'),
+        ('MONDO:0007739', 'vocab:relatedTo', 'http://purl.obolibrary.org/obo/HP_0000726')]
+    assert ontology['xrefs'] == {'MONDO:0007739': ['OMIM:143100']}
+
+
+def test_hierarchy_property_ids(tmp_path):
+    outfile = str(tmp_path / 'mondo_statements.tsv')
+    mondo_class.hierarchy(owl, outfile=outfile, cache_dir=str(tmp_path))
+    with open(outfile) as f:
+        rows = [line.split(',') for line in f.read().splitlines()[1:]]
+    assert sorted(row[1] for row in rows) == ['exactMatch', 'relatedTo', 'subClassOf']
+    assert sorted(row[4] for row in rows) == ['HP:0000726', 'MONDO:0000001', 'OMIM:143100']
+
+
+def test_closure_matches_brute_force():
+    # diamond with a shared descendant and a second root
+    pairs = [('B', 'A'), ('C', 'A'), ('D', 'B'), ('D', 'C'), ('E', 'D'), ('F', 'C'), ('G', 'X'), ('D', 'X')]
+    index = mondo_class.closure(pairs)
+    parents = dict()
+    for child, parent in pairs:
+        parents.setdefault(child, set()).add(parent)
+
+    def ancestors(node):
+        found = set()
+        for parent in parents.get(node, ()):
+            found |= {parent} | ancestors(parent)
+        return found
+
+    nodes = {node for pair in pairs for node in pair}
+    for node in nodes:
+        assert index.ancestors(node) == ancestors(node)
+        assert index.descendants(node) == {other for other in nodes if node in ancestors(other)}
+    assert index.is_a('E', 'A') and index.is_a('E', 'X') and index.is_a('A', 'A') and not index.is_a('F', 'B')
+    assert index.rollup('E', ['X', 'F', 'B']) == ['X', 'B']
+    assert len(index) == len(nodes) and 'unknown' not in index
+
+
+def test_closure_from_owl(tmp_path):
+    index = mondo_class.closure.from_owl(owl, cache_dir=str(tmp_path))
+    assert index.ancestors('MONDO:0007739') == {'MONDO:0000001'}
+
+
+def test_closure_from_owl_ids_match_the_term_data(tmp_path):
+    # parents out of the obo namespace: ORDO and OMIM IRIs
+    owl_file = tmp_path / 'xrefs.owl'
+    owl_file.write_text("""<?xml version="1.0"?>
+<rdf:RDF xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#">
+    <owl:Class rdf:about="http://purl.obolibrary.org/obo/MONDO_0007739">
+        <rdfs:subClassOf rdf:resource="http://www.orpha.net/ORDO/Orphanet_869"/>
+        <rdfs:subClassOf rdf:resource="http://identifiers.org/omim/143100"/>
+    </owl:Class>
+</rdf:RDF>""")
+    index = mondo_class.closure.from_owl(str(owl_file), cache_dir=str(tmp_path))
+    assert index.ancestors('MONDO:0007739') == {'Orphanet:869', 'OMIM:143100'}
+    relations = mondo_class.load_owl(str(owl_file), str(tmp_path))['relations']
+    assert index.ancestors('MONDO:0007739') == {mondo_class.iri_to_curie(iri) for _, _, iri in relations}
+
+
+def test_xref_index(tmp_path):
+    terms = mondo_class.term(owl, cache_dir=str(tmp_path))
+    assert terms.get_xref_index() == {'OMIM:143100': 'MONDO:0007739'}
+    assert mondo_class.normalize_xref('ORPHA:869') == 'Orphanet:869'
+    assert mondo_class.iri_to_curie('http://www.orpha.net/ORDO/Orphanet_869') == 'Orphanet:869'
@@ -0,0 +1,259 @@
+import json
+import socket
+
+import pandas as pd
+import pytest
+
+import neo4jlib
+
+
+class Transaction(object):
+
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def run(self, query, batch):
+        self.log.append((query, batch))
+        return self
+
+    def consume(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+class Record(dict):
+
+    def __getitem__(self, key):
+        return list(self.values())[key] if isinstance(key, int) else dict.__getitem__(self, key)
+
+    def values(self):
+        return list(dict.values(self))
+
+
+class Result(list):
+
+    def keys(self):
+        return list(self[0].keys()) if self else []
+
+    def values(self):
+        return [record.values() for record in self]
+
+    def consume(self):
+        pass
+
+
+class Driver(object):
+    """Driver recording the queries and batches written, and answering queries with respond(query, parameters)."""
+
+    def __init__(self, respond=None):
+        self.log = list()
+        self.respond = respond
+
+    def session(self):
+        return self
+
+    def run(self, query, **parameters):
+        self.log.append((query, parameters))
+        return Result(Record(record) for record in (self.respond(query, parameters) if self.respond else []))
+
+    def begin_transaction(self):
+        return Transaction(self.log)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def nodes(**descriptions):
+    return pd.DataFrame([{'id': id, 'semantic_groups': 'GENE', 'preflabel': id, 'synonyms': 'NA', 'name': 'NA',
+                          'description': description} for id, description in descriptions.items()])
+
+
+def edges():
+    return pd.DataFrame([{'subject_id': 'HGNC:1', 'property_id': 'RO:0002434', 'object_id': 'HGNC:2',
+                          'reference_uri': 'PMID:1', 'reference_supporting_text': 'text', 'reference_date': '2020',
+                          'property_label': 'interacts with', 'property_description': 'NA',
+                          'property_uri': 'http://purl.obolibrary.org/obo/RO_0002434'}])
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    driver = Driver()
+    monkeypatch.setattr(neo4jlib, 'get_driver', lambda uri=None, auth=None: driver)
+    return driver
+
+
+def test_changed_node_is_updated_in_place(driver):
+    old = nodes(**{'HGNC:1': 'old', 'HGNC:2': 'NA', 'HGNC:3': 'NA'})
+    new = nodes(**{'HGNC:1': 'new', 'HGNC:2': 'NA'})
+    added, removed = neo4jlib.get_delta(old, new, file_type='concepts')
+    assert added.id.tolist() == ['HGNC:1'] and removed.id.tolist() == ['HGNC:3']
+    added_statements, removed_statements = neo4jlib.get_delta(edges(), edges())
+    assert added_statements.empty and removed_statements.empty
+
+    counts = neo4jlib.load_online(concepts=neo4jlib.get_concepts(added), removed_concepts=neo4jlib.get_concepts(removed),
+                                  nodes=neo4jlib.get_concepts(new), old_nodes=neo4jlib.get_concepts(old))
+    assert counts == {'removed_concepts': 1, 'relabelled_concepts': 0, 'concepts': 1}
+    deletes = [batch for query, batch in driver.log if 'DELETE' in query]
+    # only the node no longer in the graph loses its relationships
+    assert deletes == [[{'id': 'HGNC:3'}]]
+    merges = [batch for query, batch in driver.log if 'MERGE' in query and 'SET' in query]
+    assert merges[0][0]['id'] == 'HGNC:1' and merges[0][0]['description'] == 'new'
+
+
+def test_relabelled_node_keeps_its_relationships(driver):
+    old = nodes(**{'HGNC:1': 'NA'})
+    new = old.assign(semantic_groups='GENE;PHYS')
+    added, removed = neo4jlib.get_delta(old, new, file_type='concepts')
+    neo4jlib.load_online(concepts=neo4jlib.get_concepts(added), removed_concepts=neo4jlib.get_concepts(removed),
+                         old_nodes=neo4jlib.get_concepts(old))
+    queries = [query for query, batch in driver.log]
+    assert not any('DELETE' in query for query in queries)
+    assert queries[0] == 'UNWIND $batch AS row MATCH (n:`GENE` {id: row.id}) REMOVE n:`GENE` SET n:`GENE`:`PHYS`'
+
+
+def test_wait_for_neo4j():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    port = server.getsockname()[1]
+    try:
+        assert neo4jlib.wait_for_neo4j('127.0.0.1', [port], timeout=5)
+    finally:
+        server.close()
+    assert not neo4jlib.wait_for_neo4j('127.0.0.1', [port], timeout=0.3, delay=0.1)
+
+
+def test_save_neo4j_files_disambiguates_colliding_part_names(tmp_path):
+    statements = neo4jlib.get_statements(pd.concat([edges().assign(object_id=object_id)
+                                                    for object_id in ('HGNC:2', 'HGNC:3', 'HGNC:4')],
+                                                   ignore_index=True))
+    statements[':TYPE'] = ['a:b', 'a/b', 'a_b']
+    neo4jlib.save_neo4j_files(statements, str(tmp_path / 'neo4j'), file_type='statements')
+    path_to_import = tmp_path / 'neo4j' / 'import' / 'HD'
+    with open(path_to_import / 'HD_statements.json') as f:
+        manifest = json.load(f)
+    assert manifest['parts'] == ['HD_statements_a_b_0.csv.gz', 'HD_statements_a_b-1_0.csv.gz',
+                                 'HD_statements_a_b-2_0.csv.gz']
+    header = pd.read_csv(path_to_import / manifest['header'])
+    types = [pd.read_csv(path_to_import / part, header=None, names=header.columns)[':TYPE'].tolist()
+             for part in manifest['parts']]
+    assert sorted(sum(types, [])) == ['a/b', 'a:b', 'a_b']
+
+
+def test_create_neo4j_instance_marks_only_a_finished_set_up(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(neo4jlib.subprocess, 'call', lambda cmd, shell: 1)
+    monkeypatch.setattr(neo4jlib, 'wait_for_neo4j', lambda **kwargs: True)
+    calls, succeeds = list(), [False]
+
+    def setup(version, directory):
+        calls.append(directory)
+        (tmp_path / directory).mkdir(exist_ok=True)
+        return succeeds[0]
+
+    monkeypatch.setattr(neo4jlib, '_setup_neo4j_instance', setup)
+    # failed set up: no marker, set up again on the next call
+    directory = neo4jlib.create_neo4j_instance()
+    assert not (tmp_path / directory / '.setup_done').exists()
+    succeeds[0] = True
+    neo4jlib.create_neo4j_instance()
+    assert (tmp_path / directory / '.setup_done').exists() and len(calls) == 2
+    neo4jlib.create_neo4j_instance()
+    assert len(calls) == 2
+    # server not ready: no marker
+    monkeypatch.setattr(neo4jlib, 'wait_for_neo4j', lambda **kwargs: False)
+    neo4jlib.create_neo4j_instance(reuse=False)
+    assert not (tmp_path / directory / '.setup_done').exists()
+
+
+def test_setup_neo4j_instance_reports_missing_plugins(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(neo4jlib.subprocess, 'call', lambda cmd, shell: 1)
+    assert not neo4jlib._setup_neo4j_instance('5.1.0', 'neo4j-community-5.1.0')
+
+
+def test_save_neo4j_files_parts(tmp_path):
+    statements = neo4jlib.get_statements(pd.concat([edges()] * 3 + [edges().assign(property_id='RO:0002200')],
+                                                   ignore_index=True))
+    neo4j_path = str(tmp_path / 'neo4j')
+    for max_rows in (2, 10):
+        neo4jlib.save_neo4j_files(statements, neo4j_path, file_type='statements', max_rows=max_rows)
+    path_to_import = tmp_path / 'neo4j' / 'import' / 'HD'
+    with open(path_to_import / 'HD_statements.json') as f:
+        manifest = json.load(f)
+    assert manifest['parts'] == ['HD_statements_RO_0002200_0.csv.gz', 'HD_statements_RO_0002434_0.csv.gz']
+    # the parts of the first save are removed
+    assert sorted(p.name for p in path_to_import.glob('HD_statements_*.csv.gz')) == manifest['parts']
+    header = pd.read_csv(path_to_import / manifest['header'])
+    parts = pd.concat([pd.read_csv(path_to_import / part, header=None, names=header.columns)
+                       for part in manifest['parts']], ignore_index=True)
+    assert len(parts) == 4 and list(header.columns) == list(statements.columns)
+    files = neo4jlib.get_import_files(str(path_to_import), 'HD_statements').split(',')
+    assert files[0].endswith('HD_statements_header.csv') and len(files) == 3
+
+
+def test_node_pattern():
+    assert neo4jlib.node_pattern('n', 'DISO', 'seed') == '(n:`DISO` {id: $seed})'
+    assert neo4jlib.node_pattern('n', key='preflabel') == '(n {preflabel: $id})'
+
+
+def test_get_node_labels_seeks_by_label():
+    def respond(query, parameters):
+        if query == 'CALL db.labels()':
+            return [{'label': 'DISO'}, {'label': 'GENE'}]
+        return [{'id': 'HGNC:1', 'label': 'GENE'}]
+
+    driver = Driver(respond)
+    assert neo4jlib.get_node_labels(['HGNC:1', 'HGNC:2'], driver) == {'HGNC:1': 'GENE'}
+    query, parameters = driver.log[-1]
+    assert 'MATCH (n:`DISO` {id: id})' in query and 'MATCH (n:`GENE` {id: id})' in query
+    assert parameters == {'ids': ['HGNC:1', 'HGNC:2']}
+
+
+def test_create_indexes(driver):
+    driver.respond = lambda query, parameters: [{'label': 'DISO'}] if query == 'CALL db.labels()' else []
+    assert neo4jlib.create_indexes() == ['DISO']
+    queries = [query for query, parameters in driver.log]
+    assert 'CREATE CONSTRAINT `DISO_id` IF NOT EXISTS FOR (n:`DISO`) REQUIRE n.id IS UNIQUE' in queries
+    assert 'CREATE INDEX `DISO_preflabel` IF NOT EXISTS FOR (n:`DISO`) ON (n.preflabel)' in queries
+    assert queries[-1] == 'CALL db.awaitIndexes($timeout)'
+
+
+def test_get_driver_is_shared(monkeypatch):
+    created = list()
+
+    class GraphDatabase(object):
+
+        @staticmethod
+        def driver(uri, auth):
+            driver = Driver()
+            driver.close = lambda: driver.log.append('closed')
+            created.append(driver)
+            return driver
+
+    monkeypatch.setattr(neo4jlib, 'GraphDatabase', GraphDatabase)
+    monkeypatch.setattr(neo4jlib, '_drivers', dict())
+    assert neo4jlib.get_driver() is neo4jlib.get_driver('bolt://localhost:7687', ('neo4j', 'HD'))
+    assert neo4jlib.get_driver(auth=('neo4j', 'other')) is not neo4jlib.get_driver()
+    assert len(created) == 2
+    neo4jlib.close_drivers()
+    assert neo4jlib._drivers == dict() and [driver.log for driver in created] == [['closed'], ['closed']]
+
+
+def test_run_and_iter_query(driver):
+    driver.respond = lambda query, parameters: [{'id': 'HGNC:{}'.format(i)} for i in range(parameters['n'])]
+    assert neo4jlib.run_query('MATCH (n) RETURN n.id AS id LIMIT $n', n=3).id.tolist() == ['HGNC:0', 'HGNC:1', 'HGNC:2']
+    chunks = list(neo4jlib.iter_query('MATCH (n) RETURN n.id AS id LIMIT $n', chunksize=2, n=5))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1] and chunks[2].id[0] == 'HGNC:4'
+    assert driver.log[-1] == ('MATCH (n) RETURN n.id AS id LIMIT $n', {'n': 5})
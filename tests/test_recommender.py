@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import neo4jlib
+import recommender
+
+
+def scores(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Node1.id': 'MONDO:1', 'Node2.id': ['HGNC:{}'.format(i) for i in range(n)]})
+    for column in recommender.score_columns:
+        df[column] = rng.random(n) * 10
+    df['commonNeighbors'] = rng.integers(0, 20, n).astype(float)
+    return df
+
+
+def test_recommend_top_ranks_as_recommend():
+    df = scores(5000)
+    expected = recommender.recommend(df.copy(), inter=0.5).sort_values('recommendationscore', ascending=False)
+    top = recommender.recommend_top(lambda: (df.iloc[i:i + 700] for i in range(0, len(df), 700)), k=20, inter=0.5)
+    assert top['Node2.id'].tolist() == expected['Node2.id'][:20].tolist()
+    assert np.allclose(top.recommendationscore, expected.recommendationscore[:20])
+    assert list(top.columns) == list(expected.columns)
+
+
+def test_recommend_top_is_exact_when_later_chunks_change_the_maxima():
+    def rows(ids, aa, pa):
+        return pd.DataFrame({'Node1.id': 'MONDO:1', 'Node2.id': ids, 'adamicAdar': aa, 'resourceAllocation': aa,
+                             'preferentialAttachment': pa, 'commonNeighbors': 0.0, 'totalNeighbors': 1.0})
+
+    first = pd.concat([rows(['M'], 5.0, .001), rows(['X'], 3.0, .001),
+                       rows(['P{}'.format(i) for i in range(8)], 1.5, 10.0)], ignore_index=True)
+    second = rows(['Z'], 0.0, 10000.0)
+    top = recommender.recommend_top(lambda: [first, second], k=2)
+    expected = recommender.recommend(pd.concat([first, second], ignore_index=True))
+    expected = expected.sort_values('recommendationscore', ascending=False)
+    assert top['Node2.id'].tolist() == ['M', 'X'] == expected['Node2.id'][:2].tolist()
+    assert np.allclose(top.recommendationscore, expected.recommendationscore[:2])
+
+
+def test_recommend_top_rejects_non_positive_k():
+    with pytest.raises(ValueError):
+        recommender.recommend_top(lambda: [scores(10)], k=0)
+
+
+def test_multi_query_streams_the_pairs_once(monkeypatch):
+    calls = list()
+
+    def iter_query(query, chunksize):
+        calls.append(query)
+        df = scores(100)
+        return (df.iloc[i:i + chunksize] for i in range(0, len(df), chunksize))
+
+    monkeypatch.setattr(neo4jlib, 'iter_query', iter_query)
+    top = recommender.multi_query(k=5, chunksize=30)
+    assert len(calls) == 1 and len(top) == 5
+    with pytest.raises(ValueError):
+        recommender.multi_query(k=-1)
+
+
+def write_graph(path, n=200, m=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = pd.DataFrame({'subject_id': ['N{}'.format(i) for i in rng.integers(0, n, m)], 'property_id': 'RO:1',
+                          'object_id': ['N{}'.format(i) for i in rng.integers(0, n, m)]})
+    nodes = pd.DataFrame({'id': ['N{}'.format(i) for i in range(n)], 'preflabel': ['label {}'.format(i) for i in range(n)]})
+    path.mkdir(exist_ok=True)
+    edges.to_csv(path / 'graph_edges_v2026-01-01.csv', index=False)
+    nodes.to_csv(path / 'graph_nodes_v2026-01-01.csv', index=False)
+    return str(path / 'graph_edges_v2026-01-01.csv'), str(path / 'graph_nodes_v2026-01-01.csv')
+
+
+def test_recommend_seeds_in_worker_processes(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    edges_file, nodes_file = write_graph(tmp_path / 'graph')
+    results = recommender.recommend_seeds(['N5', 'missing', 'N7'], edges_file, nodes_file, k=10, processes=2)
+    assert results['Node1.id'].unique().tolist() == ['N5', 'N7']
+    assert (tmp_path / 'graph' / 'recommended_edges_v2026-01-01.csv').exists()
+    assert not list(tmp_path.glob('recommended_edges_*'))
+    assert 'reccomender top' not in capsys.readouterr().out
+
+    adjacency = recommender.linkprediction.load_adjacency(edges_file, nodes_file)
+    expected = recommender.recommend(adjacency.scores('N5')).sort_values('recommendationscore', ascending=False)
+    assert np.allclose(results[results['Node1.id'] == 'N5'].recommendationscore, expected.recommendationscore[:10])
+
+
+
+def test_update_seeds_matches_a_new_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    edges_file, nodes_file = write_graph(tmp_path / 'graph')
+    seeds = ['N{}'.format(i) for i in range(10)]
+    recommender.recommend_seeds(seeds, edges_file, nodes_file, k=None, processes=1)
+    edges = pd.read_csv(edges_file)
+    added = pd.DataFrame({'subject_id': ['N1', 'N3', 'N300'], 'property_id': 'RO:1', 'object_id': ['N2', 'N150', 'N4']})
+    removed = edges.iloc[:5]
+    updated = recommender.update_seeds(seeds, '2026-01-01', added, removed, new_version='2026-01-02', k=None)
+    new_edges = pd.concat([edges.iloc[5:], added], ignore_index=True)
+    new_edges.to_csv(tmp_path / 'graph' / 'graph_edges_v2026-01-03.csv', index=False)
+    expected = recommender.recommend_seeds(seeds, str(tmp_path / 'graph' / 'graph_edges_v2026-01-03.csv'), nodes_file,
+                                           k=None, processes=1)
+    columns = ['Node1.id', 'Node2.id'] + list(recommender.score_columns)
+    got = updated[columns].sort_values(['Node1.id', 'Node2.id']).reset_index(drop=True)
+    expected = expected[columns].sort_values(['Node1.id', 'Node2.id']).reset_index(drop=True)
+    assert got[['Node1.id', 'Node2.id']].equals(expected[['Node1.id', 'Node2.id']])
+    assert np.allclose(got[list(recommender.score_columns)].values, expected[list(recommender.score_columns)].values)
+
+
+class Session(object):
+    """Session answering the label lookup and the target score queries of query_targets."""
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.queries = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def session(self):
+        return self
+
+    def run(self, query, **parameters):
+        self.queries.append(parameters)
+        connected = [target for target in parameters['targets'] if target != 'HGNC:2']
+        return [dict({'Node1.preflabel': 'HD', 'Node2.preflabel': target, 'Node2.id': target},
+                     **{column: float(i) for i, column in enumerate(recommender.score_columns)})
+                for target in connected]
+
+
+def test_query_targets_in_batches(monkeypatch):
+    session = Session({'HGNC:1': 'GENE', 'HGNC:2': 'GENE', 'HGNC:3': 'GENE', 'MONDO:1': 'DISO'})
+    monkeypatch.setattr(neo4jlib, 'get_driver', lambda: session)
+    monkeypatch.setattr(neo4jlib, 'get_node_labels', lambda ids, s: {id: session.labels[id] for id in ids
+                                                                      if id in session.labels})
+    targets = ['HGNC:1', 'MONDO:1', 'HGNC:2', 'missing', 'HGNC:3', 'HGNC:1']
+    df = recommender.query_targets(targets, batch_size=2)
+    # one row per target connected to the seed, in target order
+    assert df['Node2.id'].tolist() == ['HGNC:1', 'MONDO:1', 'HGNC:3']
+    assert df.adamicAdar.dtype == float and (df.totalNeighbors == 4.0).all()
+    assert [parameters['targets'] for parameters in session.queries] == [['HGNC:1', 'HGNC:2'], ['HGNC:3'],
+                                                                          ['MONDO:1']]
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def statements(**values):
+    row = {column: 'x' for column in utils.statement_columns}
+    row.update(values)
+    return pd.DataFrame([row])
+
+
+def test_fingerprint_ignores_column_types():
+    float_na = statements(reference_date=np.nan).astype({'reference_date': float})
+    object_na = statements(reference_date=None).astype({'reference_date': object})
+    as_int = statements(reference_uri=2019)
+    as_str = statements(reference_uri='2019')
+    assert utils.add_fingerprint(float_na).fingerprint[0] == utils.add_fingerprint(object_na).fingerprint[0]
+    assert utils.add_fingerprint(as_int).fingerprint[0] == utils.add_fingerprint(as_str).fingerprint[0]
+    assert utils.add_fingerprint(as_str).fingerprint[0] != utils.add_fingerprint(object_na).fingerprint[0]
+
+
+def test_concat_drops_duplicates_across_frames():
+    float_na = statements(reference_date=np.nan).astype({'reference_date': float})
+    object_na = statements(reference_date=None).astype({'reference_date': object})
+    merged = utils.drop_duplicate_statements(utils.concat_statements([float_na, object_na]))
+    assert len(merged) == 1
+
+
+def hashed_rows(monkeypatch):
+    rows = list()
+    hash_pandas_object = pd.util.hash_pandas_object
+
+    def counted(records, **kwargs):
+        rows.append(len(records))
+        return hash_pandas_object(records, **kwargs)
+
+    monkeypatch.setattr(pd.util, 'hash_pandas_object', counted)
+    return rows
+
+
+def test_changed_rows_are_fingerprinted_again():
+    df = utils.add_fingerprint(pd.concat([statements(), statements(object_id='z')], ignore_index=True))
+    changed = df.assign(object_id='y')
+    # carried fingerprints are kept unless the rows are passed
+    assert utils.add_fingerprint(changed).fingerprint.equals(df.fingerprint)
+    refreshed = utils.add_fingerprint(changed, rows=np.array([True, False]))
+    assert refreshed.fingerprint[0] == utils.add_fingerprint(statements(object_id='y')).fingerprint[0]
+    assert refreshed.fingerprint[1] == df.fingerprint[1]
+    assert refreshed.fingerprint.dtype == np.uint64
+
+
+def test_statements_are_fingerprinted_once(monkeypatch):
+    rows = hashed_rows(monkeypatch)
+    frames = [pd.concat([statements(object_id=str(i)) for i in range(n)], ignore_index=True) for n in (3, 4)]
+    statements_ = utils.drop_duplicate_statements(utils.concat_statements(frames))
+    statements_ = utils.drop_duplicate_statements(utils.concat_statements([statements_, frames[0]]))
+    assert len(statements_) == 4 and statements_.fingerprint.dtype == np.uint64
+    # one hash per key of every frame, the concatenation reuses the fingerprints
+    assert rows == [3, 4, 3]
+
+
+def test_merge_statement_references():
+    df = pd.concat([statements(reference_uri='PMID:1|PMID:2'), statements(reference_uri='PMID:2|NA'),
+                    statements(object_id='y', reference_uri=np.nan)], ignore_index=True)
+    merged = utils.merge_statement_references(df)
+    assert merged.reference_uri.tolist()[0] == 'PMID:1|PMID:2'
+    assert pd.isna(merged.reference_uri.tolist()[1])
+    assert 'spo_fingerprint' not in merged.columns
+    # the merged statement is fingerprinted again with its references
+    df = pd.concat([statements(reference_uri='PMID:1'), statements(reference_uri='PMID:2'),
+                    statements(object_id='y')], ignore_index=True)
+    merged = utils.merge_statement_references(utils.add_fingerprint(df))
+    expected = utils.add_fingerprint(statements(reference_uri='PMID:1|PMID:2'))
+    assert merged.fingerprint.tolist() == [expected.fingerprint[0], utils.add_fingerprint(df).fingerprint[2]]
+
+
+def test_save_dataframe_returns_written_files(tmp_path, monkeypatch):
+    df = statements()
+    filename = str(tmp_path / 'graph_edges_v1.csv')
+    monkeypatch.setattr(utils, 'csv_artifacts', False)
+    assert utils.save_dataframe(df, filename) == [str(tmp_path / 'graph_edges_v1.feather')]
+    assert not (tmp_path / 'graph_edges_v1.csv').exists()
+    monkeypatch.setattr(utils, 'csv_artifacts', True)
+    assert utils.save_dataframe(df, filename) == [filename, str(tmp_path / 'graph_edges_v1.feather')]
+    rows, written = utils.save_dataframe_chunks([df, df], filename)
+    assert rows == 2 and written == [filename, str(tmp_path / 'graph_edges_v1.parquet')]
+    assert len(utils.get_dataframe_from_file(filename)) == 2
+
+
+def test_id_dictionary_codes_round_trip():
+    ids = utils.IdDictionary(['HGNC:1', 'HGNC:2'])
+    codes = ids.encode(['HGNC:2', 'HGNC:3', None, 'HGNC:1', 'HGNC:3'])
+    assert codes.tolist() == [1, 2, -1, 0, 2]
+    assert ids.encode(['HGNC:4'], add=False).tolist() == [-1]
+    assert len(ids) == 3 and 'HGNC:3' in ids
+    assert ids.decode(codes).tolist() == ['HGNC:2', 'HGNC:3', None, 'HGNC:1', 'HGNC:3']
+
+
+def test_id_dictionaries_are_independent():
+    first, second = utils.IdDictionary(), utils.IdDictionary()
+    first.encode(['HGNC:1'])
+    encoded = utils.encode_statements(statements(subject_id='HGNC:2', object_id='HGNC:1'), second)
+    assert encoded[['subject_code', 'object_code']].values.tolist() == [[0, 1]]
+    assert len(first) == 1